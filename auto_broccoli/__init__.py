@@ -1,31 +1,52 @@
 
 # flake8: noqa
 
+import importlib
+import importlib.util
 import sys
 
-# check for missing dependencies and Python version
-hard_dependencies = ["scipy", "numpy", "pandas", "pandas_profiling"]
-missing_dependencies = []
-
-for dependency in hard_dependencies:
-    try:
-        __import__(dependency)
-    except ImportError as e:
-        missing_dependencies.append(dependency)
+# check for missing dependencies and Python version, without paying for importing them
+hard_dependencies = ["scipy", "numpy", "pandas"]
+missing_dependencies = [dependency for dependency in hard_dependencies if importlib.util.find_spec(dependency) is None]
 
 if missing_dependencies:
     raise ImportError(
         f"Missing required dependencies {missing_dependencies}"
     )
-del hard_dependencies, dependency, missing_dependencies
+del hard_dependencies, missing_dependencies
 
-PY3 = float(sys.version[0:3]) >= 3.6
+PY3 = sys.version_info >= (3, 6)
 if not PY3:
     raise EnvironmentError("Python version 3.6 or greater is needed")
 
-# load needed functionality
-from auto_broccoli.auto_broccoli import AutoBroccoli
-from auto_broccoli.database import DBInterface
+# load needed functionality on first use, so importing the package stays cheap for short-lived processes
+_LAZY_ATTRIBUTES = {
+    'AutoBroccoli': ('auto_broccoli.auto_broccoli', 'AutoBroccoli'),
+    'DBInterface': ('auto_broccoli.database', 'DBInterface'),
+    'TimingRecorder': ('auto_broccoli.instrumentation', 'TimingRecorder'),
+    'profiler': ('auto_broccoli.profiler', None),
+    'sinks': ('auto_broccoli.sinks', None),
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module 'auto_broccoli' has no attribute {name!r}")
+    module_name, attribute = _LAZY_ATTRIBUTES[name]
+    module = importlib.import_module(module_name)
+    value = module if attribute is None else getattr(module, attribute)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
+
+
+if sys.version_info < (3, 7):  # no module __getattr__ (PEP 562), load everything now
+    for _name in _LAZY_ATTRIBUTES:
+        __getattr__(_name)
+
 from auto_broccoli.utils import *
 
 
@@ -4,26 +4,33 @@
 """http://faker.readthedocs.io/en/master/providers/faker.providers.address.html?highlight=random"""
 
 import datetime as dt
+import hashlib
 import itertools
+import json
+import os
 import random
 import sys
-from collections import defaultdict
+import time
+import warnings
+from collections import defaultdict, deque
+from contextlib import contextmanager
 
 import config
 import numpy as np
 import pandas as pd
-import pandas_profiling as pp
-from faker import Factory
-from scipy import stats
 
-from auto_broccoli import utils, database
+from auto_broccoli import utils, database, profiler, engines, parallel, streaming, sampling, sinks, cache, synthetic
+from auto_broccoli import instrumentation, ingest, scheduler, columnar, incremental
 
 
 class AutoBroccoli(object):
     """Designed for long data"""
     def __init__(self, df=None, categorical_as_ints=False, only_significant=False, sig_level=0.05, min_samples=30,
-                 specific_config=None, table_name=None):
-        self.dbi = database.DBInterface()
+                 specific_config=None, table_name=None, workers=None, chunksize=None, source_table=None,
+                 pushdown=False, sample_size=None, recheck_margin=1.0, random_state=None, result_cache=None,
+                 random_rows=1000, hooks=None, compact=True, time_budget=None, pair_budget=None,
+                 column_priority=None, screen_rows=10000, dbi=None, partition_by=None, partition_store=None):
+        self.dbi = dbi or database.DBInterface()  # pass one to share it between instances, e.g. in batch.run_tables
         if specific_config:
             self.running_config = specific_config
         else:
@@ -43,13 +50,65 @@ class AutoBroccoli(object):
         else:
             self.only_significant = False
         self.categorical_int_cutoff = 15
-        if df is not None:
+        self.workers = workers
+        self.chunksize = chunksize
+        self.source_table = source_table
+        self.pushdown = pushdown
+        self.sample_size = sample_size
+        self.recheck_margin = recheck_margin
+        self.random_state = random_state
+        # a cache.ResultCache, or the path of one opened on first use
+        self.result_cache = result_cache if result_cache is not None else self.running_config.RESULT_CACHE
+        # run the pairs best first until a budget is spent, see the scheduler module
+        self.time_budget = time_budget if time_budget is not None else self.running_config.TIME_BUDGET
+        self.pair_budget = pair_budget if pair_budget is not None else self.running_config.PAIR_BUDGET
+        self.column_priority = column_priority or {}
+        self.screen_rows = screen_rows
+        self.schedule = None  # the ranked pairs with their screening scores and whether they ran
+        self._ranking = None
+        self._faker = None
+        self.hooks = list(hooks or [])  # callables receiving an instrumentation record per stage and analysis call
+        self.binary_encodings = {}
+        self.deferred_load = False
+        # a date column the source is appended by, each run only reads the days after the last stored one
+        if partition_by and (isinstance(df, pd.DataFrame) or not (source_table or df is not None)):
+            raise ValueError('partition_by needs a source_table or a file to read in chunks')
+        if partition_by and not partition_store:
+            raise ValueError('partition_by needs a partition_store to keep the statistics of the days in')
+        self.partition_by = partition_by
+        self.partition_store = partition_store  # an incremental.PartitionStore, or the path of one opened on first use
+        self._column_stats = {}
+        self._fingerprints = {}
+        self._column_artifacts = {}
+        self._batch_results = {}
+        if isinstance(df, pd.DataFrame):
+            self.df = df
+            self.dataset = 'custom'
+        elif source_table:
+            self.df = None  # never loaded, streamed from the database chunksize rows at a time
+            self.chunksize = chunksize or 100000
+            self.dataset = source_table
+        elif df is not None and columnar.file_format(df):
+            self.df = None  # profiled a record batch at a time, the analyzed columns are loaded after classification
+            self.source = df
+            self.chunksize = chunksize or 100000
+            self.deferred_load = not (chunksize or partition_by)  # else the analysis streams the batches too
+            self.dataset = 'custom'
+        elif df is not None and (chunksize or partition_by):
+            self.df = None  # never loaded, the streaming module reads it chunksize rows at a time
+            self.source = df
+            self.chunksize = chunksize or 100000
+            self.dataset = 'custom'
+        elif df is not None:
             self.df = pd.read_csv(df)
             self.dataset = 'custom'
         else:
-            self.faker = Factory.create()
-            self.df = pd.DataFrame([self.example_record() for _ in range(1000)])
+            self.df = synthetic.example_data(rows=random_rows, random_state=random_state)
             self.dataset = 'random'
+        self.compact = compact
+        self.memory_report = None  # per column dtype and bytes before and after compaction
+        if compact and self.df is not None:
+            self.compact_df()
         # self.granularity = self.intro()  #TODO: consider introducing this later
         self.run_date = dt.datetime.utcnow().strftime("%m-%d-%y")
         self.analysis_func_dict = {
@@ -59,6 +118,14 @@ class AutoBroccoli(object):
             'cat X cont': self.cat_x_cont_insights,
             'cont X cont': self.cont_x_cont_insights
         }
+        # optional vectorized passes that compute every pair of an analysis type at once before the per-pair funcs
+        self.batch_func_dict = {
+            'bin X cat': self.chi2_batch,
+            'bin X bin': self.chi2_batch,
+            'bin X cont': self.bin_x_cont_batch,
+            'cat X cont': self.cat_x_cont_batch,
+            'cont X cont': self.cont_x_cont_batch
+        }
 
     @staticmethod
     def intro():
@@ -81,6 +148,15 @@ class AutoBroccoli(object):
         print(f"Analyzing on the granularity of {granularity}!")
         return granularity
 
+    @property
+    def faker(self):
+        """Faker instance for example_record, created on first use"""
+        if self._faker is None:
+            from faker import Factory  # slow to import and only used here
+
+            self._faker = Factory.create()
+        return self._faker
+
     def date_between(self, d1, d2):
         f = '%b%d-%Y'
         return self.faker.date_time_between_dates(dt.datetime.strptime(d1, f), dt.datetime.strptime(d2, f))
@@ -99,6 +175,125 @@ class AutoBroccoli(object):
                 'duration_percent':  1 - np.sqrt(1 - random.random())  # round(random.uniform(1, 100), 3)
                 }
 
+    def compact_df(self):
+        """Replaces self.df by its ingest.compact_frame version and keeps the report in self.memory_report"""
+        self.df, self.memory_report = ingest.compact_frame(self.df)
+        self._column_artifacts.clear()
+        if self.running_config.VERBOSE:
+            saved = self.memory_report['bytes_before'].sum() - self.memory_report['bytes_after'].sum()
+            print(f'Compacted the data from {self.memory_report["bytes_before"].sum() / 1e6:.1f}MB, '
+                  f'{saved / 1e6:.1f}MB saved')
+
+    def load_columns(self, columns):
+        """Loads some columns of a Parquet or Feather source into self.df, once classification picked them. The
+        statistics gathered while profiling stay valid; text columns encode_binary recoded in them are recoded the
+        same way here.
+
+        Args:
+            columns: list, the columns to load
+        """
+        self.df = columnar.read_columns(self.source, columns)
+        self._column_artifacts.clear()
+        for column, levels in self.binary_encodings.items():
+            if column in self.df:
+                self.df[column] = (self.df[column] == levels[1]).values.astype(np.uint8)
+        self.deferred_load = False
+        if self.compact:
+            self.compact_df()
+
+    @property
+    def n_rows(self) -> int:
+        """Rows of the data: of the frame in memory, or as counted by the profile of a streamed source. None when a
+        streamed source wasn't profiled yet"""
+        if self.df is not None:
+            return len(self.df)
+        for stats in self._column_stats.values():
+            return stats.length
+        return None
+
+    def column_stats(self, column) -> profiler.ColumnStats:
+        """Statistics for a column, computed on first use and reused until the column is modified.
+
+        Args:
+            column: str, the name of the column
+
+        Returns:
+            profiler.ColumnStats
+        """
+        if column not in self._column_stats:
+            self._column_stats[column] = profiler.column_stats(self.df[column],
+                                                               max_exact=self.running_config.EXACT_DISTINCT_LIMIT)
+        return self._column_stats[column]
+
+    def column_shift(self, columns) -> np.ndarray:
+        """The middle of the range of each column, subtracted before summing to keep the sums of the batched kernels
+        well conditioned, as streaming.PairAccumulator does. Read from the column statistics when they are gathered,
+        so a column is not counted only for its shift."""
+        shifts = []
+        for column in columns:
+            stats = self._column_stats.get(column)
+            low, high = (stats.min, stats.max) if stats is not None else (self.df[column].min(), self.df[column].max())
+            shifts.append(np.nan_to_num((float(low) + float(high)) / 2.0))
+        return np.array(shifts)
+
+    def column_fingerprint(self, column) -> str:
+        """Content fingerprint of a column, computed on first use and reused until the column is modified"""
+        if column not in self._fingerprints:
+            self._fingerprints[column] = cache.column_fingerprint(self.df[column])
+        return self._fingerprints[column]
+
+    def column_artifact(self, column, name, build):
+        """Something derived from one column alone, built on first use and shared by every pair that references the
+        column until the column is modified.
+
+        Args:
+            column: str, the name of the column
+            name: str, what is derived, e.g. 'codes'
+            build: callable without arguments computing it
+
+        Returns:
+            whatever build returns
+        """
+        key = (column, name)
+        if key not in self._column_artifacts:
+            self._column_artifacts[key] = build()
+        return self._column_artifacts[key]
+
+    def column_codes(self, column) -> (np.ndarray, np.ndarray):
+        """Factorized column: integer codes in the smallest signed type holding them, -1 when missing, and the
+        sorted levels they index"""
+        def build():
+            codes, levels = ingest.factorize(self.df[column])
+            return codes.astype(np.min_scalar_type(-len(levels) - 1)), levels
+        return self.column_artifact(column, 'codes', build)
+
+    def invalidate_column(self, column):
+        """Drops anything cached for a column. Call after modifying self.df[column]."""
+        self._column_stats.pop(column, None)
+        self._fingerprints.pop(column, None)
+        for key in [key for key in self._column_artifacts if key[0] == column]:
+            del self._column_artifacts[key]
+        self._batch_results.clear()
+
+    def encode_binary(self, column):
+        """Recodes a two-valued text column to a 0/1 indicator of the later of its two sorted values, like
+        pd.get_dummies(drop_first=True). Missing values become 0.
+
+        Args:
+            column: str, the name of the column
+        """
+        levels = sorted(self.column_stats(column).values)
+        self.binary_encodings[column] = levels
+        if self.df is None:  # streaming, the chunks are recoded as they are read
+            stats = self.column_stats(column)
+            positives = int(stats.value_counts[levels[1]])
+            value_counts = pd.Series([stats.length - positives, positives], index=[0, 1])
+            self._column_stats[column] = profiler.ColumnStats.from_value_counts(column, stats.length, np.uint8,
+                                                                                 value_counts)
+        else:
+            self.df[column] = (self.df[column] == levels[1]).values.astype(np.uint8)
+            self.invalidate_column(column)
+
     def binary_checker(self, column):
         """Hackish way of negating the column name. For example, if the column were "active" and the values were False, True
         then we change the crosstab labels from False, True to "non-active" "active".
@@ -109,13 +304,15 @@ class AutoBroccoli(object):
         Returns:
             bool, str, str
         """
-        unique_values = list(set(self.df[column].values))
-        check1 = sum([isinstance(i, (bool, np.bool_)) for i in unique_values]) == 2
-        check2 = all([isinstance(i, (int, np.uint8)) for i in unique_values]) and sum(unique_values) == 1
-        if check1 or check2:
-            return 'non-' + str(column), str(column)  # Hack negation of the column name
-        else:
-            raise ValueError(f'{column} not a binary variable? Unique values are : {unique_values}')
+        def build():
+            unique_values = self.column_stats(column).values
+            check1 = sum([isinstance(i, (bool, np.bool_)) for i in unique_values]) == 2
+            check2 = all([isinstance(i, (int, np.integer)) for i in unique_values]) and sum(unique_values) == 1
+            if check1 or check2:
+                return 'non-' + str(column), str(column)  # Hack negation of the column name
+            else:
+                raise ValueError(f'{column} not a binary variable? Unique values are : {unique_values}')
+        return self.column_artifact(column, 'binary_labels', build)
 
     def classify_column_types(self, ddf) -> dict:
         """One of the most important functions. This goes beyond Pandas Profiling to attempt to understand the
@@ -131,11 +328,13 @@ class AutoBroccoli(object):
 
         for row in ddf.itertuples():
 
-            tmp_df = self.df[self.df[row.Index].notnull()]
-            values = tmp_df[row.Index].value_counts().index.tolist()
-            value_counts = tmp_df[row.Index].value_counts().tolist()
+            col_stats = self.column_stats(row.Index)
+            value_counts = col_stats.counts
 
-            if row.type == 'UNIQUE':
+            if row.Index == self.partition_by:
+                _MEMO['date'].append(row.Index)
+
+            elif row.type == 'UNIQUE':
                 # TODO: what if continuous?
                 _MEMO['unique identifier'].append(row.Index)
 
@@ -153,7 +352,7 @@ class AutoBroccoli(object):
                 if self.categorical_as_ints:
                     # Here we will see if numerical columns are actually categoricals
                     # NOTE: makes the assumption that at each category was selected at least once
-                    if row.distinct_count < self.categorical_int_cutoff and utils.check_list_is_contiguous(values):
+                    if row.distinct_count < self.categorical_int_cutoff and col_stats.is_contiguous:
                         _MEMO['categorical'].append(row.Index)
 
                     elif row.distinct_count == 2 and len(value_counts) == 2:
@@ -185,7 +384,7 @@ class AutoBroccoli(object):
                 elif row.distinct_count == 2 and len(value_counts) == 2:
                         # for bin X cat insist that there are at least 30 instances for each binary category
                         if min(value_counts) > 30:
-                            self.df[row.Index] = pd.get_dummies(self.df[row.Index], drop_first=True)
+                            self.encode_binary(row.Index)
                             _MEMO['binary'].append(row.Index)
                         # else:
                         #     _MEMO['possible_binary'].append(row.Index)
@@ -200,6 +399,9 @@ class AutoBroccoli(object):
                 print(f'unknown case for {row.Index}')
                 _MEMO['unknown case'].append(row.Index)
 
+        if self.deferred_load:  # only the columns the analyses use are read
+            analyzed = ('binary', 'categorical', 'continuous')
+            self.load_columns([column for kind in analyzed for column in _MEMO.get(kind, [])])
         return dict(_MEMO)
 
     @staticmethod
@@ -250,6 +452,79 @@ class AutoBroccoli(object):
 
         return dict(results)
 
+    def contingency_counts(self, columns) -> (np.ndarray, dict):
+        """Co-occurrence counts of every level of every column against every other, from one sparse Gram product.
+
+        Args:
+            columns: list, the binary and categorical columns
+
+        Returns:
+            numpy array, dict: the count matrix and, per column, its (first row in the matrix, sorted levels)
+        """
+        codes, levels = zip(*[self.column_codes(column) for column in columns])
+        gram = engines.cooccurrence_counts(list(codes), [len(lvls) for lvls in levels])
+        offsets, start = {}, 0
+        for column, lvls in zip(columns, levels):
+            offsets[column] = (start, lvls)
+            start += len(lvls)
+        return gram, offsets
+
+    def count_table(self, row_var, col_var) -> pd.DataFrame:
+        """Raw contingency table of two columns sliced out of the batch counts, every level included
+
+        Returns:
+            pandas DataFrame, row_var levels on the index and col_var levels on the columns
+        """
+        batch = self._batch_results.get('contingency')
+        if batch is None or row_var not in batch[1] or col_var not in batch[1]:
+            batch = self.contingency_counts([row_var, col_var])
+        gram, offsets = batch
+        (row_start, row_levels), (col_start, col_levels) = offsets[row_var], offsets[col_var]
+        table = gram[row_start:row_start + len(row_levels), col_start:col_start + len(col_levels)]
+        return pd.DataFrame(table, index=row_levels, columns=col_levels)
+
+    def crosstab(self, row_var, col_var) -> pd.DataFrame:
+        """Same table as pd.crosstab(self.df[row_var], self.df[col_var]), read from the batch counts"""
+        table = self.count_table(row_var, col_var)
+        return table.loc[table.sum(axis=1) > 0, table.sum(axis=0) > 0]
+
+    def chi2_batch(self, pair_list):
+        """Counts the tables of all the binary/categorical pairs with one Gram product and chi-square tests them in
+        stacks of same-shaped tables. Shared by 'bin X cat' and 'bin X bin'; the counts are only recomputed when the
+        new pairs need a column the current counts don't cover.
+
+        Args:
+            pair_list: list, the pairs from create_analytical_buckets
+        """
+        columns = utils.ordered_unique(col for pair in pair_list for col in pair)
+        current = self._batch_results.get('contingency')
+        if current is None or not set(columns) <= set(current[1]):
+            if current is not None:
+                columns = utils.ordered_unique(list(current[1]) + columns)
+            self._batch_results['contingency'] = self.contingency_counts(columns)
+
+        tables = {tuple(pair): self.count_table(*pair).values for pair in pair_list}
+        pairs_by_shape = defaultdict(list)
+        for pair, table in tables.items():
+            pairs_by_shape[table.shape].append(pair)
+        p_vals = self._batch_results.setdefault('chi2', {})
+        for pairs in pairs_by_shape.values():
+            chi2, p = engines.chi2_from_tables(np.stack([tables[pair] for pair in pairs]))
+            p_vals.update(zip(pairs, p))
+
+    def chi2_pval(self, col_1, col_2) -> float:
+        """Chi-square test p-value for two columns. Read from the batch results when chi2_batch already covered the
+        pair.
+
+        Returns:
+            float
+        """
+        p_val = self._batch_results.get('chi2', {}).get((col_1, col_2))
+        if p_val is None:
+            chi2, p = engines.chi2_from_tables(self.count_table(col_1, col_2).values[None])
+            p_val = p[0]
+        return p_val
+
     # TODO: find a way to reduce repitition of code in the insights funcs below
     def bin_x_cat_insights(self, pair_list) -> (bool, dict):
         """Compares a binary column to a categorical column looking for insights
@@ -262,15 +537,15 @@ class AutoBroccoli(object):
         """
         # Setup
         bin_var, cat_var = pair_list
-        cat_unique_values = list(set(self.df[cat_var].values))
-        bin_unique_values = list(set(self.df[bin_var].values))
         bin_label_1, bin_label_2 = self.binary_checker(bin_var)
-        xtab = pd.crosstab(self.df[cat_var], self.df[bin_var])
-        xtab.index = [i.title() for i in cat_unique_values]
+        xtab = self.crosstab(cat_var, bin_var)
+        xtab.index = [str(i).title() for i in xtab.index]
         xtab.columns = bin_label_1, bin_label_2  # relabel so it's easier to work with
 
         # Analysis
-        chi2, p, dof, expected = stats.chi2_contingency(xtab)
+        p = self.chi2_pval(bin_var, cat_var)
+        if np.isnan(p):
+            return False, {}
         insights = ""
 
         if p <= self.siglvl:
@@ -291,8 +566,8 @@ class AutoBroccoli(object):
 
     def bin_x_bin_insights(self, pair_list) -> (bool, dict):
         bin1_var, bin2_var = pair_list  # ['active', 'nice_person']
-        bin1_unique_values = list(set(self.df[bin1_var].values))
-        bin2_unique_values = list(set(self.df[bin2_var].values))
+        bin1_unique_values = self.column_stats(bin1_var).values
+        bin2_unique_values = self.column_stats(bin2_var).values
         bin_1_label_1, bin_1_label_2 = self.binary_checker(bin1_var, )
         bin_2_label_1, bin_2_label_2 = self.binary_checker(bin2_var, )
         dict_ = {'bin1var': bin1_var, 'bin2var': bin2_var,
@@ -300,9 +575,9 @@ class AutoBroccoli(object):
                  'bin2_uniques': bin2_unique_values,
                  'bin1_labels': [bin_1_label_1, bin_1_label_2],
                  'bin2_labels': [bin_2_label_1, bin_2_label_2]}
-        xtab = pd.crosstab(self.df[dict_['bin1var']], self.df[dict_['bin2var']])
-        xtabc = pd.crosstab(self.df[dict_['bin1var']], self.df[dict_['bin2var']], normalize='columns')
-        xtabi = pd.crosstab(self.df[dict_['bin1var']], self.df[dict_['bin2var']], normalize='index')
+        xtab = self.crosstab(dict_['bin1var'], dict_['bin2var'])
+        xtabc = xtab / xtab.sum(axis=0)  # normalized by column
+        xtabi = xtab.div(xtab.sum(axis=1), axis=0)  # normalized by index
         xtabc.index = dict_['bin1_labels']
         xtabc.columns = dict_['bin2_labels']
         fxtab = xtabi.T
@@ -310,7 +585,9 @@ class AutoBroccoli(object):
         fxtab.columns = dict_['bin1_labels']
 
         # Analysis
-        chi2, p, dof, expected = stats.chi2_contingency(xtab)
+        p = self.chi2_pval(bin1_var, bin2_var)
+        if np.isnan(p):
+            return False, {}
         insights = ""
         if p <= self.siglvl:
             insights += f"Significant difference in the '{bin_1_label_1}' and '{bin_1_label_2}' groups when " \
@@ -328,16 +605,68 @@ class AutoBroccoli(object):
         else:
             return False, {}
 
+    def binary_groups(self, column) -> pd.Series:
+        """Group labels for a binary column: 1 for the positive class, 0 for the negative class, NaN when missing"""
+        def build():
+            values = self.df[column]
+            return pd.Series(np.where(values == 1, 1.0, np.where(values == 0, 0.0, np.nan)), index=self.df.index)
+        return self.column_artifact(column, 'groups', build)
+
+    def bin_x_cont_moments(self, bin_var, cont_vars) -> (pd.DataFrame, pd.DataFrame, pd.Series):
+        """Splits every continuous column on one binary column, a block of columns per groupby, and t-tests them all.
+
+        Args:
+            bin_var: str, the binary column
+            cont_vars: list, the continuous columns
+
+        Returns:
+            pandas DataFrame, pandas DataFrame, pandas Series: count/mean/std/min of the positive and negative class
+            per continuous column, and the t-test p-value per continuous column
+        """
+        moments = engines.grouped_moments(self.df[cont_vars], self.binary_groups(bin_var))
+        pos_desc, neg_desc, p_val = engines.ttest_summary(moments)
+        return pos_desc, neg_desc, pd.Series(p_val, index=cont_vars)
+
+    def bin_x_cont_batch(self, pair_list):
+        """Runs bin_x_cont_moments once per binary column for all the 'bin X cont' pairs
+
+        Args:
+            pair_list: list, the 'bin X cont' pairs from create_analytical_buckets
+        """
+        cont_by_bin = defaultdict(list)
+        for bin_var, cont_var in pair_list:
+            cont_by_bin[bin_var].append(cont_var)
+        self._batch_results['bin X cont'] = {bin_var: self.bin_x_cont_moments(bin_var, cont_vars)
+                                             for bin_var, cont_vars in cont_by_bin.items()}
+
+    def group_ttest(self, bin_var, cont_var) -> (pd.Series, pd.Series, float):
+        """Positive and negative class descriptions and the t-test p-value of a continuous column split on a binary
+        column. Read from the batch results when bin_x_cont_batch already covered the pair.
+
+        Returns:
+            pandas Series, pandas Series, float
+        """
+        batch = self._batch_results.get('bin X cont', {}).get(bin_var)
+        if batch is None or cont_var not in batch[2].index:
+            batch = self.bin_x_cont_moments(bin_var, [cont_var])
+        pos_desc, neg_desc, p_vals = batch
+        return pos_desc[cont_var], neg_desc[cont_var], p_vals[cont_var]
+
     def bin_x_cont_insights(self, pair_list) -> (bool, dict):
-        """Stuff"""
+        """Compares a continuous column between the two classes of a binary column with an independent t-test
+
+        Args:
+            pair_list: list, contains the names of the columns to be compared
+
+        Returns:
+            dict of results for reporting
+        """
         bin_var, cont_var = pair_list
-        # bin_unique_vals = list(set(self.df[bin_var].values))
         bin_label_1, bin_label_2 = self.binary_checker(bin_var)
-        pos_desc = self.df[self.df[bin_var] == 1][cont_var].describe()
-        neg_desc = self.df[self.df[bin_var] == 0][cont_var].describe()
+        pos_desc, neg_desc, p_val = self.group_ttest(bin_var, cont_var)
+        if np.isnan(p_val):  # one of the classes has no usable rows
+            return False, {}
         insights = ""
-        t, p_val = stats.ttest_ind_from_stats(mean1=pos_desc['mean'], std1=pos_desc['std'], nobs1=pos_desc['count'],
-                                              mean2=neg_desc['mean'], std2=neg_desc['std'], nobs2=neg_desc['count'])
         if p_val <= self.siglvl:
             insights += f'Significant difference in "{bin_label_1}" and "{bin_label_2}" in "{cont_var}". '
 
@@ -353,6 +682,45 @@ class AutoBroccoli(object):
         else:
             return False, {}
 
+    def cat_x_cont_anova(self, cat_var, cont_vars) -> pd.Series:
+        """One-way ANOVA of every continuous column across the groups of one categorical column. The categorical
+        column is factorized once and all continuous columns are reduced together.
+
+        Args:
+            cat_var: str, the categorical column
+            cont_vars: list, the continuous columns
+
+        Returns:
+            pandas Series, the p-value per continuous column
+        """
+        codes, levels = self.column_codes(cat_var)
+        f, p_val = engines.anova(codes, len(levels), self.df, shift=self.column_shift(cont_vars), columns=cont_vars)
+        return pd.Series(p_val, index=cont_vars)
+
+    def cat_x_cont_batch(self, pair_list):
+        """Runs cat_x_cont_anova once per categorical column for all the 'cat X cont' pairs
+
+        Args:
+            pair_list: list, the 'cat X cont' pairs from create_analytical_buckets
+        """
+        cont_by_cat = defaultdict(list)
+        for cat_var, cont_var in pair_list:
+            cont_by_cat[cat_var].append(cont_var)
+        self._batch_results['cat X cont'] = {cat_var: self.cat_x_cont_anova(cat_var, cont_vars)
+                                             for cat_var, cont_vars in cont_by_cat.items()}
+
+    def anova_pval(self, cat_var, cont_var) -> float:
+        """ANOVA p-value of a continuous column across the groups of a categorical column. Read from the batch
+        results when cat_x_cont_batch already covered the pair.
+
+        Returns:
+            float
+        """
+        p_vals = self._batch_results.get('cat X cont', {}).get(cat_var)
+        if p_vals is None or cont_var not in p_vals.index:
+            p_vals = self.cat_x_cont_anova(cat_var, [cont_var])
+        return p_vals[cont_var]
+
     def cat_x_cont_insights(self, pair_list) -> (bool, dict):
         """Compares frequencies in a categorical column to a continuous variable
 
@@ -363,12 +731,10 @@ class AutoBroccoli(object):
             dict of results for reporting
         """
         cat_var, cont_var = pair_list
-        tmpdf = self.df[self.df[cat_var].notnull() & (self.df[cont_var].notnull())]  # Filter out nans
+        p_val = self.anova_pval(cat_var, cont_var)
+        if np.isnan(p_val):  # fewer than two groups with data
+            return False, {}
         insights = ""
-        # Anova
-        grps = pd.unique(tmpdf[cat_var].values)
-        d_data = {grp: tmpdf[cont_var][tmpdf[cat_var] == grp] for grp in grps}
-        f, p_val = stats.f_oneway(*d_data.values())
 
         if p_val <= self.siglvl:
             insights += f'Significant difference across groups in "{cat_var}" in "{cont_var}". '
@@ -385,10 +751,41 @@ class AutoBroccoli(object):
         else:
             return False, {}
 
+    def cont_x_cont_batch(self, pair_list):
+        """Computes the correlation and p-value matrices for all the continuous columns in one pass
+
+        Args:
+            pair_list: list, the 'cont X cont' pairs from create_analytical_buckets
+        """
+        columns = utils.ordered_unique(col for pair in pair_list for col in pair)
+        self._batch_results['cont X cont'] = engines.pearson_matrix(self.df, columns, shift=self.column_shift(columns))
+
+    def pearson(self, col_1, col_2) -> (float, float):
+        """Pearson coefficient and p-value for two columns, using only rows where both are present. Read from the
+        batch matrices when cont_x_cont_batch already covered the pair.
+
+        Returns:
+            float, float
+        """
+        batch = self._batch_results.get('cont X cont')
+        if batch is None or col_1 not in batch[0].index or col_2 not in batch[0].index:
+            batch = engines.pearson_matrix(self.df, [col_1, col_2], shift=self.column_shift([col_1, col_2]))
+        coef_df, p_df = batch
+        return coef_df.at[col_1, col_2], p_df.at[col_1, col_2]
+
     def cont_x_cont_insights(self, pair_list) -> (bool, dict):
-        """"""
+        """Compares two continuous columns for a linear relationship
+
+        Args:
+            pair_list: list, contains the names of the columns to be compared
+
+        Returns:
+            dict of results for reporting
+        """
         col_1, col_2 = pair_list
-        coef, p_val = stats.pearsonr(self.df[col_1], self.df[col_2])
+        coef, p_val = self.pearson(col_1, col_2)
+        if np.isnan(p_val):  # too few overlapping rows or a constant column
+            return False, {}
 
         if (self.only_significant and p_val <= self.siglvl) or not self.only_significant:
             insight_text = utils.correlations(coef, p_val, self.siglvl, col_1=col_1, col_2=col_2)
@@ -403,46 +800,432 @@ class AutoBroccoli(object):
         else:
             return False, {}
 
-    def auto_analysis(self, d_) -> pd.DataFrame:
+    def pair_pval(self, analysis_type, pair) -> float:
+        """p-value of a pair's test, without building the insight text
+
+        Args:
+            analysis_type: str, key of analysis_func_dict
+            pair: list, the two columns
+
+        Returns:
+            float
+        """
+        if analysis_type in ('bin X cat', 'bin X bin'):
+            return self.chi2_pval(*pair)
+        elif analysis_type == 'bin X cont':
+            return self.group_ttest(*pair)[2]
+        elif analysis_type == 'cat X cont':
+            return self.anova_pval(*pair)
+        elif analysis_type == 'cont X cont':
+            return self.pearson(*pair)[1]
+        raise ValueError(f'Unknown analysis type {analysis_type}')
+
+    def worker_settings(self) -> dict:
+        """Constructor arguments, plus run_date and dataset, giving another instance the same analysis settings.
+        The other instance gets slices of this one's frame, already compacted."""
+        return {'categorical_as_ints': self.categorical_as_ints, 'only_significant': self.only_significant,
+                'sig_level': self.siglvl, 'min_samples': self.min_samples, 'specific_config': self.running_config,
+                'table_name': self.table_name, 'compact': False, 'run_date': self.run_date, 'dataset': self.dataset}
+
+    @contextmanager
+    def instrument(self, stage, analysis_type=None, pair=None, rows=None):
+        """Measures the enclosed step and passes its record to every hook. Free when there are no hooks.
+
+        Args:
+            stage: str, e.g. 'profile', 'batch' or 'pair'
+            analysis_type: str, key of analysis_func_dict, default=None
+            pair: list, the two columns of a pair call, default=None
+            rows: int, rows the step reads, default=None (all the rows of the frame)
+
+        Yields:
+            dict, the record, which the step may complete, e.g. with the rows it read
+        """
+        if not self.hooks:
+            yield {}
+            return
+        col_1, col_2 = pair if pair is not None else (None, None)
+        if rows is None and self.df is not None:
+            rows = len(self.df)
+        probe = instrumentation.Probe({'stage': stage, 'analysis_type': analysis_type, 'col_1': col_1,
+                                       'col_2': col_2, 'rows': rows, 'date': self.run_date,
+                                       'dataset': self.dataset})
+        error = None
+        try:
+            yield probe.record
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            record = probe.stop(error)
+            for hook in self.hooks:
+                hook(record)
+
+    def run_batch(self, analysis_type, pair_list):
+        """Runs the batch pass of an analysis type, if it has one, for the given pairs"""
+        batch = self.batch_func_dict.get(analysis_type)
+        if batch and pair_list:
+            with self.instrument('batch', analysis_type=analysis_type):
+                batch(pair_list)
+
+    def run_insight(self, analysis_type, pair) -> (bool, dict):
+        """Runs a pair's insight function and tags its finding with the analysis type
+
+        Returns:
+            bool, dict: whether there is a finding, and its result dict
+        """
+        with self.instrument('pair', analysis_type=analysis_type, pair=pair):
+            success, result = self.analysis_func_dict[analysis_type](pair)
+        if success:
+            result['analysis_type'] = analysis_type
+        return success, result
+
+    def iter_insights(self, tasks, start=0):
+        """Runs every task's insight function, reading whatever batch results are already available.
+
+        Args:
+            tasks: list, (analysis type, pair) tuples
+            start: int, position of the first task to run, default=0
+
+        Yields:
+            (int, dict), position of the task in tasks and its finding's result dict
+        """
+        for i in range(start, len(tasks)):
+            success, result = self.run_insight(*tasks[i])
+            if success:
+                yield i, result
+
+    def iter_tasks(self, tasks, start=0):
+        """Runs the tasks one analysis type at a time: the type's batch pass, then its pairs' insight functions.
+        Only one type's batch results are built ahead of the findings they produce.
+
+        Args:
+            tasks: list, (analysis type, pair) tuples, grouped by analysis type
+            start: int, position of the first task to run, default=0
+
+        Yields:
+            (int, dict), position of the task in tasks and its finding's result dict
+        """
+        self._batch_results = {}
+        positions_by_type = defaultdict(list)
+        for i in range(start, len(tasks)):
+            positions_by_type[tasks[i][0]].append(i)
+        for k, positions in positions_by_type.items():
+            self.run_batch(k, [tasks[i][1] for i in positions])
+            for i in positions:
+                success, result = self.run_insight(k, tasks[i][1])
+                if success:
+                    yield i, result
+
+    def run_tasks(self, tasks) -> list:
+        """Runs the batch passes for the tasks' analysis types, then every task's insight function.
+
+        Args:
+            tasks: list, (analysis type, pair) tuples
+
+        Returns:
+            list, the findings' result dicts in task order
+        """
+        return [result for _, result in self.iter_tasks(tasks)]
+
+    @property
+    def scheduled(self) -> bool:
+        """Whether the pairs run best first: a budget or column priorities are set and the frame is in memory"""
+        return self.df is not None and (self.time_budget is not None or self.pair_budget is not None or
+                                        bool(self.column_priority))
+
+    @property
+    def sampled(self) -> bool:
+        """Whether the pairs are tested on a sample first: sample_size is below the rows of the in-memory frame and
+        the run is not scheduled"""
+        return self.df is not None and not self.scheduled and bool(self.sample_size) and \
+            len(self.df) > self.sample_size
+
+    def analysis_tasks(self, d_) -> list:
+        """Flattens the analytical combinations dict into (analysis type, pair) tuples, grouped by type. When
+        scheduled they are ranked best first instead, see scheduler.rank. The ranking is kept for later calls with
+        the same pairs, and self.schedule holds its scores."""
+        tasks = [(k, pair) for k, v in d_.items() if k in self.analysis_func_dict for pair in v]
+        if not self.scheduled:
+            return tasks
+        if self._ranking is None or self._ranking['tasks'] != tasks:
+            started = time.perf_counter()
+            with self.instrument('screen'):
+                ranked, self.schedule = scheduler.rank(self, tasks, screen_rows=self.screen_rows,
+                                                       column_priority=self.column_priority)
+            # the screening counts against the time budget of the run that triggered it
+            self._ranking = {'tasks': tasks, 'ranked': ranked, 'unbilled': time.perf_counter() - started}
+        return self._ranking['ranked']
+
+    def iter_analysis(self, d_, workers=None, start=0):
+        """Generator form of auto_analysis, yields each finding as soon as it is produced.
+
+        Args:
+            d_: dict, the analytical combinations dict
+            workers: int, number of processes to spread the pairs over, default=self.workers (one process). Not
+                     used when streaming a file in chunks, sampling or scheduled.
+            start: int, position of the first task to run, to resume an interrupted run, default=0
+
+        Returns:
+            iterator of (int, dict), position of the task in analysis_tasks(d_) and its finding's result dict.
+            Scheduled runs go best first in this process, without sampling, and stop when the time or pair budget
+            is spent. Their cached pairs don't count against the budget.
+        """
+        workers = workers or self.workers
+        tasks = self.analysis_tasks(d_)
+        if self.partition_by:
+            return incremental.iter_tasks(self, tasks, start=start)
+        if self.df is None:
+            return streaming.iter_tasks(self, tasks, start=start)
+        if isinstance(self.result_cache, str):
+            self.result_cache = cache.ResultCache(self.result_cache,
+                                                  max_bytes=self.running_config.RESULT_CACHE_MAX_BYTES)
+        if self.scheduled:
+            if (self.sample_size and len(self.df) > self.sample_size) or (workers and workers > 1):
+                warnings.warn('A scheduled run tests its pairs on all the rows in this process, sample_size and '
+                              'workers are not used', stacklevel=2)
+            time_budget = self.time_budget
+            if time_budget is not None:
+                time_budget -= self._ranking['unbilled']
+            self._ranking['unbilled'] = 0.0
+            return scheduler.iter_tasks(self, tasks, start=start, time_budget=time_budget,
+                                        pair_budget=self.pair_budget)
+        if self.result_cache is not None:
+            return self.iter_cached(tasks, workers, start=start)
+        return self.iter_uncached(tasks, workers, start=start)
+
+    def iter_uncached(self, tasks, workers, start=0):
+        """Runs the tasks of an in-memory frame sampled, in a process pool or sequentially"""
+        if self.sampled:
+            return sampling.iter_tasks(self, tasks, start=start)
+        elif workers and workers > 1:
+            return parallel.iter_tasks(self, tasks, workers, start=start)
+        return self.iter_tasks(tasks, start=start)
+
+    def result_key(self, analysis_type, pair) -> str:
+        """Result cache key of a pair: its columns' content and the settings its result depends on"""
+        settings = (self.siglvl, self.only_significant,
+                    (self.sample_size, self.recheck_margin, self.random_state) if self.sampled else None)
+        fingerprints = [self.column_fingerprint(column) for column in pair]
+        return cache.result_key(analysis_type, pair, fingerprints, settings)
+
+    def iter_cached(self, tasks, workers, start=0):
+        """Serves the pairs whose columns and settings are unchanged since an earlier run from self.result_cache,
+        runs the others and caches their results, pairs without a finding included.
+
+        Args:
+            tasks: list, (analysis type, pair) tuples
+            workers: int, number of processes to spread the pairs that are not cached over
+            start: int, position of the first task to run, default=0
+
+        Yields:
+            (int, dict), position of the task in tasks and its finding's result dict
+        """
+        keys = {i: self.result_key(*tasks[i]) for i in range(start, len(tasks))}
+        hits, misses = {}, []
+        for i, key in keys.items():
+            cached = self.result_cache.get(key)
+            if cached is None:
+                misses.append(i)
+            else:
+                hits[i] = cached
+        if self.running_config.VERBOSE:
+            print(f'{len(hits)} of {len(keys)} pairs served from the result cache')
+        hit_positions = deque(sorted(hits))
+
+        def cached_findings(before):
+            while hit_positions and hit_positions[0] < before:
+                i = hit_positions.popleft()
+                success, result = hits.pop(i)
+                if success:
+                    yield i, dict(result, date=self.run_date, dataset=self.dataset)
+
+        done = 0  # misses[:done] have been run and cached
+        try:
+            for j, result in self.iter_uncached([tasks[i] for i in misses], workers):
+                for i in misses[done:j]:
+                    self.result_cache.put(keys[i], False, {})
+                self.result_cache.put(keys[misses[j]], True, result)
+                done = j + 1
+                yield from cached_findings(misses[j])
+                yield misses[j], result
+            for i in misses[done:]:
+                self.result_cache.put(keys[i], False, {})
+            yield from cached_findings(len(tasks))
+        finally:
+            self.result_cache.commit()
+
+    def auto_analysis(self, d_, workers=None) -> pd.DataFrame:
         """Goes thru the available analytical combinations and writes out to a dataframe any findings found
 
         Args:
             d_: dict, the analytical combinations dict
+            workers: int, number of processes to spread the pairs over, default=self.workers (one process). Not
+                     used when streaming a file in chunks.
 
         Returns:
             results_df, pandas DataFrame of findings
         """
-        results = []
-        for k, v in d_.items():
-            func = self.analysis_func_dict.get(k)
-            if func:
-                for i in v:
-                    success, result = func(i)
-                    if success:
-                        result['analysis_type'] = k
-                        results.append(result)
-        results_df = pd.DataFrame(results)
+        results_df = pd.DataFrame([result for _, result in self.iter_analysis(d_, workers=workers)])
         return results_df
 
-    def main(self):
+    def stream_analysis(self, d_, outputs, checkpoint=None, flush_every=1000, workers=None) -> int:
+        """Runs the analysis writing each finding to every sink as it is produced.
+
+        Sinks are flushed every flush_every findings. With a checkpoint file, the position to resume from is saved
+        after each flush. If the run fails, a sink's write included, the findings since the last flush are discarded
+        from every sink and the checkpoint stays at that flush, so no sink holds a finding the checkpoint doesn't
+        cover. A later call with the same checkpoint continues where the run stopped, the sinks keeping what they
+        already stored. The file is removed once the
+        run completes. A scheduled run that spends its budget keeps the file, so the next run with the same ranking
+        (a fixed random_state) picks up the pairs it skipped.
 
-        # Step 1: run the awesome pandas profiling
-        pobject = pp.ProfileReport(self.df)
-        des = pobject.get_description()
+        Args:
+            d_: dict, the analytical combinations dict
+            outputs: list, sinks.Sink instances
+            checkpoint: str, path of the checkpoint file, default=None (no resuming)
+            flush_every: int, findings between two flushes, default=1000
+            workers: int, number of processes to spread the pairs over, default=self.workers
+
+        Returns:
+            int, number of findings written by this call
+        """
+        tasks = self.analysis_tasks(d_)
+        fingerprint = hashlib.sha1(repr(tasks).encode()).hexdigest()
+        start = 0
+        if checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                saved = json.load(f)
+            if saved.get('tasks') == fingerprint:
+                start = saved['next_task']
+            elif self.running_config.VERBOSE:
+                print(f'Checkpoint {checkpoint} is for different pairs, starting over.')
+
+        def save_checkpoint(next_task):
+            if checkpoint:
+                with open(checkpoint + '.tmp', 'w') as f:
+                    json.dump({'tasks': fingerprint, 'next_task': next_task}, f)
+                os.replace(checkpoint + '.tmp', checkpoint)
+
+        for output in outputs:
+            output.open(resume=start > 0)
+        next_task, written, completed, failed = start, 0, False, False
+        try:
+            for i, result in self.iter_analysis(d_, workers=workers, start=start):
+                for output in outputs:
+                    output.write(result)
+                next_task, written = i + 1, written + 1
+                if written % flush_every == 0:
+                    for output in outputs:
+                        output.flush()
+                    save_checkpoint(next_task)
+            if self.scheduled and not self.schedule['ran'].iloc[start:].all():  # budget spent, resumable
+                next_task = start + int(self.schedule['ran'].iloc[start:].sum())
+            else:
+                completed = True
+        except BaseException:
+            failed = True
+            for output in outputs:
+                output.discard()
+            raise
+        finally:
+            try:
+                if not failed:
+                    for output in outputs:
+                        output.flush()  # if this fails the checkpoint stays at the last successful flush
+                    if not completed:
+                        save_checkpoint(next_task)
+                    elif checkpoint and os.path.exists(checkpoint):
+                        os.remove(checkpoint)
+            finally:
+                for output in outputs:
+                    output.close()
+        return written
+
+    def read_chunks(self, columns=None, where=None):
+        """Iterates over the source file or table self.chunksize rows at a time.
+
+        Args:
+            columns: list, only read these columns, default=None (all columns)
+            where: str, SQL where statement for a table, files are read in full, default=None
+
+        Returns:
+            iterator of pandas DataFrames
+        """
+        if self.source_table:
+            return self.dbi.load_from_table(self.source_table, where=where, columns=columns, chunksize=self.chunksize)
+        if columnar.file_format(self.source):
+            return columnar.iter_batches(self.source, self.chunksize, columns=columns)
+        return streaming.read_chunks(self.source, self.chunksize, columns=columns)
+
+    def profile(self) -> pd.DataFrame:
+        """Profiles every column of the dataset with the profiler picked in the running config.
+
+        Returns:
+            pandas DataFrame, one row per column with at least type, distinct_count, is_unique and mode
+        """
+        if self.partition_by:
+            profile, self._column_stats = incremental.profile(self)
+            return profile
+        if self.df is None:
+            profile, self._column_stats = streaming.profile_chunks(
+                self.read_chunks(), max_distinct=self.running_config.EXACT_DISTINCT_LIMIT)
+            return profile
+        if self.running_config.PROFILER == 'pandas_profiling':
+            try:
+                import pandas_profiling as pp  # optional dependency
+            except ImportError:
+                raise ImportError("PROFILER is set to 'pandas_profiling' but pandas_profiling is not installed")
+            return pp.ProfileReport(self.df).get_description()['variables']
+        return profiler.describe(self.df, stats=self._column_stats, max_exact=self.running_config.EXACT_DISTINCT_LIMIT)
 
-        # Step 2: identify analytical types of variables
-        analytics_df = des['variables']
-        type_dict = self.classify_column_types(analytics_df)
+    def main(self, write_to_db=None, replace_or_append=None):
+        """Profiles, classifies and analyzes the data.
 
-        # Step three: set them into analytical buckets
-        analytics_dict = self.create_analytical_buckets(type_dict)
+        Args:
+            write_to_db: bool, save the findings to the table_name table as they are found,
+                         default=running_config.WRITE_TO_DB
+            replace_or_append: str, how to save them, default=running_config.DB_WRITE_MODE
 
-        # Step four: run the analytics!
-        _df = self.auto_analysis(d_=analytics_dict)
-        if self.running_config.WRITE_TO_DB:
-            self.dbi.save_to_table(_df, table_name=self.table_name, replace_or_append=self.running_config.DB_WRITE_MODE)
-            print(f'Saved results to table {self.table_name}.')
-        return _df
+        Returns:
+            pandas DataFrame, the findings
+        """
+        if write_to_db is None:
+            write_to_db = self.running_config.WRITE_TO_DB
+        recorder = None
+        if write_to_db and self.running_config.SAVE_TIMINGS:
+            recorder = instrumentation.TimingRecorder()
+            self.hooks.append(recorder)
+        try:
+            # Step 1: profile the columns
+            with self.instrument('profile'):
+                analytics_df = self.profile()
+
+            # Step 2: identify analytical types of variables
+            with self.instrument('classify_column_types'):
+                type_dict = self.classify_column_types(analytics_df)
+
+            # Step three: set them into analytical buckets
+            with self.instrument('create_analytical_buckets'):
+                analytics_dict = self.create_analytical_buckets(type_dict)
+
+            # Step four: run the analytics! findings reach the DB in batches while the pairs run
+            results = sinks.DataFrameSink()
+            outputs = [results]
+            if write_to_db:
+                outputs.append(sinks.DBSink(self.dbi, self.table_name,
+                                            replace_or_append=replace_or_append or self.running_config.DB_WRITE_MODE))
+            with self.instrument('auto_analysis'):
+                self.stream_analysis(analytics_dict, outputs, flush_every=self.dbi.batch_size)
+            if write_to_db:
+                print(f'Saved results to table {self.table_name}.')
+        finally:
+            if recorder is not None:
+                self.hooks.remove(recorder)
+
+        if recorder is not None:
+            recorder.save(self.dbi, table_name=f'{self.table_name}_timings')
+            print(f'Saved timings to table {self.table_name}_timings.')
+        return results.to_frame()
 
 
 if __name__ == '__main__':
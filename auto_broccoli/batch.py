@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+"""Runs the auto analysis over many tables of a database in one job.
+
+The tables are spread over a pool of threads that share one DBInterface, and so one connection pool. A semaphore
+bounds how many tables are being read from the database at once, so the analysis of the tables already loaded goes
+on without adding load to the server. Each table's findings are written as soon as its analysis finishes.
+
+Run from the repository root:
+
+    python -m auto_broccoli.batch 'sales_*' --workers 4 --max-reads 2
+"""
+
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+import config
+from auto_broccoli import database
+
+SUMMARY_COLUMNS = ['table', 'results_table', 'rows', 'findings', 'seconds', 'error']
+
+
+def resolve_tables(dbi, tables, results_table='{table}_insights') -> list:
+    """The tables to analyze: a list as given, or the tables matching a wildcard pattern. Results and timings tables
+    of the matched tables are left out, so a broad pattern doesn't analyze earlier findings.
+
+    Args:
+        dbi: DBInterface, the database
+        tables: list or str, table names, or a pattern for DBInterface.table_names
+        results_table: str, name of a table's results table, {table} standing for the table,
+                       default='{table}_insights'
+
+    Returns:
+        list
+    """
+    if not isinstance(tables, str):
+        return list(tables)
+    names = dbi.table_names(tables)
+    outputs = {results_table.format(table=name) for name in names}
+    outputs |= {output + '_timings' for output in outputs}
+    return [name for name in names if name not in outputs]
+
+
+def run_tables(tables, dbi=None, workers=4, max_concurrent_reads=2, results_table='{table}_insights',
+               chunksize=None, specific_config=None, **settings) -> pd.DataFrame:
+    """Analyzes every table and writes each one's findings to its results table when it finishes.
+
+    A table that fails is reported in the summary and doesn't stop the others.
+
+    Args:
+        tables: list or str, table names, or a wildcard pattern such as 'sales_*'
+        dbi: DBInterface, shared by all the tables, default=None (one for the config's database)
+        workers: int, tables analyzed at once, default=4
+        max_concurrent_reads: int, tables read from the database at once, default=2
+        results_table: str, where a table's findings go, {table} standing for the table. Without {table} every
+                       table's findings are appended to the same table, default='{table}_insights'
+        chunksize: int, stream each table this many rows at a time instead of loading it. Its read slot is then
+                   held for its whole analysis, default=None
+        specific_config: Config, the running config of every table, default=None (config.IN_USE)
+        settings: other AutoBroccoli arguments, e.g. only_significant or sample_size
+
+    Returns:
+        pandas DataFrame, one row per table: table, results_table, rows, findings, seconds, error
+    """
+    from auto_broccoli.auto_broccoli import AutoBroccoli
+
+    dbi = dbi or database.DBInterface()
+    running_config = specific_config or config.IN_USE
+    tables = resolve_tables(dbi, tables, results_table=results_table)
+    shared_output = '{table}' not in results_table
+    reads = threading.BoundedSemaphore(max_concurrent_reads)
+
+    def load(table):
+        with reads:
+            return dbi.load_from_table(table)
+
+    def analyze(table, **source) -> (int, int):
+        ab = AutoBroccoli(dbi=dbi, specific_config=running_config, table_name=results_table.format(table=table),
+                          **source, **settings)
+        ab.dataset = table
+        findings = ab.main(write_to_db=True, replace_or_append='append' if shared_output else None)
+        return ab.n_rows, len(findings)
+
+    def run(table):
+        record = {'table': table, 'results_table': results_table.format(table=table), 'error': None}
+        started = time.perf_counter()
+        try:
+            if chunksize:  # the table is read throughout its analysis
+                with reads:
+                    record['rows'], record['findings'] = analyze(table, source_table=table, chunksize=chunksize)
+            else:  # not bound to a name here, so the frame as read is freed once compacted
+                record['rows'], record['findings'] = analyze(table, df=load(table))
+        except Exception as e:
+            record['error'] = f'{type(e).__name__}: {e}'
+        record['seconds'] = time.perf_counter() - started
+        return record
+
+    records = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run, table) for table in tables]
+        for future in as_completed(futures):
+            record = future.result()
+            records.append(record)
+            if running_config.VERBOSE:
+                status = record['error'] or f'{record["findings"]} findings'
+                print(f'[{len(records)}/{len(tables)}] {record["table"]}: {status} in {record["seconds"]:.1f}s')
+    return pd.DataFrame(records, columns=SUMMARY_COLUMNS)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('tables', nargs='+', help='table names, or one wildcard pattern such as "sales_*"')
+    parser.add_argument('--workers', type=int, default=4, help='tables analyzed at once')
+    parser.add_argument('--max-reads', type=int, default=2, help='tables read from the database at once')
+    parser.add_argument('--results-table', default='{table}_insights', help='{table} stands for the table')
+    parser.add_argument('--chunksize', type=int, help='stream the tables this many rows at a time')
+    parser.add_argument('--only-significant', action='store_true')
+    args = parser.parse_args(argv)
+
+    tables = args.tables[0] if len(args.tables) == 1 and any(c in args.tables[0] for c in '*?[') else args.tables
+    summary = run_tables(tables, workers=args.workers, max_concurrent_reads=args.max_reads,
+                         results_table=args.results_table, chunksize=args.chunksize,
+                         only_significant=args.only_significant)
+    print(summary.to_string(index=False))
+    return int(summary['error'].notnull().any())
+
+
+if __name__ == '__main__':
+    sys.exit(main())
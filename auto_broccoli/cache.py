@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""Cache of pair results across runs, keyed by the content of the two columns.
+
+Each column is fingerprinted from a hash of its values. A pair whose columns and analysis settings are unchanged since
+an earlier run is served from a local SQLite file instead of being tested again. The file is kept under a size limit
+by dropping the least recently used results.
+"""
+
+import hashlib
+import pickle
+import sqlite3
+import time
+
+import pandas as pd
+
+# part of every key: bump it when a change to the analysis changes the result of a pair whose columns and settings
+# are the same, so entries stored by earlier code are no longer served
+RESULT_VERSION = 1
+
+
+def column_fingerprint(series) -> str:
+    """Hex digest of a column's dtype and values, in row order. The name and the index are not part of it.
+
+    Args:
+        series: pandas Series, the column
+
+    Returns:
+        str
+    """
+    digest = hashlib.sha1(str(series.dtype).encode())
+    digest.update(pd.util.hash_pandas_object(series, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def result_key(analysis_type, pair, fingerprints, settings) -> str:
+    """Cache key of a pair's result, for the current RESULT_VERSION
+
+    Args:
+        analysis_type: str, key of analysis_func_dict
+        pair: list, the two columns
+        fingerprints: list, column_fingerprint of the two columns
+        settings: tuple, the analysis settings the result depends on, e.g. sig_level and only_significant
+
+    Returns:
+        str
+    """
+    key = (RESULT_VERSION, analysis_type, tuple(pair), tuple(fingerprints), settings)
+    return hashlib.sha1(repr(key).encode()).hexdigest()
+
+
+class ResultCache(object):
+    """SQLite store of (success, result dict) per result_key.
+
+    Args:
+        path: str, the cache file
+        max_bytes: int, size of the stored results above which the least recently used are dropped,
+                   default=256 MB
+        commit_every: int, writes between two commits, default=500
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 ** 2, commit_every=500):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.commit_every = commit_every
+        # an instance may be used from several threads, one at a time, e.g. by the service's thread pool
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS results "
+                                 "(key TEXT PRIMARY KEY, value BLOB, size INTEGER, last_used REAL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        self._size = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        self._pending = 0
+
+    def get(self, key):
+        """Cached (success, result dict) for a key, or None"""
+        row = self._connection.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self._connection.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        self._written()
+        return pickle.loads(row[0])
+
+    def put(self, key, success, result):
+        value = pickle.dumps((success, result), protocol=pickle.HIGHEST_PROTOCOL)
+        old = self._connection.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+        self._connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                                 (key, value, len(value), time.time()))
+        self._size += len(value) - (old[0] if old else 0)
+        if self._size > self.max_bytes:
+            self.evict(int(self.max_bytes * 0.9))
+        self._written()
+
+    def evict(self, target_bytes):
+        """Drops the least recently used results until the stored size is at most target_bytes"""
+        rows = self._connection.execute("SELECT key, size FROM results ORDER BY last_used").fetchall()
+        dropped = []
+        for key, size in rows:
+            if self._size <= target_bytes:
+                break
+            dropped.append((key,))
+            self._size -= size
+        self._connection.executemany("DELETE FROM results WHERE key = ?", dropped)
+
+    def _written(self):
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        self._connection.commit()
+        self._pending = 0
+
+    def clear(self):
+        self._connection.execute("DELETE FROM results")
+        self.commit()
+        self._size = 0
+
+    def close(self):
+        self.commit()
+        self._connection.close()
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
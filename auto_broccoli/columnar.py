@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""Parquet and Feather (Arrow IPC) input through pyarrow, an optional dependency.
+
+Files are memory-mapped: profiling reads them a record batch at a time, and the analysis loads only the columns that
+classification kept. Numeric columns of an uncompressed Feather file without missing values are handed to pandas
+without a copy, the pages stay shared with the operating system's file cache.
+"""
+
+import os
+
+import pandas as pd
+
+FORMATS = {'.parquet': 'parquet', '.pq': 'parquet', '.feather': 'feather', '.arrow': 'feather', '.ipc': 'feather'}
+
+
+def file_format(path) -> str:
+    """'parquet' or 'feather' from the file extension, None for other files"""
+    if not isinstance(path, (str, os.PathLike)):
+        return None
+    return FORMATS.get(os.path.splitext(str(path))[1].lower())
+
+
+def _pyarrow():
+    try:
+        import pyarrow  # optional dependency
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('Reading Parquet or Feather files needs pyarrow, which is not installed')
+    return pyarrow
+
+
+def iter_batches(path, batch_size, columns=None):
+    """Iterates over a Parquet or Feather file about batch_size rows at a time.
+
+    Args:
+        path: str, the file
+        batch_size: int, rows per batch. Feather files keep the record batches they were written with
+        columns: list, only read these columns, default=None (all columns)
+
+    Yields:
+        pandas DataFrame, the batches
+    """
+    pa = _pyarrow()
+    if file_format(path) == 'parquet':
+        batches = pa.parquet.ParquetFile(path, memory_map=True).iter_batches(batch_size=batch_size, columns=columns)
+        for batch in batches:
+            yield batch.to_pandas(split_blocks=True)
+    else:
+        with pa.memory_map(str(path), 'r') as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                table = pa.Table.from_batches([reader.get_batch(i)])
+                yield (table if columns is None else table.select(columns)).to_pandas(split_blocks=True)
+
+
+def read_columns(path, columns=None) -> pd.DataFrame:
+    """Loads some columns of a Parquet or Feather file in full.
+
+    Text columns come in as pandas categoricals, without building a Python string per row. Their categories are
+    sorted, as for a column read from CSV, instead of following the file's dictionary order. Ordered categoricals
+    keep their order.
+
+    Args:
+        path: str, the file
+        columns: list, the columns to read, default=None (all columns)
+
+    Returns:
+        pandas DataFrame
+    """
+    pa = _pyarrow()
+    if file_format(path) == 'parquet':
+        table = pa.parquet.read_table(path, columns=columns, memory_map=True)
+    else:
+        table = pa.feather.read_table(str(path), columns=columns, memory_map=True)
+    df = table.to_pandas(split_blocks=True, strings_to_categorical=True)
+    for column in df.columns:
+        if df[column].dtype.name == 'category' and not df[column].cat.ordered:
+            df[column] = df[column].cat.reorder_categories(df[column].cat.categories.sort_values())
+    return df
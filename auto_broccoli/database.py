@@ -1,29 +1,103 @@
 #!/usr/bin/env python
 
+import fnmatch
+import os
+import threading
+from contextlib import contextmanager
+
 import pandas as pd
-from sqlalchemy import create_engine
 
 import config
 
+_ENGINES = {}
+_ENGINES_LOCK = threading.Lock()
+
+
+def get_engine(database_uri):
+    """Returns the process-wide engine for a database, creating it on first use. Every DBInterface of a process
+    shares its connection pool. The process id is part of the key so forked workers build their own pool.
+
+    Args:
+        database_uri: str, SQLAlchemy database URI
+
+    Returns:
+        sqlalchemy Engine
+    """
+    from sqlalchemy import create_engine  # imported with the first engine, it is slow to load
+
+    key = (database_uri, os.getpid())
+    with _ENGINES_LOCK:
+        if key not in _ENGINES:
+            _ENGINES[key] = create_engine(database_uri)
+        return _ENGINES[key]
+
 
 class DBInterface(object):
     """Helper class for db access"""
 
-    def __init__(self, database_uri=None):
+    def __init__(self, database_uri=None, batch_size=None):
         if not database_uri:
-            self.engine = create_engine(config.IN_USE.SQLALCHEMY_DATABASE_URI)
+            self.database_uri = config.IN_USE.SQLALCHEMY_DATABASE_URI
         else:
-            self.engine = create_engine(database_uri)
+            self.database_uri = database_uri
+        self.batch_size = batch_size or config.IN_USE.DB_BATCH_SIZE
+        self._engine = None
+        self._schema_lock = threading.Lock()  # threads sharing this interface must not create a table twice
+
+    @property
+    def engine(self):
+        """The process-wide engine of the database, created on first use so runs that never touch the database
+        don't pay for it"""
+        if self._engine is None:
+            self._engine = get_engine(self.database_uri)
+        return self._engine
+
+    def table_names(self, pattern=None) -> list:
+        """Names of the tables in the database, sorted
+
+        Args:
+            pattern: str, shell-style wildcard the names must match, e.g. 'sales_*', default=None (all tables)
 
-    def load_from_table(self, table_name=None, where=None) -> pd.DataFrame:
+        Returns:
+            list
+        """
+        from sqlalchemy import inspect
+
+        names = sorted(inspect(self.engine).get_table_names())
+        return names if pattern is None else fnmatch.filter(names, pattern)
+
+    def quote(self, name) -> str:
+        """Quotes a table or column name for the engine's SQL dialect"""
+        return self.engine.dialect.identifier_preparer.quote(name)
+
+    @contextmanager
+    def _begin_write(self):
+        """Transaction for writing results. On sqlite it first switches the file to WAL, which lets readers carry on
+        during a write, and the connection to NORMAL sync, which skips an fsync per commit. WAL stays set in the
+        file, so a database that is only read from keeps its journal mode.
+
+        Yields:
+            sqlalchemy Connection
+        """
+        from sqlalchemy import text
+
+        with self.engine.begin() as connection:
+            if self.engine.dialect.name == 'sqlite':
+                connection.execute(text("PRAGMA journal_mode=WAL"))
+                connection.execute(text("PRAGMA synchronous=NORMAL"))
+            yield connection
+
+    def load_from_table(self, table_name=None, where=None, columns=None, chunksize=None):
         """Loads all data (or data matching where statement) from the database and returns a pandas dataframe.
 
         Args:
             table_name: name of table in SQLite db
             where: SQL where statement query option
+            columns: list, only read these columns, default=None (all columns)
+            chunksize: int, stream the rows through a server-side cursor this many at a time, default=None
 
         Return:
-            pandas Dataframe
+            pandas Dataframe, or an iterator of pandas Dataframes when chunksize is given
         """
         if not table_name:
             raise Exception("Missing table name.")
@@ -31,23 +105,128 @@ class DBInterface(object):
         if not where:
             where = ""
 
-        df = pd.read_sql_query("SELECT * FROM " + table_name + " " + where, con=self.engine)
+        projection = ", ".join(self.quote(column) for column in columns) if columns else "*"
+        query = "SELECT " + projection + " FROM " + self.quote(table_name) + " " + where
+        if chunksize:
+            return self._stream_query(query, chunksize)
+        df = pd.read_sql_query(query, con=self.engine)
         return df
 
-    def save_to_table(self, df, table_name=None, replace_or_append=config.IN_USE.DB_WRITE_MODE, verbose=False):
+    def _stream_query(self, query, chunksize):
+        with self.engine.connect() as connection:
+            connection = connection.execution_options(stream_results=True)
+            for chunk in pd.read_sql_query(query, con=connection, chunksize=chunksize):
+                yield chunk
+
+    def grouped_sums(self, table_name, group_column, value_columns, shifts=None, where=None) -> dict:
+        """Has the database compute per-group count, sum, sum of squares and min of several columns, so only one row
+        per group comes back instead of the raw rows.
+
+        Args:
+            table_name: name of table in the db
+            group_column: str, the column to group by
+            value_columns: list, the columns to aggregate
+            shifts: list, value subtracted from each column before summing to keep the sums well conditioned,
+                    default=None (no shift)
+            where: SQL where statement query option
+
+        Return:
+            dict of pandas Dataframes indexed by group value, one column per value column: n, s, ss and min.
+            min is not shifted. NULL groups are included with a NaN index.
+        """
+        if not table_name:
+            raise Exception("Missing table name.")
+
+        if shifts is None:
+            shifts = [0.0] * len(value_columns)
+        selects = [self.quote(group_column) + " AS grp"]
+        for i, (column, shift) in enumerate(zip(value_columns, shifts)):
+            value = "(" + self.quote(column) + " - " + repr(float(shift)) + ")"
+            selects += ["COUNT({0}) AS n_{1}".format(self.quote(column), i),
+                        "SUM({0}) AS s_{1}".format(value, i),
+                        "SUM({0} * {0}) AS ss_{1}".format(value, i),
+                        "MIN({0}) AS min_{1}".format(self.quote(column), i)]
+        query = "SELECT " + ", ".join(selects) + " FROM " + self.quote(table_name) + " " + (where or "") + \
+                " GROUP BY " + self.quote(group_column)
+        df = pd.read_sql_query(query, con=self.engine)
+        results = {}
+        for key in ('n', 's', 'ss', 'min'):
+            frame = pd.DataFrame({column: df[key + '_' + str(i)].values.astype(float)
+                                  for i, column in enumerate(value_columns)}, index=df['grp'].values,
+                                 columns=value_columns)
+            results[key] = frame if key == 'min' else frame.fillna(0.0)
+        return results
+
+    def clear_table(self, table_name=None):
+        """Deletes every row of a table and keeps its columns. Nothing happens when the table doesn't exist.
+
+        Args:
+            table_name: str, name of table in the db
+        Return:
+            None
+        """
+        if not table_name:
+            raise Exception("Missing table name.")
+
+        from sqlalchemy import text
+
+        with self._schema_lock:
+            if table_name in self.table_names():
+                with self._begin_write() as connection:
+                    connection.execute(text("DELETE FROM " + self.quote(table_name)))
+        return None
+
+    def save_to_table(self, df, table_name=None, replace_or_append=config.IN_USE.DB_WRITE_MODE, verbose=False,
+                      batch_size=None):
         """Save a pandas dataframe into a SQLite table
         Args:
             df: Pandas dataframe to save to table
             table_name: str, name of table in SQLite db
             replace_or_append: str, option on how to save the new data, default=replace
             verbose: bool, print feedback, default=False
+            batch_size: int, rows per multi-row insert, default=self.batch_size
         Return:
             None
         """
         if not table_name:
             raise Exception("Missing table name.")
 
-        df.to_sql(name=table_name, con=self.engine, if_exists=replace_or_append, index=False)
+        batch_size = batch_size or self.batch_size
+        # pandas creates (or replaces) the table with its usual column types, the rows go in as executemany batches
+        with self._schema_lock:
+            df.head(0).to_sql(name=table_name, con=self.engine, if_exists=replace_or_append, index=False)
+        from sqlalchemy import sql
+
+        insert = sql.table(table_name, *[sql.column(c) for c in df.columns]).insert()
+        batches = (self._records(df.iloc[start:start + batch_size]) for start in range(0, len(df), batch_size))
+        if self.engine.dialect.name == 'sqlite':
+            # a single transaction, sqlite pays a journal sync per commit
+            with self._begin_write() as connection:
+                for batch in batches:
+                    connection.execute(insert, batch)
+        else:
+            for batch in batches:
+                with self._begin_write() as connection:  # commit per batch
+                    connection.execute(insert, batch)
         if verbose:
             print("Saved to {}".format(table_name))
         return None
+
+    @staticmethod
+    def _records(df) -> list:
+        """Rows as dicts of plain python values with None for missing values, ready for executemany. Timestamps
+        become datetime objects and timedeltas integer nanoseconds, as pandas' to_sql stores them."""
+        columns = []
+        for name in df.columns:
+            series = df[name]
+            if pd.api.types.is_datetime64_any_dtype(series):
+                values = list(series.dt.to_pydatetime())
+            elif pd.api.types.is_timedelta64_dtype(series):
+                values = series.values.astype('timedelta64[ns]').view('i8').tolist()
+            else:
+                values = series.astype(object).tolist()
+            missing = series.isnull().values
+            if missing.any():
+                values = [None if m else v for v, m in zip(values, missing)]
+            columns.append(values)
+        return [dict(zip(df.columns, row)) for row in zip(*columns)]
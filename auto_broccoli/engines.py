@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+"""Batched statistics kernels for auto broccoli.
+
+Each analysis type gets all of its pairs computed in one vectorized pass instead of one scipy call per pair. The
+kernels work from sufficient statistics (counts, sums, sums of squares) so the results can also be built from
+accumulated or merged statistics.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import special
+
+
+def float_block(X, start, stop, shift=0.0, columns=None) -> np.ndarray:
+    """Rows start:stop of a 2-D array, or of some columns of a DataFrame, as floats minus shift, so only one block
+    at a time is converted"""
+    if isinstance(X, pd.DataFrame):
+        block = X.iloc[start:stop]
+        block = (block if columns is None else block[columns]).values
+    else:
+        block = X[start:stop]
+    return np.asarray(block, dtype=float) - shift
+
+
+def mean_shift(X, columns=None) -> np.ndarray:
+    """Mean of every column ignoring NaN, 0 for empty columns; a DataFrame is reduced column by column"""
+    if isinstance(X, pd.DataFrame):
+        means = [X[column].mean() for column in (X.columns if columns is None else columns)]
+    else:
+        means = np.nanmean(X, axis=0)
+    return np.nan_to_num(np.asarray(means, dtype=float))
+
+
+def comoment_sums(X, block_rows=100000, shift=0.0, columns=None) -> dict:
+    """Pairwise-complete sufficient statistics for the pearson correlation of every pair of columns.
+
+    For columns i and j, only the rows where both are present count towards entry [i, j].
+
+    Args:
+        X: numpy array or pandas DataFrame, 2-D of shape (rows, columns) with NaN for missing values, converted to
+           float a block at a time
+        block_rows: int, rows processed per block to bound temporary memory, default=100000
+        shift: float or array-like, subtracted from each column before summing to keep the sums well conditioned,
+               default=0.0
+        columns: list, the columns of a DataFrame X to use, default=None (all columns)
+
+    Returns:
+        dict of (columns, columns) arrays:
+            n: rows where both i and j are present
+            sx: sum of x_i over those rows
+            sxx: sum of x_i ** 2 over those rows
+            sxy: sum of x_i * x_j over those rows
+    """
+    k = X.shape[1] if columns is None else len(columns)
+    sums = {key: np.zeros((k, k)) for key in ('n', 'sx', 'sxx', 'sxy')}
+    for start in range(0, X.shape[0], block_rows):
+        block = float_block(X, start, start + block_rows, shift, columns)
+        present = ~np.isnan(block)
+        mask = present.astype(float)
+        z = np.where(present, block, 0.0)
+        sums['n'] += mask.T @ mask
+        sums['sx'] += z.T @ mask
+        sums['sxx'] += (z * z).T @ mask
+        sums['sxy'] += z.T @ z
+    return sums
+
+
+def pearson_from_sums(n, sx, sxx, sxy) -> (np.ndarray, np.ndarray):
+    """Pearson coefficients and two-sided p-values from the output of comoment_sums.
+
+    Pairs with fewer than 3 rows or no variance get NaN for both.
+
+    Returns:
+        numpy array, numpy array: coefficient matrix and p-value matrix
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sxy - sx * sx.T / n
+        var_x = sxx - sx ** 2 / n
+        var_y = var_x.T
+        coef = np.clip(cov / np.sqrt(var_x * var_y), -1.0, 1.0)
+        dof = n - 2
+        t = coef * np.sqrt(dof / ((1.0 - coef) * (1.0 + coef)))
+        p_val = 2 * special.stdtr(dof, -np.abs(t))
+    invalid = (n < 3) | ~(var_x > 0) | ~(var_y > 0)
+    coef[invalid] = np.nan
+    p_val[invalid] = np.nan
+    return coef, p_val
+
+
+def pearson_matrix(df, columns, shift=None) -> (pd.DataFrame, pd.DataFrame):
+    """All-pairs pearson correlation with pairwise-complete handling of missing values.
+
+    Args:
+        df: pandas DataFrame, the data
+        columns: list, the continuous columns to correlate
+        shift: array-like, a value near the middle of each column, e.g. the middle of its range, subtracted to keep
+               the sums well conditioned; the coefficients don't change, default=None (the column means)
+
+    Returns:
+        pandas DataFrame, pandas DataFrame: coefficients and p-values, both indexed and labeled by column
+    """
+    shift = mean_shift(df, columns) if shift is None else np.asarray(shift, dtype=float)
+    sums = comoment_sums(df, shift=shift, columns=columns)
+    coef, p_val = pearson_from_sums(**sums)
+    return pd.DataFrame(coef, index=columns, columns=columns), pd.DataFrame(p_val, index=columns, columns=columns)
+
+
+def grouped_moments(df, groups, block_columns=32) -> dict:
+    """Count, mean, sum of squared deviations (m2) and min of every column per group, from one groupby per block of
+    columns. Only block_columns columns at a time are upcast to float, not the whole frame.
+
+    Args:
+        df: pandas DataFrame, the continuous columns
+        groups: pandas Series, the group label of each row; rows labeled NaN are left out
+        block_columns: int, columns upcast and grouped together, default=32
+
+    Returns:
+        dict of pandas DataFrames indexed by group with one column per df column: count, mean, m2, min
+    """
+    parts = {'count': [], 'mean': [], 'm2': [], 'min': []}
+    for start in range(0, max(df.shape[1], 1), block_columns):
+        block = df.iloc[:, start:start + block_columns]
+        grouped = block.astype(float).groupby(groups)  # float32 columns would otherwise be averaged in float32
+        count = grouped.count()
+        parts['count'].append(count)
+        parts['mean'].append(grouped.mean())
+        parts['m2'].append(grouped.var(ddof=0) * count)
+        parts['min'].append(grouped.min())
+    return {key: pd.concat(frames, axis=1) for key, frames in parts.items()}
+
+
+def moments_summary(moments, group) -> pd.DataFrame:
+    """A describe()-like table for one group of grouped_moments output.
+
+    Args:
+        moments: dict, output of grouped_moments
+        group: the group label to summarize
+
+    Returns:
+        pandas DataFrame, rows count/mean/std/min/m2 and one column per variable; NaN if the group has no rows
+    """
+    row = {key: frame.reindex([group]).iloc[0] for key, frame in moments.items()}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        row['std'] = np.sqrt(row['m2'] / (row['count'] - 1))
+    return pd.DataFrame(row).T.reindex(['count', 'mean', 'std', 'min', 'm2'])
+
+
+def moments_from_sums(n, s, ss, shift=0.0) -> (np.ndarray, np.ndarray):
+    """Means and sums of squared deviations from counts, sums and sums of squares of shifted values.
+
+    Args:
+        n, s, ss: array-likes, output of grouped_sums
+        shift: float or array-like, the value subtracted from each column before summing, default=0.0
+
+    Returns:
+        numpy array, numpy array: mean and m2
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = s / n
+        m2 = np.maximum(ss - s * mean, 0.0)
+    return mean + shift, m2
+
+
+def ttest_summary(moments, pos=1, neg=0) -> (pd.DataFrame, pd.DataFrame, np.ndarray):
+    """t-tests every variable of grouped moments between two groups.
+
+    Args:
+        moments: dict, output of grouped_moments (or the same layout built from accumulated sums)
+        pos: the group label of the positive class, default=1
+        neg: the group label of the negative class, default=0
+
+    Returns:
+        pandas DataFrame, pandas DataFrame, numpy array: moments_summary of both groups and the p-values
+    """
+    pos_desc = moments_summary(moments, pos)
+    neg_desc = moments_summary(moments, neg)
+    t, p_val = ttest_from_moments(pos_desc.loc['count'], pos_desc.loc['mean'], pos_desc.loc['m2'],
+                                  neg_desc.loc['count'], neg_desc.loc['mean'], neg_desc.loc['m2'])
+    return pos_desc, neg_desc, p_val
+
+
+def ttest_from_moments(n1, mean1, m2_1, n2, mean2, m2_2, equal_var=True) -> (np.ndarray, np.ndarray):
+    """Independent two sample t-test from group moments, vectorized over any number of variables. Gives the same
+    results as stats.ttest_ind_from_stats.
+
+    Args:
+        n1, mean1, m2_1: array-likes, count, mean and sum of squared deviations of the first group
+        n2, mean2, m2_2: array-likes, the same for the second group
+        equal_var: bool, Student's t-test if True, Welch's t-test otherwise, default=True
+
+    Returns:
+        numpy array, numpy array: t statistics and two-sided p-values
+    """
+    n1, mean1, m2_1, n2, mean2, m2_2 = (np.asarray(a, dtype=float) for a in (n1, mean1, m2_1, n2, mean2, m2_2))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if equal_var:
+            dof = n1 + n2 - 2
+            pooled_var = (m2_1 + m2_2) / dof
+            denom = np.sqrt(pooled_var * (1.0 / n1 + 1.0 / n2))
+        else:
+            vn1 = m2_1 / (n1 - 1) / n1
+            vn2 = m2_2 / (n2 - 1) / n2
+            dof = (vn1 + vn2) ** 2 / (vn1 ** 2 / (n1 - 1) + vn2 ** 2 / (n2 - 1))
+            denom = np.sqrt(vn1 + vn2)
+        t = (mean1 - mean2) / denom
+        p_val = 2 * special.stdtr(dof, -np.abs(t))
+    return t, p_val
+
+
+def grouped_sums(codes, n_groups, X, block_rows=100000, shift=0.0, columns=None) -> dict:
+    """Per-group count, sum and sum of squares of every column, from bincount reductions over all columns at once.
+
+    Args:
+        codes: numpy array, integer group code of each row, -1 when the group is missing
+        n_groups: int, number of distinct codes
+        X: numpy array or pandas DataFrame, 2-D of shape (rows, columns) with NaN for missing values, converted to
+           float a block at a time
+        block_rows: int, rows processed per block to bound temporary memory, default=100000
+        shift: float or array-like, subtracted from each column before summing, default=0.0
+        columns: list, the columns of a DataFrame X to use, default=None (all columns)
+
+    Returns:
+        dict of (n_groups, columns) arrays: n, s (sum) and ss (sum of squares), of the shifted values
+    """
+    k = X.shape[1] if columns is None else len(columns)
+    size = n_groups * k
+    sums = {key: np.zeros(size) for key in ('n', 's', 'ss')}
+    for start in range(0, X.shape[0], block_rows):
+        block = float_block(X, start, start + block_rows, shift, columns)
+        block_codes = codes[start:start + block_rows].astype(np.intp)  # codes may come in a small integer type
+        present = ~np.isnan(block) & (block_codes >= 0)[:, None]
+        idx = (block_codes[:, None] * k + np.arange(k))[present]  # one bin per (group, column)
+        vals = block[present]
+        sums['n'] += np.bincount(idx, minlength=size)
+        sums['s'] += np.bincount(idx, weights=vals, minlength=size)
+        sums['ss'] += np.bincount(idx, weights=vals * vals, minlength=size)
+    return {key: value.reshape(n_groups, k) for key, value in sums.items()}
+
+
+def anova_from_sums(n, s, ss) -> (np.ndarray, np.ndarray):
+    """One-way ANOVA for every column from the output of grouped_sums. Gives the same results as stats.f_oneway
+    on the non-empty groups.
+
+    Columns with fewer than 2 non-empty groups or no within-group degrees of freedom get NaN.
+
+    Returns:
+        numpy array, numpy array: F statistics and p-values, one per column
+    """
+    total_n = n.sum(axis=0)
+    total_s = s.sum(axis=0)
+    n_groups = (n > 0).sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = np.where(n > 0, s ** 2 / n, 0.0).sum(axis=0) - total_s ** 2 / total_n
+        within = ss.sum(axis=0) - total_s ** 2 / total_n - between
+        df_between = n_groups - 1
+        df_within = total_n - n_groups
+        f = (between / df_between) / (within / df_within)
+        p_val = special.fdtrc(df_between, df_within, f)
+    invalid = (df_between < 1) | (df_within < 1)
+    f[invalid] = np.nan
+    p_val[invalid] = np.nan
+    return f, p_val
+
+
+def anova(codes, n_groups, X, shift=None, columns=None) -> (np.ndarray, np.ndarray):
+    """One-way ANOVA of every column of X across the groups in codes.
+
+    Args:
+        codes: numpy array, integer group code of each row, -1 when the group is missing
+        n_groups: int, number of distinct codes
+        X: numpy array or pandas DataFrame, 2-D of shape (rows, columns) with NaN for missing values
+        shift: array-like, a value near the middle of each column subtracted to keep the sums of squares well
+               conditioned; F doesn't change, default=None (the column means)
+        columns: list, the columns of a DataFrame X to use, default=None (all columns)
+
+    Returns:
+        numpy array, numpy array: F statistics and p-values, one per column
+    """
+    shift = mean_shift(X, columns) if shift is None else np.asarray(shift, dtype=float)
+    return anova_from_sums(**grouped_sums(codes, n_groups, X, shift=shift, columns=columns))
+
+
+def one_hot(codes, n_levels) -> 'sparse.csr_matrix':
+    """Sparse indicator matrix of several factorized columns side by side.
+
+    Args:
+        codes: list of numpy arrays, integer level code of each row per column, -1 when missing
+        n_levels: list of ints, number of levels per column
+
+    Returns:
+        scipy sparse matrix, shape (rows, sum(n_levels)) with a 1 at each row's level of each column
+    """
+    from scipy import sparse  # imported on first use, it is slow to load
+
+    offsets = np.concatenate([[0], np.cumsum(n_levels)[:-1]])
+    rows, cols = [], []
+    for column_codes, offset in zip(codes, offsets):
+        present = np.flatnonzero(column_codes >= 0)
+        rows.append(present)
+        cols.append(column_codes[present].astype(np.intp) + offset)
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    n_rows = len(codes[0]) if codes else 0
+    return sparse.csr_matrix((np.ones(len(rows), dtype=np.int64), (rows, cols)), shape=(n_rows, int(sum(n_levels))))
+
+
+def cooccurrence_counts(codes, n_levels, block_rows=1000000) -> np.ndarray:
+    """Every pairwise contingency table of several factorized columns from one sparse Gram-matrix product.
+
+    Block [i, j] of the result (rows of column i's levels, columns of column j's levels) is the crosstab of
+    column i against column j, counting only rows where both are present.
+
+    Args:
+        codes: list of numpy arrays, integer level code of each row per column, -1 when missing
+        n_levels: list of ints, number of levels per column
+        block_rows: int, rows encoded per block to bound the size of the indicator matrix, default=1000000
+
+    Returns:
+        numpy array, integer matrix of shape (sum(n_levels), sum(n_levels))
+    """
+    total = int(sum(n_levels))
+    gram = np.zeros((total, total), dtype=np.int64)
+    n_rows = len(codes[0]) if codes else 0
+    for start in range(0, n_rows, block_rows):
+        indicator = one_hot([c[start:start + block_rows] for c in codes], n_levels)
+        gram += (indicator.T @ indicator).toarray()
+    return gram
+
+
+def chi2_from_tables(tables, correction=True) -> (np.ndarray, np.ndarray):
+    """Chi-square test of independence for a stack of same-shaped contingency tables. Gives the same results as
+    stats.chi2_contingency after dropping empty rows and columns, Yates' correction included.
+
+    Args:
+        tables: numpy array, shape (tables, rows, columns) of observed counts
+        correction: bool, apply Yates' correction when a table has one degree of freedom, default=True
+
+    Returns:
+        numpy array, numpy array: chi-square statistics and p-values, one per table; NaN for empty tables
+    """
+    observed = np.asarray(tables, dtype=float)
+    row_sums = observed.sum(axis=2, keepdims=True)
+    col_sums = observed.sum(axis=1, keepdims=True)
+    total = observed.sum(axis=(1, 2), keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = row_sums * col_sums / total
+    dof = ((row_sums > 0).sum(axis=(1, 2)) - 1) * ((col_sums > 0).sum(axis=(1, 2)) - 1)
+    if correction:
+        diff = expected - observed
+        yates = np.sign(diff) * np.minimum(0.5, np.abs(diff))
+        observed = observed + np.where((dof == 1)[:, None, None], yates, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        chi2 = np.where(expected > 0, (observed - expected) ** 2 / expected, 0.0).sum(axis=(1, 2))
+        p_val = np.where(dof > 0, special.chdtrc(np.maximum(dof, 1), chi2), 1.0)
+    empty = total.ravel() == 0
+    chi2[empty] = np.nan
+    p_val[empty] = np.nan
+    return chi2, p_val
@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+"""Incremental analysis of append-only tables and files partitioned by a date column.
+
+The statistics the streaming passes gather are additive. This module keeps them per day (partition) in a SQLite
+file, together with the totals of the days before the last stored one (the watermark). A run reads the watermark day
+again, since it may have been loaded only in part, and the days after it. Their statistics replace the stored ones
+of those days, the days now followed by a later one are added to the totals. The columns are then classified and
+the insight functions run on the totals plus the last day. The findings are those of a streaming run over the whole
+history, for the cost of reading the new days.
+
+The pair statistics depend on the classification: the analyzed pairs, the levels of the categorical columns and the
+binary encodings. When new days change any of them, every stored day is read once more to rebuild them. Rows without
+a date are left out. Rows arriving later for a day before the watermark are not picked up.
+"""
+
+import copy
+import datetime as dt
+import hashlib
+import pickle
+import sqlite3
+
+import pandas as pd
+
+from auto_broccoli import streaming
+
+
+def partition_key(values) -> pd.Series:
+    """The day of each value as a 'YYYY-MM-DD' string, NaN where missing or not a date. Integers are read as
+    YYYYMMDD."""
+    if pd.api.types.is_integer_dtype(values):
+        dates = pd.to_datetime(values.astype(str), format='%Y%m%d', errors='coerce')
+    else:
+        dates = pd.to_datetime(values, errors='coerce')
+    return dates.dt.strftime('%Y-%m-%d').where(dates.notnull())
+
+
+def since_clause(dbi, column, since, integer_dates=False) -> str:
+    """SQL keeping the rows of the day `since` and after, in date order"""
+    order = " ORDER BY " + dbi.quote(column)
+    if since is None:
+        return order
+    bound = since.replace('-', '') if integer_dates else "'" + since + "'"
+    return "WHERE " + dbi.quote(column) + " >= " + bound + order
+
+
+class PartitionStore(object):
+    """SQLite file of the statistics of every stored day, and of their totals.
+
+    Args:
+        path: str, the file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS days "
+                                 "(day TEXT PRIMARY KEY, rows INTEGER, profile BLOB, pairs BLOB, layout TEXT)")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS totals (name TEXT PRIMARY KEY, value BLOB)")
+        self._connection.commit()
+
+    @property
+    def watermark(self) -> str:
+        """The last stored day, None when the store is empty"""
+        return self._connection.execute("SELECT MAX(day) FROM days").fetchone()[0]
+
+    def days(self, since=None, before=None) -> list:
+        """The stored days, sorted, optionally from the day `since` and up to the day before `before`"""
+        return [row[0] for row in self._connection.execute(
+            "SELECT day FROM days WHERE day >= ? AND day < ? ORDER BY day", (since or '', before or '~'))]
+
+    def stale_days(self, layout) -> list:
+        """Days whose pair statistics are missing or were gathered for another layout"""
+        return [row[0] for row in self._connection.execute(
+            "SELECT day FROM days WHERE layout IS NULL OR layout != ? ORDER BY day", (layout,))]
+
+    def get(self, name, default=None):
+        """A stored total"""
+        row = self._connection.execute("SELECT value FROM totals WHERE name = ?", (name,)).fetchone()
+        return default if row is None else pickle.loads(row[0])
+
+    def put(self, name, value):
+        self._connection.execute("INSERT OR REPLACE INTO totals VALUES (?, ?)",
+                                 (name, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+
+    def get_day(self, day, field):
+        """The 'profile' or 'pairs' accumulator of a day, None if not stored"""
+        row = self._connection.execute(f"SELECT {field} FROM days WHERE day = ?", (day,)).fetchone()
+        return None if row is None or row[0] is None else pickle.loads(row[0])
+
+    def put_profile(self, day, rows, accumulator):
+        """Stores a day's first pass statistics, its pair statistics are gathered later"""
+        self._connection.execute("INSERT OR REPLACE INTO days VALUES (?, ?, ?, NULL, NULL)",
+                                 (day, rows, pickle.dumps(accumulator, protocol=pickle.HIGHEST_PROTOCOL)))
+
+    def put_pairs(self, day, accumulator, layout):
+        self._connection.execute("UPDATE days SET pairs = ?, layout = ? WHERE day = ?",
+                                 (pickle.dumps(accumulator, protocol=pickle.HIGHEST_PROTOCOL), layout, day))
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        self._connection.close()
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM days").fetchone()[0]
+
+
+def open_store(ab) -> PartitionStore:
+    if isinstance(ab.partition_store, str):
+        ab.partition_store = PartitionStore(ab.partition_store)
+    return ab.partition_store
+
+
+def iter_days(ab, since=None, columns=None, integer_dates=False):
+    """Iterates over the source a chunk at a time, keeping the rows of the day `since` and after.
+
+    Args:
+        ab: AutoBroccoli, reading a table or a file in chunks, with a partition_by column
+        since: str, the first day to keep, default=None (every day)
+        columns: list, only read these columns and the date column, default=None (all columns)
+        integer_dates: bool, the table stores days as YYYYMMDD integers, default=False
+
+    Yields:
+        list of (str, pandas DataFrame), the days of a chunk and their rows
+    """
+    where = None
+    if ab.source_table:  # the database filters and sorts, so a day comes in consecutive chunks
+        where = since_clause(ab.dbi, ab.partition_by, since, integer_dates=integer_dates)
+    if columns is not None and ab.partition_by not in columns:
+        columns = list(columns) + [ab.partition_by]
+    for chunk in ab.read_chunks(columns=columns, where=where):
+        keys = partition_key(chunk[ab.partition_by])
+        keep = keys.notnull() if since is None else keys.notnull() & (keys >= since)
+        yield list(chunk[keep.values].groupby(keys[keep].values, sort=True))
+
+
+def accumulate(ab, new, flush, since=None, columns=None, only=None, integer_dates=False):
+    """Feeds the rows of each day to an accumulator of that day. A day's accumulator goes to flush as soon as a
+    chunk without rows of that day is read, and at the end. A day of an unsorted source can be flushed several times.
+
+    Args:
+        ab: AutoBroccoli, see iter_days
+        new: callable, new(day) returns an empty accumulator
+        flush: callable, flush(day, accumulator) takes a filled one
+        since: str, the first day to accumulate, default=None (every day)
+        columns: list, only read these columns, default=None (all columns)
+        only: set, days to accumulate, default=None (every day from `since`)
+        integer_dates: bool, see iter_days
+
+    Returns:
+        list, the days accumulated, sorted
+    """
+    seen, open_days = set(), {}
+    for pieces in iter_days(ab, since=since, columns=columns, integer_dates=integer_dates):
+        days = set()
+        for day, rows in pieces:
+            if only is not None and day not in only:
+                continue
+            if day not in open_days:
+                open_days[day] = new(day)
+            open_days[day].update(rows)
+            days.add(day)
+        for day in sorted(set(open_days) - days):
+            flush(day, open_days.pop(day))
+        seen |= days
+    for day in sorted(open_days):
+        flush(day, open_days.pop(day))
+    return sorted(seen)
+
+
+def close_days(store, name, field, watermark, empty):
+    """Adds the stored days before the watermark that are not in the closed total `name` yet, and stores it.
+
+    Args:
+        store: PartitionStore
+        name: str, the total, 'closed_profile' or 'closed_pairs'
+        field: str, the per-day statistics it adds up, 'profile' or 'pairs'
+        watermark: str, the last stored day, left out of the total
+        empty: callable, empty() returns an accumulator without rows for a store without that total
+
+    Returns:
+        the closed total merged with the watermark day's statistics, a copy
+    """
+    total = store.get(name)
+    if total is None:
+        total = empty()
+    for day in store.days(since=store.get(name + '_through'), before=watermark):
+        total.merge(store.get_day(day, field))
+    store.put(name, total)
+    store.put(name + '_through', watermark)
+    total = copy.deepcopy(total)
+    total.merge(store.get_day(watermark, field))
+    return total
+
+
+def profile(ab) -> (pd.DataFrame, dict):
+    """First pass: gathers the column statistics of the watermark day and the days after it, then profiles them
+    together with the stored totals of the days before. The days are stored in one transaction.
+
+    Args:
+        ab: AutoBroccoli, reading a table or a file in chunks, with a partition_by column and partition_store
+
+    Returns:
+        pandas DataFrame, dict: the profile of the whole history and the ColumnStats of every column
+    """
+    store = open_store(ab)
+    since = store.watermark
+    reference = store.get_day(since, 'profile') if since is not None else None
+    integer_dates = reference is not None and \
+        pd.api.types.is_integer_dtype(reference.accumulators[ab.partition_by].dtype)
+    written = set()
+
+    def new(day):
+        nonlocal reference
+        if reference is None or reference.shift is None:
+            # its first rows set the shift every other day shares
+            reference = streaming.ProfileAccumulator(max_distinct=ab.running_config.EXACT_DISTINCT_LIMIT)
+            return reference
+        return reference.like()
+
+    def flush(day, accumulator):
+        if reference is not accumulator and set(accumulator.accumulators) != set(reference.accumulators):
+            raise ValueError(f'The columns of the source differ from the ones stored in {store.path}, '
+                             f'start a new partition store')
+        if day in written:  # a day an unsorted file spreads over several chunks
+            stored = store.get_day(day, 'profile')
+            stored.merge(accumulator)
+            accumulator = stored
+        store.put_profile(day, next(iter(accumulator.accumulators.values())).length, accumulator)
+        written.add(day)
+
+    try:
+        days = accumulate(ab, new, flush, since=since, integer_dates=integer_dates)
+        if store.watermark is None:
+            raise ValueError(f'No rows of {ab.dataset} have a date in {ab.partition_by}')
+        total = close_days(store, 'closed_profile', 'profile', store.watermark, reference.like)
+        store.commit()
+    except Exception:
+        store.rollback()
+        raise
+    if ab.running_config.VERBOSE:
+        print(f'{len(days)} partitions read from {since}, {len(store)} in total')
+    return total.result()
+
+
+def layout_key(tasks, accumulator) -> str:
+    """What the pair statistics of a day depend on: the pairs, the levels, the shifts and the binary encodings"""
+    layout = (tasks, sorted(accumulator.levels.items()), list(zip(accumulator.cont_columns, accumulator.shift)),
+              sorted(accumulator.binary_encodings.items()))
+    return hashlib.sha1(repr(layout).encode()).hexdigest()
+
+
+def iter_tasks(ab, tasks, start=0):
+    """Incremental version of streaming.iter_tasks: gathers the pair statistics of the days that lack them, adds them
+    up with the stored totals and runs the insight functions on the sums.
+
+    Args:
+        ab: AutoBroccoli, profiled with profile() and classified
+        tasks: list, (analysis type, pair) tuples
+        start: int, position of the first task to run, default=0
+
+    Yields:
+        (int, dict), position of the task in tasks and its finding's result dict
+    """
+    store = open_store(ab)
+    shifts = store.get('shifts', {})
+
+    def new(day=None):
+        return streaming.PairAccumulator(tasks, ab._column_stats, ab.binary_encodings, shifts=shifts)
+
+    total = new()
+    shifts.update(zip(total.cont_columns, total.shift))  # kept for good, so new days don't change the layout
+    layout = layout_key(tasks, total)
+    try:
+        if store.get('layout') != layout:  # every day is gathered again
+            store.put('closed_pairs', None)
+            store.put('closed_pairs_through', None)
+        stale = store.stale_days(layout)
+        if total.columns:
+            if stale:
+                if ab.running_config.VERBOSE and len(stale) > 1:
+                    print(f'Gathering the pair statistics of {len(stale)} partitions')
+                written = set()
+
+                def flush(day, accumulator):
+                    if day in written:
+                        stored = store.get_day(day, 'pairs')
+                        stored.merge(accumulator)
+                        accumulator = stored
+                    store.put_pairs(day, accumulator, layout)
+                    written.add(day)
+
+                with ab.instrument('stream pass'):
+                    accumulate(ab, new, flush, since=stale[0], columns=total.columns, only=set(stale),
+                               integer_dates=pd.api.types.is_integer_dtype(ab._column_stats[ab.partition_by].dtype))
+            total = close_days(store, 'closed_pairs', 'pairs', store.watermark, new)
+        store.put('shifts', shifts)
+        store.put('layout', layout)
+        store.commit()
+    except Exception:
+        store.rollback()
+        raise
+    yield from streaming.iter_accumulated(ab, total, tasks, start=start)
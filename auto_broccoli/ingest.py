@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""Memory-compact ingestion of a frame before it is analyzed.
+
+Integers are downcast to the smallest type holding their range, floats to float32 when no value changes, and text
+columns with few distinct values become pandas categoricals, stored as small integer codes. The analysis works on
+the codes directly, see factorize.
+"""
+
+import numpy as np
+import pandas as pd
+
+from auto_broccoli import sketches
+
+
+def compact_column(series, max_category_ratio=0.5) -> pd.Series:
+    """Smallest lossless representation of a column
+
+    Args:
+        series: pandas Series, the column
+        max_category_ratio: float, text columns with at most this many distinct values per row become
+                            categoricals, default=0.5
+
+    Returns:
+        pandas Series, the same values in a compact dtype, or the column itself when nothing smaller fits
+    """
+    dtype = series.dtype
+    if dtype.name == 'category' or pd.api.types.is_bool_dtype(dtype) or not len(series):
+        return series
+    if pd.api.types.is_integer_dtype(dtype) and isinstance(dtype, np.dtype):
+        return pd.to_numeric(series, downcast='unsigned' if series.min() >= 0 else 'integer')
+    if pd.api.types.is_float_dtype(dtype) and isinstance(dtype, np.dtype) and dtype.itemsize > 4:
+        values = series.values
+        narrowed = values.astype(np.float32)
+        if ((narrowed == values) | np.isnan(values)).all():  # every value survives the round trip
+            return pd.Series(narrowed, index=series.index, name=series.name)
+        return series
+    if pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
+        limit = max_category_ratio * len(series)
+        try:
+            if sketches.estimate_distinct(series) > 1.05 * limit + 1000:  # clearly too many, skip the exact count
+                return series
+            if series.nunique() <= limit:
+                return series.astype('category')
+        except TypeError:  # unhashable or unorderable values stay as they are
+            pass
+    return series
+
+
+def compact_frame(df, max_category_ratio=0.5) -> (pd.DataFrame, pd.DataFrame):
+    """Applies compact_column to every column
+
+    Args:
+        df: pandas DataFrame, the data, left unchanged
+        max_category_ratio: float, see compact_column, default=0.5
+
+    Returns:
+        pandas DataFrame, pandas DataFrame: the compacted data, and per column the dtype and bytes before and after
+    """
+    columns, report = {}, {}
+    for column in df.columns:
+        before = df[column]
+        after = compact_column(before, max_category_ratio=max_category_ratio)
+        columns[column] = after
+        report[column] = {'dtype_before': str(before.dtype), 'dtype_after': str(after.dtype),
+                          'bytes_before': before.memory_usage(index=False, deep=True),
+                          'bytes_after': after.memory_usage(index=False, deep=True)}
+    compacted = pd.DataFrame(columns, index=df.index, columns=df.columns)
+    report = pd.DataFrame.from_dict(report, orient='index')[['dtype_before', 'dtype_after', 'bytes_before',
+                                                              'bytes_after']]
+    return compacted, report
+
+
+def factorize(series, sort=True) -> (np.ndarray, np.ndarray):
+    """pd.factorize that takes the codes of a categorical column as they are instead of hashing its values again.
+    Categories no row uses are dropped, missing values get code -1.
+
+    Args:
+        series: pandas Series, the column
+        sort: bool, levels in sorted order (category order for categoricals), default=True
+
+    Returns:
+        numpy array, numpy array: the codes and the levels they index
+    """
+    if series.dtype.name != 'category':
+        codes, levels = pd.factorize(series, sort=sort)
+        return codes, np.asarray(levels)
+    codes = np.asarray(series.cat.codes, dtype=np.intp)
+    levels = np.asarray(series.cat.categories)
+    used = np.bincount(codes[codes >= 0], minlength=len(levels)) > 0
+    if not used.all():
+        remap = np.cumsum(used) - 1
+        codes = np.where(codes >= 0, remap[np.maximum(codes, 0)], -1)
+        levels = levels[used]
+    return codes, levels
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""Timing and memory records of the pipeline stages and of every analysis call.
+
+AutoBroccoli passes a record dict to each of its hooks when a stage, a batch pass or a pair's insight function
+finishes. TimingRecorder is a hook that keeps them for a report or for saving next to the insights table.
+"""
+
+import os
+import sys
+import time
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    resource = None  # not available on Windows, peak RSS deltas are left empty
+
+RECORD_COLUMNS = ['stage', 'analysis_type', 'col_1', 'col_2', 'rows', 'wall_seconds', 'cpu_seconds',
+                  'peak_rss_delta_bytes', 'error', 'pid', 'started_at', 'date', 'dataset']
+
+
+def peak_rss() -> int:
+    """High-water mark of the process' resident memory in bytes, None when unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # kilobytes on linux
+
+
+class Probe(object):
+    """Measures one step from creation until stop() is called.
+
+    Args:
+        record: dict, the fields describing the step; the measurements are added to it
+    """
+
+    def __init__(self, record):
+        self.record = record
+        self.record['started_at'] = time.time()
+        self._rss = peak_rss()
+        self._cpu = time.process_time()
+        self._wall = time.perf_counter()
+
+    def stop(self, error=None) -> dict:
+        """Adds the measurements to the record and returns it. peak_rss_delta_bytes is how much the step raised the
+        process' peak memory, 0 when it stayed under an earlier peak."""
+        self.record['wall_seconds'] = time.perf_counter() - self._wall
+        self.record['cpu_seconds'] = time.process_time() - self._cpu
+        rss = peak_rss()
+        self.record['peak_rss_delta_bytes'] = None if rss is None else rss - self._rss
+        self.record['error'] = None if error is None else type(error).__name__
+        self.record['pid'] = os.getpid()
+        return self.record
+
+
+class TimingRecorder(object):
+    """Hook keeping every record it receives"""
+
+    def __init__(self):
+        self.records = []
+
+    def __call__(self, record):
+        self.records.append(record)
+
+    def clear(self):
+        self.records = []
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.records, columns=RECORD_COLUMNS)
+
+    def report(self) -> pd.DataFrame:
+        """Totals per stage and analysis type, most expensive first
+
+        Returns:
+            pandas DataFrame, calls, wall/cpu seconds totals, slowest call and largest peak RSS increase
+        """
+        df = self.to_frame()
+        df['analysis_type'] = df['analysis_type'].fillna('')
+        report = df.groupby(['stage', 'analysis_type']).agg(
+            {'wall_seconds': ['count', 'sum', 'max'], 'cpu_seconds': 'sum', 'peak_rss_delta_bytes': 'max'})
+        report.columns = ['calls', 'wall_seconds', 'slowest_call_seconds', 'cpu_seconds', 'peak_rss_delta_bytes']
+        return report.sort_values('wall_seconds', ascending=False)
+
+    def slowest_pairs(self, n=20) -> pd.DataFrame:
+        """The n pair calls that took the longest, to decide which columns to exclude"""
+        df = self.to_frame()
+        pairs = df[df['stage'] == 'pair']
+        return pairs.nlargest(n, 'wall_seconds')[['analysis_type', 'col_1', 'col_2', 'rows', 'wall_seconds',
+                                                 'cpu_seconds', 'peak_rss_delta_bytes']]
+
+    def save(self, dbi, table_name, replace_or_append='append'):
+        """Writes the records through a DBInterface, e.g. to a table next to the insights table
+
+        Args:
+            dbi: DBInterface, the connection to write through
+            table_name: str, the table
+            replace_or_append: str, default='append'
+        """
+        if self.records:
+            dbi.save_to_table(self.to_frame(), table_name=table_name, replace_or_append=replace_or_append)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""Process pool execution of the auto analysis pairs.
+
+The columns the pairs need are written once to memory-mapped .npy files. Workers open them read-only instead of
+receiving a pickled copy of the whole frame. Non-numeric columns are shared as integer codes plus their levels.
+"""
+
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from auto_broccoli import utils, instrumentation, ingest
+
+_WORKER = None  # the AutoBroccoli instance of the current worker process
+
+
+def share_columns(df, columns, folder) -> dict:
+    """Writes columns to memory-mappable files.
+
+    Args:
+        df: pandas DataFrame, the data
+        columns: list, the columns to share
+        folder: str, directory for the .npy files
+
+    Returns:
+        dict, column -> (path, levels); levels is None for numeric columns, otherwise the values the codes index
+    """
+    spec = {}
+    for i, column in enumerate(columns):
+        series = df[column]
+        if pd.api.types.is_numeric_dtype(series):
+            values, levels = series.values, None
+        else:
+            values, levels = ingest.factorize(series)
+            levels = list(levels)
+        path = os.path.join(folder, f'{i}.npy')
+        np.save(path, np.asarray(values))
+        spec[column] = (path, levels)
+    return spec
+
+
+def load_columns(spec) -> pd.DataFrame:
+    """Rebuilds a frame from share_columns output on top of read-only memory maps"""
+    data = {}
+    for column, (path, levels) in spec.items():
+        values = np.load(path, mmap_mode='r')
+        if levels is None:
+            data[column] = pd.Series(values, copy=False)
+        else:
+            data[column] = pd.Series(pd.Categorical.from_codes(values, levels))
+    return pd.DataFrame(data, columns=list(spec), copy=False)
+
+
+def _init_worker(spec, settings, instrumented):
+    global _WORKER
+    from auto_broccoli.auto_broccoli import AutoBroccoli
+
+    run_date, dataset = settings.pop('run_date'), settings.pop('dataset')
+    hooks = [instrumentation.TimingRecorder()] if instrumented else None
+    _WORKER = AutoBroccoli(df=load_columns(spec), hooks=hooks, **settings)
+    _WORKER.run_date, _WORKER.dataset = run_date, dataset
+
+
+def _run_chunk(chunk) -> (list, list):
+    offset, tasks = chunk
+    results = [(offset + i, result) for i, result in _WORKER.iter_tasks(tasks)]
+    records = []
+    for recorder in _WORKER.hooks:  # sent back to the parent's hooks
+        records, recorder.records = recorder.records, []
+    return results, records
+
+
+def iter_tasks(ab, tasks, workers, start=0, chunks_per_worker=4):
+    """Parallel version of AutoBroccoli.iter_tasks.
+
+    Tasks are split into contiguous chunks. Pairs sharing a column mostly land in the same chunk, so each worker's
+    batch passes still cover many pairs at once. A chunk's findings are yielded as soon as it and every chunk
+    before it are done, so they come in task order whatever the scheduling.
+
+    Args:
+        ab: AutoBroccoli, the instance whose (already classified) data is analyzed
+        tasks: list, (analysis type, pair) tuples
+        workers: int, number of worker processes
+        start: int, position of the first task to run, default=0
+        chunks_per_worker: int, chunks handed to each worker on average, for load balancing, default=4
+
+    Yields:
+        (int, dict), position of the task in tasks and its finding's result dict
+    """
+    if start >= len(tasks):
+        return
+    columns = utils.ordered_unique(col for k, pair in tasks[start:] for col in pair)
+    chunk_size = math.ceil((len(tasks) - start) / (workers * chunks_per_worker))
+    chunks = [(i, tasks[i:i + chunk_size]) for i in range(start, len(tasks), chunk_size)]
+    settings = ab.worker_settings()
+
+    folder = tempfile.mkdtemp(prefix='auto_broccoli_')
+    try:
+        spec = share_columns(ab.df, columns, folder)
+        initargs = (spec, settings, bool(ab.hooks))
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+            for chunk_results, records in pool.imap(_run_chunk, chunks):
+                for record in records:
+                    for hook in ab.hooks:
+                        hook(record)
+                yield from chunk_results
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
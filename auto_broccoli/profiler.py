@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+"""Lightweight column profiler for auto broccoli.
+
+Builds the same table as pp.ProfileReport(df).get_description()['variables'], but only with the fields that
+AutoBroccoli.classify_column_types reads. No histograms, quantiles, extra correlation matrices or HTML payload.
+"""
+
+import numpy as np
+import pandas as pd
+
+from auto_broccoli import utils
+
+TYPE_NUM = 'NUM'
+TYPE_CAT = 'CAT'
+TYPE_BOOL = 'BOOL'
+TYPE_DATE = 'DATE'
+S_TYPE_CONST = 'CONST'
+S_TYPE_UNIQUE = 'UNIQUE'
+S_TYPE_CORR = 'CORR'
+S_TYPE_UNSUPPORTED = 'UNSUPPORTED'
+
+PROFILE_COLUMNS = ['type', 'count', 'n_missing', 'distinct_count', 'p_unique', 'is_unique', 'mode',
+                   'correlation_var', 'correlation']
+
+
+def get_vartype(dtype, distinct_count, length) -> str:
+    """Same type rules as pandas profiling 1.4.x so the classification step does not change.
+
+    Args:
+        dtype: numpy or pandas dtype of the column
+        distinct_count: int, number of distinct values, counting NaN as a value
+        length: int, number of rows
+
+    Returns:
+        str, one of the TYPE_* / S_TYPE_* constants
+    """
+    if distinct_count <= 1:
+        return S_TYPE_CONST
+    elif pd.api.types.is_bool_dtype(dtype) or (distinct_count == 2 and pd.api.types.is_numeric_dtype(dtype)):
+        return TYPE_BOOL
+    elif pd.api.types.is_numeric_dtype(dtype):
+        return TYPE_NUM
+    elif pd.api.types.is_datetime64_any_dtype(dtype):
+        return TYPE_DATE
+    elif distinct_count == length:
+        return S_TYPE_UNIQUE
+    else:
+        return TYPE_CAT
+
+
+class ColumnStats(object):
+    """Statistics for one column, computed from a single value_counts pass and shared by the profiler,
+    classify_column_types and the insight functions so the column is not rescanned for each of them.
+
+    Args:
+        series: pandas Series, the column to summarize
+    """
+
+    def __init__(self, series):
+        value_counts = series.value_counts(dropna=False)  # raises TypeError on unhashable values
+        self._summarize(series.name, len(series), series.dtype, value_counts)
+
+    @classmethod
+    def from_value_counts(cls, name, length, dtype, value_counts, count=None, distinct_count_with_nan=None,
+                          minimum=None, maximum=None, approximate=False):
+        """Builds the statistics from value counts gathered elsewhere, e.g. merged over the chunks of a file.
+
+        When value_counts was truncated, count, distinct_count_with_nan, minimum and maximum give the true values.
+        approximate marks a distinct count estimated by sketches.
+
+        Returns:
+            ColumnStats
+        """
+        stats = cls.__new__(cls)
+        stats._summarize(name, length, dtype, value_counts, count, distinct_count_with_nan, minimum, maximum)
+        stats.approximate = approximate
+        return stats
+
+    def _summarize(self, name, length, dtype, value_counts, count=None, distinct_count_with_nan=None,
+                   minimum=None, maximum=None):
+        self.name = name
+        self.approximate = False  # distinct count and value counts from sketches, see streaming.ColumnAccumulator
+        self.length = length
+        self.dtype = dtype
+        self.is_numeric = pd.api.types.is_numeric_dtype(dtype)
+        present = value_counts.index.notnull() & (value_counts > 0).values  # categoricals list unused categories
+        self.value_counts = value_counts[present].sort_values(ascending=False)
+        self.count = int(self.value_counts.sum()) if count is None else count
+        self.n_missing = self.length - self.count
+        if distinct_count_with_nan is None:
+            distinct_count_with_nan = len(self.value_counts) + int(self.n_missing > 0)
+        self.distinct_count_with_nan = distinct_count_with_nan
+        self.distinct_count = distinct_count_with_nan - int(self.n_missing > 0)
+        if self.is_numeric and self.count:
+            self.min = self.value_counts.index.min() if minimum is None else minimum
+            self.max = self.value_counts.index.max() if maximum is None else maximum
+        else:
+            self.min = self.max = np.nan
+
+    @property
+    def values(self) -> list:
+        """Distinct non-null values, most frequent first"""
+        return self.value_counts.index.tolist()
+
+    @property
+    def counts(self) -> list:
+        """Frequencies matching self.values"""
+        return self.value_counts.tolist()
+
+    @property
+    def mode(self):
+        return self.value_counts.index[0] if len(self.value_counts) else np.nan
+
+    @property
+    def is_contiguous(self) -> bool:
+        """True when the distinct values are a run of consecutive integers, e.g. 1-5 star ratings"""
+        if not self.is_numeric or not len(self.value_counts):
+            return False
+        return utils.check_list_is_contiguous(self.values)
+
+
+def column_stats(series, max_exact=None, block_size=65536) -> ColumnStats:
+    """ColumnStats of a column. With max_exact the column is counted a block at a time, and past max_exact distinct
+    values it is summarized by sketches, so no hash table of all its values is built. Categorical and boolean
+    columns are always counted exactly, it is cheap for them.
+
+    Args:
+        series: pandas Series, the column
+        max_exact: int, distinct values to count exactly, default=None (no limit)
+        block_size: int, rows counted at a time, default=65536
+
+    Returns:
+        ColumnStats
+    """
+    if max_exact is None or series.dtype.name == 'category' or pd.api.types.is_bool_dtype(series.dtype):
+        return ColumnStats(series)
+    from auto_broccoli import streaming  # streaming builds on this module
+
+    accumulator = streaming.ColumnAccumulator(series.name, max_distinct=max_exact)
+    for start in range(0, len(series), block_size):
+        accumulator.update(series.iloc[start:start + block_size])
+    return accumulator.to_stats()
+
+
+def describe_column(series, stats=None) -> dict:
+    """Profiles one column from a single value_counts pass.
+
+    Args:
+        series: pandas Series, the column to profile
+        stats: ColumnStats, already computed statistics for the column, default=None
+
+    Returns:
+        dict, profile fields keyed like the pandas profiling description
+    """
+    if stats is None:
+        try:
+            stats = ColumnStats(series)
+        except TypeError:  # unhashable values such as lists or dicts
+            return {'type': S_TYPE_UNSUPPORTED, 'count': series.count(), 'n_missing': len(series) - series.count()}
+    return describe_stats(stats)
+
+
+def describe_stats(stats) -> dict:
+    """Profile fields of a column from its ColumnStats
+
+    Args:
+        stats: ColumnStats, the statistics of the column
+
+    Returns:
+        dict, profile fields keyed like the pandas profiling description
+    """
+    return {
+        'type': get_vartype(stats.dtype, stats.distinct_count_with_nan, stats.length),
+        'count': stats.count,
+        'n_missing': stats.n_missing,
+        'distinct_count': stats.distinct_count_with_nan,
+        'p_unique': stats.distinct_count_with_nan / stats.length if stats.length else np.nan,
+        'is_unique': stats.distinct_count_with_nan == stats.length,
+        'mode': stats.mode,
+    }
+
+
+def flag_correlated(profile, corr, threshold=0.9) -> pd.DataFrame:
+    """Marks numeric columns that are highly correlated with an earlier numeric column as CORR, the same way
+    pandas profiling does.
+
+    Args:
+        profile: pandas DataFrame, output of describe_column for each column
+        corr: pandas DataFrame, pearson correlation matrix covering at least the NUM columns
+        threshold: float, correlation above which the later column is flagged
+
+    Returns:
+        pandas DataFrame, the profile with CORR rows filled in
+    """
+    num_cols = [column for column in profile.index[profile['type'] == TYPE_NUM] if column in corr.index]
+    if len(num_cols) < 2:
+        return profile
+    corr = corr.loc[num_cols, num_cols].values
+    for i, x in enumerate(num_cols):
+        for j in range(i):
+            if corr[i, j] > threshold:
+                profile.loc[x, ['type', 'correlation_var', 'correlation']] = [S_TYPE_CORR, num_cols[j], corr[i, j]]
+                break
+    return profile
+
+
+def to_profile(rows, columns) -> pd.DataFrame:
+    """Assembles describe_column outputs into the profile table
+
+    Args:
+        rows: dict, column name -> describe_column output
+        columns: list, the column order
+
+    Returns:
+        pandas DataFrame, one row per column indexed by column name
+    """
+    profile = pd.DataFrame.from_dict(rows, orient='index').reindex(index=columns, columns=PROFILE_COLUMNS)
+    profile['type'] = profile['type'].astype(object)
+    profile['correlation_var'] = profile['correlation_var'].astype(object)
+    return profile
+
+
+def describe(df, stats=None, check_correlation=True, correlation_threshold=0.9, max_exact=None) -> pd.DataFrame:
+    """Drop-in replacement for pp.ProfileReport(df).get_description()['variables'].
+
+    Args:
+        df: pandas DataFrame, the data to profile
+        stats: dict, cache of column name -> ColumnStats; missing columns are computed and added to it, default=None
+        check_correlation: bool, flag highly correlated numeric columns as CORR, default=True
+        correlation_threshold: float, pearson coefficient above which a column is flagged, default=0.9
+        max_exact: int, see column_stats, default=None (count every column exactly)
+
+    Returns:
+        pandas DataFrame, one row per column indexed by column name
+    """
+    if stats is None:
+        stats = {}
+    rows = {}
+    for column in df.columns:
+        if column not in stats:
+            try:
+                stats[column] = column_stats(df[column], max_exact=max_exact)
+            except TypeError:  # unhashable values, describe_column reports them as unsupported
+                pass
+        rows[column] = describe_column(df[column], stats=stats.get(column))
+    profile = to_profile(rows, df.columns)
+    if check_correlation:
+        num_cols = profile.index[profile['type'] == TYPE_NUM].tolist()
+        profile = flag_correlated(profile, df[num_cols].corr(method='pearson'), threshold=correlation_threshold)
+    return profile
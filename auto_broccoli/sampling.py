@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+"""Sampled execution of the auto analysis pairs.
+
+Every pair is first tested on a sample of the rows, stratified on its own binary or categorical columns. Only the pairs
+whose sample result could go either way on the full data are tested again on all the rows, in one batch pass per
+analysis type.
+"""
+
+from collections import defaultdict
+
+import numpy as np
+from scipy import special
+
+from auto_broccoli import ingest
+
+# columns of each analysis type's pairs that split the rows into classes
+STRATA_POSITIONS = {'bin X cat': (0, 1), 'bin X bin': (0, 1), 'bin X cont': (0,), 'cat X cont': (0,),
+                    'cont X cont': ()}
+
+
+def uniform_rows(n_rows, size, rng) -> np.ndarray:
+    """Boolean mask of size rows out of n_rows drawn uniformly without replacement, with a numpy RandomState"""
+    chosen = np.zeros(n_rows, dtype=bool)
+    chosen[rng.choice(n_rows, size, replace=False)] = True
+    return chosen
+
+
+def stratified_sample(df, columns, size, min_per_class, random_state=None, uniform=None, codes=None):
+    """Uniform random sample of the rows, topped up so every class of the given columns keeps enough rows.
+
+    Args:
+        df: pandas DataFrame, the data
+        columns: list, binary and categorical columns whose classes must keep min_per_class rows
+        size: int, number of rows of the uniform part of the sample
+        min_per_class: int, rows each class keeps, or all of its rows when it has fewer
+        random_state: int, seed, default=None
+        uniform: numpy array, boolean mask of the uniform part drawn with uniform_rows, so samples topped up for
+                 different columns share it, default=None (drawn here)
+        codes: callable, codes(column) returns the column's integer codes, -1 when missing, e.g.
+               AutoBroccoli.column_codes without its levels, default=None (factorized here)
+
+    Returns:
+        pandas DataFrame, the sampled rows in their original order
+    """
+    if size >= len(df):
+        return df
+    rng = np.random.RandomState(random_state)
+    chosen = uniform_rows(len(df), size, rng) if uniform is None else uniform.copy()
+    for column in columns:
+        column_codes = ingest.factorize(df[column], sort=False)[0] if codes is None else codes(column)
+        counts = np.bincount(column_codes[chosen & (column_codes >= 0)], minlength=column_codes.max() + 1)
+        for level in np.flatnonzero(counts < min_per_class):
+            candidates = np.flatnonzero((column_codes == level) & ~chosen)
+            needed = min(min_per_class - counts[level], len(candidates))
+            chosen[rng.choice(candidates, needed, replace=False)] = True
+    return df[chosen]
+
+
+def needs_recheck(p_val, sig_level, fraction, margin=1.0) -> bool:
+    """Whether a pair tested on a sample is too close to sig_level to be settled there.
+
+    The sample's normal-equivalent z-score has a sampling error of about 1, sqrt(1 - fraction) of which comes from
+    the rows the sample leaves out. A pair is settled as significant when it is significant on the sample and its
+    z-score, lowered by margin such errors, still passes the full data's critical value scaled to the sample,
+    z_crit * sqrt(fraction): for a fixed effect a test statistic grows with the square root of the rows. It is settled
+    as not significant when its z-score raised by margin errors stays under z_crit, its p-value is then far above
+    sig_level and the sample shows no effect. The pairs in between are re-run on all the rows.
+
+    Args:
+        p_val: float, the p-value on the sample
+        sig_level: float, the significance level
+        fraction: float, sample rows / full rows
+        margin: float, sampling errors a settled z-score keeps from the thresholds, default=1.0
+
+    Returns:
+        bool
+    """
+    if np.isnan(p_val):
+        return True
+    z = -special.ndtri(p_val / 2)
+    z_crit = -special.ndtri(sig_level / 2)
+    error = margin * np.sqrt(1.0 - min(fraction, 1.0))
+    return z_crit - error <= z <= max(z_crit, z_crit * np.sqrt(fraction) + error)
+
+
+def sample_instance(ab, strata, size, uniform=None):
+    """An AutoBroccoli with the same settings as ab on a stratified sample of its rows
+
+    Args:
+        ab: AutoBroccoli, classified
+        strata: list, the binary and categorical columns to stratify on
+        size: int, number of rows of the uniform part of the sample
+        uniform: numpy array, see stratified_sample, default=None
+
+    Returns:
+        AutoBroccoli
+    """
+    from auto_broccoli.auto_broccoli import AutoBroccoli
+
+    sample_df = stratified_sample(ab.df, strata, size, ab.min_samples + 1, random_state=ab.random_state,
+                                  uniform=uniform, codes=lambda column: ab.column_codes(column)[0])
+    settings = ab.worker_settings()
+    run_date, dataset = settings.pop('run_date'), settings.pop('dataset')
+    sample = AutoBroccoli(df=sample_df, hooks=ab.hooks, **settings)
+    sample.run_date, sample.dataset = run_date, dataset
+    return sample
+
+
+def pair_strata(k, pair) -> tuple:
+    """The columns of a pair whose classes its sample keeps, see STRATA_POSITIONS"""
+    return tuple(pair[position] for position in STRATA_POSITIONS[k])
+
+
+def iter_samples(ab, tasks, positions, size, uniform=None):
+    """Splits tasks by the columns their sample is stratified on. Topping up the classes of one column skews the
+    rows of every other column, so a pair is tested on the uniform sample plus the top-ups of its own class columns
+    only, and a pair without any ('cont X cont') on the uniform sample alone. Every sample shares the uniform part.
+
+    Args:
+        ab: AutoBroccoli, classified
+        tasks: list, (analysis type, pair) tuples
+        positions: list, positions in tasks of the tasks to sample for
+        size: int, number of rows of the uniform part of the samples
+        uniform: numpy array, the uniform part drawn with uniform_rows, default=None (drawn here)
+
+    Yields:
+        (AutoBroccoli, list), a sample and the positions of the tasks to test on it
+    """
+    if uniform is None and size < len(ab.df):
+        uniform = uniform_rows(len(ab.df), size, np.random.RandomState(ab.random_state))
+    positions_by_strata = defaultdict(list)
+    for i in positions:
+        positions_by_strata[pair_strata(*tasks[i])].append(i)
+    for strata, group in positions_by_strata.items():
+        yield sample_instance(ab, list(strata), size, uniform=uniform), group
+
+
+def iter_tasks(ab, tasks, start=0):
+    """Sampled version of AutoBroccoli.iter_tasks.
+
+    Args:
+        ab: AutoBroccoli, classified, with sample_size set
+        tasks: list, (analysis type, pair) tuples, grouped by analysis type
+        start: int, position of the first task to run, default=0
+
+    Yields:
+        (int, dict), position of the task in tasks and its finding's result dict. Findings of settled pairs describe
+        their sample, those of re-run pairs the full data.
+    """
+    ab._batch_results = {}
+    positions_by_type = defaultdict(list)
+    for i in range(start, len(tasks)):
+        positions_by_type[tasks[i][0]].append(i)
+    uniform = uniform_rows(len(ab.df), ab.sample_size, np.random.RandomState(ab.random_state))
+    for k, positions in positions_by_type.items():
+        samples, recheck = {}, set()
+        for sample, group in iter_samples(ab, tasks, positions, ab.sample_size, uniform=uniform):
+            sample.run_batch(k, [tasks[i][1] for i in group])
+            fraction = len(sample.df) / len(ab.df)
+            for i in group:
+                samples[i] = sample
+                if needs_recheck(sample.pair_pval(k, tasks[i][1]), ab.siglvl, fraction, ab.recheck_margin):
+                    recheck.add(i)
+        ab.run_batch(k, [tasks[i][1] for i in positions if i in recheck])
+        if ab.running_config.VERBOSE:
+            print(f'{k}: {len(recheck)} of {len(positions)} pairs re-run on all rows')
+        for i in positions:
+            runner = ab if i in recheck else samples[i]
+            success, result = runner.run_insight(k, tasks[i][1])
+            if success:
+                yield i, result
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+"""Best-first execution of the auto analysis pairs under a time or pair budget.
+
+Every pair is screened on a small sample of the rows, stratified on its own class columns. Its effect size there,
+scaled to the rows the pair has in the full data and weighted by the priority of its columns, gives the z-score the
+full test is expected to reach. Pairs then run from the highest score down until the budget is spent, so a run cut
+short keeps the strongest findings.
+"""
+
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+from scipy import special
+
+from auto_broccoli import sampling
+
+SCHEDULE_COLUMNS = ['analysis_type', 'col_1', 'col_2', 'effect', 'rows', 'priority', 'score', 'ran']
+
+
+def pair_priority(pair, column_priority) -> float:
+    """Product of the priorities of a pair's columns, 1 for columns without one"""
+    column_priority = column_priority or {}
+    return float(np.prod([column_priority.get(column, 1.0) for column in pair]))
+
+
+def screen(ab, tasks, screen_rows=10000, column_priority=None) -> pd.DataFrame:
+    """Scores every task without running it on all the rows.
+
+    The effect size is the sample test's normal-equivalent z-score over the square root of the sample rows, comparable
+    across tests. Multiplied by the square root of the rows where both columns are present it is the z-score to
+    expect on the full data, the score is that times the pair's priority.
+
+    Args:
+        ab: AutoBroccoli, classified, with its frame in memory
+        tasks: list, (analysis type, pair) tuples
+        screen_rows: int, rows of the uniform part of the screening samples, default=10000
+        column_priority: dict, column -> weight multiplying the score of its pairs, default=None (all 1)
+
+    Returns:
+        pandas DataFrame, one row per task in task order: analysis_type, col_1, col_2, effect, rows, priority, score
+    """
+    positions_by_type = defaultdict(list)
+    for i, (k, pair) in enumerate(tasks):
+        positions_by_type[k].append(i)
+    p_val, sample_rows = np.ones(len(tasks)), np.ones(len(tasks))
+    uniform = None
+    if screen_rows < len(ab.df):
+        uniform = sampling.uniform_rows(len(ab.df), screen_rows, np.random.RandomState(ab.random_state))
+    for k, positions in positions_by_type.items():
+        for sample, group in sampling.iter_samples(ab, tasks, positions, screen_rows, uniform=uniform):
+            sample.run_batch(k, [tasks[i][1] for i in group])
+            for i in group:
+                p_val[i] = sample.pair_pval(k, tasks[i][1])
+                sample_rows[i] = len(sample.df)
+    z = -special.ndtri(np.clip(np.where(np.isnan(p_val), 1.0, p_val), 1e-300, 1.0) / 2)  # untestable pairs score 0
+    schedule = pd.DataFrame({
+        'analysis_type': [k for k, _ in tasks],
+        'col_1': [pair[0] for _, pair in tasks],
+        'col_2': [pair[1] for _, pair in tasks],
+        'effect': z / np.sqrt(sample_rows),
+        'rows': [min(ab.column_stats(column).count for column in pair) for _, pair in tasks],
+        'priority': [pair_priority(pair, column_priority) for _, pair in tasks]
+    }, columns=SCHEDULE_COLUMNS[:-2])
+    schedule['score'] = schedule['effect'] * np.sqrt(schedule['rows']) * schedule['priority']
+    return schedule
+
+
+def rank(ab, tasks, screen_rows=10000, column_priority=None) -> (list, pd.DataFrame):
+    """Orders the tasks by screening score, highest first, ties in their original order
+
+    Returns:
+        list, pandas DataFrame: the ranked tasks, and their screen() rows in the same order with ran set to False
+    """
+    schedule = screen(ab, tasks, screen_rows=screen_rows, column_priority=column_priority)
+    order = np.argsort(-schedule['score'].values, kind='mergesort')
+    schedule = schedule.iloc[order].reset_index(drop=True)
+    schedule['ran'] = False
+    return [tasks[i] for i in order], schedule
+
+
+def iter_tasks(ab, tasks, start=0, time_budget=None, pair_budget=None, block_size=50):
+    """Runs ranked tasks in order until a budget is spent.
+
+    The tasks are taken block_size at a time: the block's batch passes, then its pairs' insight functions. The time
+    budget is checked before every batch pass and every pair, so a run overshoots it by at most one of them. Pairs
+    found in ab.result_cache are served from it without spending the budget, the others are cached once they ran.
+
+    Args:
+        ab: AutoBroccoli, classified, with its frame in memory
+        tasks: list, (analysis type, pair) tuples, best first
+        start: int, position of the first task to run, default=0
+        time_budget: float, seconds from the first task after which no task is started, default=None (no limit)
+        pair_budget: int, number of tasks to run at most, cached ones not counted, default=None (no limit)
+        block_size: int, tasks sharing a batch pass, default=50
+
+    Yields:
+        (int, dict), position of the task in tasks and its finding's result dict. Tasks that ran are marked in
+        ab.schedule when it holds the ranking.
+    """
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+    keys, hits = {}, {}
+    if ab.result_cache is not None:
+        keys = {i: ab.result_key(*tasks[i]) for i in range(start, len(tasks))}
+        for i, key in keys.items():
+            cached = ab.result_cache.get(key)
+            if cached is not None:
+                hits[i] = cached
+    left = len(tasks) if pair_budget is None else pair_budget
+    ran = start
+    ab._batch_results = {}
+    try:
+        for block_start in range(start, len(tasks), block_size):
+            block = range(block_start, min(block_start + block_size, len(tasks)))
+            pairs_by_type = defaultdict(list)
+            for i in [i for i in block if i not in hits][:left]:
+                pairs_by_type[tasks[i][0]].append(tasks[i][1])
+            for k, pairs in pairs_by_type.items():
+                if deadline is not None and time.perf_counter() > deadline:
+                    return
+                ab.run_batch(k, pairs)
+            for i in block:
+                if i in hits:
+                    success, result = hits.pop(i)
+                    if success:
+                        result = dict(result, date=ab.run_date, dataset=ab.dataset)
+                else:
+                    if left == 0 or (deadline is not None and time.perf_counter() > deadline):
+                        return
+                    success, result = ab.run_insight(*tasks[i])
+                    left -= 1
+                    if keys:
+                        ab.result_cache.put(keys[i], success, result if success else {})
+                ran = i + 1
+                if success:
+                    yield i, result
+    finally:
+        if keys:
+            ab.result_cache.commit()
+        if ab.schedule is not None and len(ab.schedule) == len(tasks):
+            ab.schedule.loc[start:ran - 1, 'ran'] = True
+        if ab.running_config.VERBOSE and ran < len(tasks):
+            print(f'Budget spent after {ran - start} of {len(tasks) - start} pairs, the rest were skipped')
@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+"""Long-running asyncio service answering analysis requests over a local socket.
+
+A request is one line of JSON naming a table or a file, e.g.
+
+    {"id": 1, "table": "sales", "sig_level": 0.01, "only_significant": true}
+    {"id": 2, "path": "/data/sales.parquet", "write_to": "sales_insights"}
+
+and the answer is one line of JSON with the findings. Tables must exist in the database, files must be in the data
+directory the service was started with. The libraries, the database engine and, for every recent
+source, a profiled and classified AutoBroccoli with its column caches stay loaded between requests, so a repeated
+request only runs the tests. The analyses run in a thread pool; a table is read again once it is older than
+max_age seconds, and the warm instance is kept when its columns did not change. Files are reloaded when their
+modification time or size changes.
+
+Run from the repository root:
+
+    python -m auto_broccoli.service --port 8765 --data-dir /data
+    python -m auto_broccoli.service --socket /tmp/broccoli.sock
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import config
+from auto_broccoli import database, cache
+
+
+def _json_default(value):
+    """Plain python values for the numpy scalars and timestamps found in results"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+class AnalysisService(object):
+    """Keeps AutoBroccoli instances warm and runs requests against them.
+
+    Args:
+        dbi: DBInterface, shared by every request, default=None (one for the config's database)
+        specific_config: Config, the running config of the instances, default=None (config.IN_USE)
+        workers: int, analyses running at once, default=2
+        max_concurrent_reads: int, tables read from the database at once, default=2
+        max_age: float, seconds a table read stays current before a request reads it again, default=60
+        max_sources: int, warm instances kept, the least recently used is dropped first, default=8
+        data_dir: str, the directory files may be requested from, default=None (only tables)
+        settings: other AutoBroccoli arguments for every instance, e.g. sample_size
+    """
+
+    def __init__(self, dbi=None, specific_config=None, workers=2, max_concurrent_reads=2, max_age=60.0,
+                 max_sources=8, data_dir=None, **settings):
+        self.dbi = dbi or database.DBInterface()
+        self.running_config = specific_config or config.IN_USE
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.max_concurrent_reads = max_concurrent_reads
+        self.max_age = max_age
+        self.max_sources = max_sources
+        self.data_dir = os.path.realpath(data_dir) if data_dir else None
+        self.settings = settings
+        self._entries = OrderedDict()  # source -> {'ab', 'analytics_dict', 'version', 'checked_at'}
+        self._locks = {}  # source -> (asyncio.Lock, requests holding or waiting for it)
+        self._reads = None  # asyncio primitives are created inside the event loop
+
+    async def run_in_executor(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def prepare(self, source, df=None) -> dict:
+        """Profiles and classifies a source, in a worker thread
+
+        Args:
+            source: str, the table name or file path
+            df: pandas DataFrame, the table's rows, default=None (source is a file)
+
+        Returns:
+            dict, the warm entry: 'ab' and its 'analytics_dict'
+        """
+        from auto_broccoli.auto_broccoli import AutoBroccoli
+
+        ab = AutoBroccoli(df=source if df is None else df, dbi=self.dbi, specific_config=self.running_config,
+                          **self.settings)
+        ab.dataset = source
+        analytics_dict = ab.create_analytical_buckets(ab.classify_column_types(ab.profile()))
+        return {'ab': ab, 'analytics_dict': analytics_dict}
+
+    @staticmethod
+    def findings(entry, sig_level, only_significant) -> list:
+        """Runs the tests of a warm entry with the request's settings, in a worker thread"""
+        ab = entry['ab']
+        ab.siglvl, ab.only_significant = sig_level, only_significant
+        return [result for _, result in ab.iter_analysis(entry['analytics_dict'])]
+
+    def source(self, job) -> str:
+        """The table name or the real path of the file a request names. Paths outside the data directory are
+        refused, tables are checked when they are read."""
+        if job.get('table'):
+            return str(job['table'])
+        if job.get('path'):
+            if self.data_dir is None:
+                raise PermissionError('The service was started without a data directory, request a table')
+            path = os.path.realpath(os.path.join(self.data_dir, str(job['path'])))
+            if os.path.commonpath([path, self.data_dir]) != self.data_dir:
+                raise PermissionError(f'{job["path"]} is outside the data directory')
+            return path
+        raise ValueError('A request needs a "table" or a "path"')
+
+    def read_table(self, table) -> (pd.DataFrame, tuple):
+        """The table's rows and a version made of its columns' names and content fingerprints"""
+        if table not in self.dbi.table_names():
+            raise ValueError(f'No table named {table!r}')
+        df = self.dbi.load_from_table(table)
+        return df, tuple((column, cache.column_fingerprint(df[column])) for column in df.columns)
+
+    async def entry(self, job, source) -> (dict, bool):
+        """The warm entry for a request's source, refreshed when the source changed
+
+        Args:
+            job: dict, the request
+            source: str, its source(), the table name or the file's real path
+
+        Returns:
+            dict, bool: the entry, and whether it was reused
+        """
+        if job.get('table'):
+            entry = self._entries.get(source)
+            max_age = job.get('max_age', self.max_age)
+            if entry is not None and time.time() - entry['checked_at'] <= max_age:
+                return entry, True
+            async with self._reads:
+                df, version = await self.run_in_executor(self.read_table, source)
+            if entry is None or entry['version'] != version:
+                entry = await self.run_in_executor(self.prepare, source, df)
+                reused = False
+            else:
+                reused = True
+            del df
+        else:
+            stat = os.stat(source)
+            version = (stat.st_mtime, stat.st_size)
+            entry = self._entries.get(source)
+            reused = entry is not None and entry['version'] == version
+            if not reused:
+                entry = await self.run_in_executor(self.prepare, source)
+        entry.update(version=version, checked_at=time.time())
+        self._entries[source] = entry
+        self._entries.move_to_end(source)
+        while len(self._entries) > self.max_sources:
+            self._entries.popitem(last=False)
+        return entry, reused
+
+    async def analyze(self, job) -> dict:
+        """Answers one request
+
+        Args:
+            job: dict, 'table' or 'path' (relative to the data directory), and optionally 'sig_level' (default 0.05), 'only_significant' (default
+                 False), 'max_age' for a table, 'write_to' a table for the findings and 'mode' to write them with
+                 (default 'append')
+
+        Returns:
+            dict, 'status', 'source', 'warm' (whether the profiled source was reused), 'findings' and 'seconds'
+        """
+        started = time.perf_counter()
+        if self._reads is None:
+            self._reads = asyncio.Semaphore(self.max_concurrent_reads)
+        source = self.source(job)
+        lock, users = self._locks.get(source, (None, 0))
+        lock = lock or asyncio.Lock()
+        self._locks[source] = (lock, users + 1)
+        try:
+            async with lock:  # one request at a time per instance, other sources run alongside
+                entry, warm = await self.entry(job, source)
+                findings = await self.run_in_executor(self.findings, entry, float(job.get('sig_level', 0.05)),
+                                                      bool(job.get('only_significant', False)))
+        finally:
+            lock, users = self._locks[source]
+            if users == 1:  # no other request holds or waits for it
+                del self._locks[source]
+            else:
+                self._locks[source] = (lock, users - 1)
+        if job.get('write_to') and findings:
+            await self.run_in_executor(lambda: self.dbi.save_to_table(
+                pd.DataFrame(findings), table_name=job['write_to'], replace_or_append=job.get('mode', 'append')))
+        return {'status': 'ok', 'source': source, 'warm': warm, 'findings': findings,
+                'seconds': time.perf_counter() - started}
+
+    async def handle_line(self, line) -> dict:
+        job = {}
+        try:
+            job = json.loads(line.decode())
+            if job.get('action') == 'ping':
+                response = {'status': 'ok'}
+            else:
+                response = await self.analyze(job)
+        except Exception as e:
+            response = {'status': 'error', 'error': f'{type(e).__name__}: {e}'}
+        if isinstance(job, dict) and 'id' in job:
+            response['id'] = job['id']
+        return response
+
+    async def handle_connection(self, reader, writer):
+        """Answers the requests of one connection in order, one line of JSON each"""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await self.handle_line(line)
+                writer.write((json.dumps(response, default=_json_default) + '\n').encode())
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=8765, path=None):
+        """Starts listening on a TCP port, or on a Unix socket when path is given
+
+        Returns:
+            asyncio Server
+        """
+        if path:
+            return await asyncio.start_unix_server(self.handle_connection, path=path)
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def serve_forever(self, host='127.0.0.1', port=8765, path=None):
+        """Runs the service until interrupted"""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        server = loop.run_until_complete(self.start(host=host, port=port, path=path))
+        if self.running_config.VERBOSE:
+            print(f'Listening on {path or f"{host}:{port}"}')
+        try:
+            loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+            self.executor.shutdown()
+            loop.close()
+
+
+def request(job, host='127.0.0.1', port=8765, path=None, timeout=None) -> dict:
+    """Sends one request to a running service and waits for the answer
+
+    Args:
+        job: dict, see AnalysisService.analyze
+        host: str, default='127.0.0.1'
+        port: int, default=8765
+        path: str, the service's Unix socket, used instead of host and port, default=None
+        timeout: float, seconds to wait, default=None (no limit)
+
+    Returns:
+        dict, the answer
+    """
+    if path:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(timeout)
+        connection.connect(path)
+    else:
+        connection = socket.create_connection((host, port), timeout=timeout)
+    with connection, connection.makefile('rwb') as stream:
+        stream.write((json.dumps(job) + '\n').encode())
+        stream.flush()
+        return json.loads(stream.readline().decode())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', help='listen on this Unix socket instead of a TCP port')
+    parser.add_argument('--workers', type=int, default=2, help='analyses running at once')
+    parser.add_argument('--max-reads', type=int, default=2, help='tables read from the database at once')
+    parser.add_argument('--max-age', type=float, default=60.0, help='seconds before a table is read again')
+    parser.add_argument('--data-dir', help='directory files may be requested from, default: only tables')
+    args = parser.parse_args(argv)
+
+    service = AnalysisService(workers=args.workers, max_concurrent_reads=args.max_reads, max_age=args.max_age,
+                              data_dir=args.data_dir)
+    service.serve_forever(host=args.host, port=args.port, path=args.socket)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
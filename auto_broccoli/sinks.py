@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""Destinations for the findings AutoBroccoli.stream_analysis produces.
+
+Sinks buffer findings and only persist them on flush, so stream_analysis decides when everything written so far is
+safely stored and a checkpoint can be saved. When the run fails it discards the buffers instead, the resumed run
+writes those findings again. Memory is bounded by the findings between two flushes.
+"""
+
+import csv
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def plain_values(result) -> dict:
+    """Result dict with numpy scalars turned into python ones and NaN into None, ready for csv or json"""
+    plain = {}
+    for key, value in result.items():
+        if isinstance(value, np.generic):
+            value = value.item()
+        if isinstance(value, float) and math.isnan(value):
+            value = None
+        plain[key] = value
+    return plain
+
+
+class Sink(object):
+    """Base class: write buffers a finding, flush persists the buffer"""
+
+    def open(self, resume=False):
+        """Called before the first finding of a run.
+
+        Args:
+            resume: bool, the run continues an interrupted one, keep what was already stored
+        """
+        pass
+
+    def write(self, result):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def discard(self):
+        """Drops the findings written since the last flush"""
+        pass
+
+    def close(self):
+        pass
+
+
+class DataFrameSink(Sink):
+    """Keeps the findings in memory, as auto_analysis does"""
+
+    def __init__(self):
+        self.results = []
+
+    def open(self, resume=False):
+        self.results = []
+
+    def write(self, result):
+        self.results.append(result)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.results)
+
+
+class FileSink(Sink):
+    """Appends findings to a text file, one line per finding. A new run truncates the file, a resumed run appends.
+
+    Args:
+        path: str, the file to write
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._buffer = []
+
+    def open(self, resume=False):
+        self.close()
+        self._file = open(self.path, 'a' if resume else 'w', newline='')
+        self._buffer = []
+
+    def write(self, result):
+        self._buffer.append(plain_values(result))
+
+    def flush(self):
+        if self._buffer:
+            self._write_rows(self._buffer)
+            self._buffer = []
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def discard(self):
+        self._buffer = []
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write_rows(self, rows):
+        raise NotImplementedError
+
+
+class JSONLSink(FileSink):
+    """Writes each finding as a JSON line"""
+
+    def _write_rows(self, rows):
+        for row in rows:
+            self._file.write(json.dumps(row, default=str) + '\n')
+
+
+class CSVSink(FileSink):
+    """Writes findings as CSV rows. The header comes from the first finding, or from the file when resuming.
+
+    Args:
+        path: str, the file to write
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.columns = None
+
+    def open(self, resume=False):
+        self.columns = None
+        if resume and os.path.exists(self.path) and os.path.getsize(self.path):
+            with open(self.path, newline='') as f:
+                self.columns = next(csv.reader(f))
+        super().open(resume=resume)
+
+    def _write_rows(self, rows):
+        if self.columns is None:
+            self.columns = list(rows[0])
+            csv.writer(self._file).writerow(self.columns)
+        csv.DictWriter(self._file, fieldnames=self.columns, extrasaction='ignore').writerows(rows)
+
+
+class DBSink(Sink):
+    """Saves findings to a table through DBInterface.save_to_table, one batched insert per flush.
+
+    Args:
+        dbi: DBInterface, the connection to write through
+        table_name: str, the results table
+        replace_or_append: str, 'replace' drops the table at the first flush of a new run, or empties it when the
+                           run has no findings to save, default='append'
+    """
+
+    def __init__(self, dbi, table_name, replace_or_append='append'):
+        self.dbi = dbi
+        self.table_name = table_name
+        self.replace_or_append = replace_or_append
+        self._mode = replace_or_append
+        self._buffer = []
+
+    def open(self, resume=False):
+        self._mode = 'append' if resume else self.replace_or_append
+        self._buffer = []
+
+    def write(self, result):
+        self._buffer.append(result)
+
+    def flush(self):
+        if self._buffer:
+            self.dbi.save_to_table(pd.DataFrame(self._buffer), table_name=self.table_name,
+                                   replace_or_append=self._mode)
+            self._mode = 'append'
+            self._buffer = []
+        elif self._mode == 'replace':  # no findings yet, the previous run's must not stay in the table
+            self.dbi.clear_table(self.table_name)
+            self._mode = 'append'
+
+    def discard(self):
+        self._buffer = []
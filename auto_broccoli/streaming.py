@@ -0,0 +1,448 @@
+#!/usr/bin/env python
+"""Out-of-core analysis of CSV files and database tables too large to load at once.
+
+The source is read twice, chunk by chunk. The first pass gathers mergeable per-column statistics for profiling and
+classification. The second pass gathers mergeable sufficient statistics for every analysis pair: group counts,
+sums and sums of squares, co-moments and contingency counts. They are laid out like the AutoBroccoli batch passes,
+so the insight functions run on them unchanged and peak memory follows the chunk size, not the file size.
+
+For database tables the grouped (binary/categorical x continuous) sums can instead be pushed down to the database as
+GROUP BY queries, so only one row per group comes back.
+"""
+
+import numpy as np
+import pandas as pd
+
+from auto_broccoli import engines, profiler, sketches, utils
+
+
+def read_chunks(path, chunksize, columns=None):
+    """Iterates over a CSV file chunksize rows at a time, optionally reading only some columns"""
+    return pd.read_csv(path, chunksize=chunksize, usecols=columns)
+
+
+def float_values(chunk, columns) -> np.ndarray:
+    """2-D float array of some columns of a chunk, NaN where missing or not a number"""
+    if not columns:
+        return np.empty((len(chunk), 0))
+    return np.column_stack([pd.to_numeric(chunk[column], errors='coerce').values.astype(float)
+                            for column in columns])
+
+
+def merge_dtypes(dtype_1, dtype_2):
+    """The dtype a column would get if both chunks had been read together"""
+    if dtype_1 is None or dtype_1 == dtype_2:
+        return dtype_2
+    numeric = [pd.api.types.is_numeric_dtype(d) and not pd.api.types.is_bool_dtype(d) for d in (dtype_1, dtype_2)]
+    if all(numeric):
+        return np.result_type(dtype_1, dtype_2)
+    return np.dtype(object)
+
+
+class ColumnAccumulator(object):
+    """Mergeable statistics of one column over many chunks.
+
+    Value counts are kept exactly up to max_distinct distinct values. Past that the column is summarized by sketches
+    of fixed size: a HyperLogLog for the distinct count and the most frequent values for the mode. The count, min
+    and max stay exact. A column with that many distinct values is classified as continuous, high cardinality or an
+    identifier either way.
+
+    Args:
+        name: str, the column name
+        max_distinct: int, distinct values to count exactly before switching to sketches, default=10000 (None to
+                      always count exactly)
+    """
+
+    def __init__(self, name, max_distinct=10000):
+        self.name = name
+        self.max_distinct = max_distinct
+        self.dtype = None
+        self.length = 0
+        self.count = 0
+        self.min = self.max = np.nan
+        self.value_counts = pd.Series([], dtype=np.int64)
+        self.truncated = False
+        self.distinct = None  # sketches.HyperLogLog once truncated
+        self.frequent = None  # sketches.FrequentItems once truncated
+
+    def _truncate(self):
+        """Moves the exact counts into the sketches"""
+        self.truncated = True
+        self.distinct, self.frequent = sketches.HyperLogLog(), sketches.FrequentItems()
+        self.distinct.update(sketches.hash_values(self.value_counts.index))
+        self.frequent.update(self.value_counts)
+        self.value_counts = self.value_counts.iloc[:0]
+
+    def _add_counts(self, value_counts):
+        if self.truncated:  # a chunk's distinct values, not its rows, go through the hash
+            self.distinct.update(sketches.hash_values(value_counts.index))
+            self.frequent.update(value_counts)
+            return
+        self.value_counts = self.value_counts.add(value_counts, fill_value=0).astype(np.int64)
+        if self.max_distinct is not None and len(self.value_counts) > self.max_distinct:
+            self._truncate()
+
+    def _add_range(self, minimum, maximum):
+        self.min = np.nanmin([self.min, minimum])
+        self.max = np.nanmax([self.max, maximum])
+
+    def update(self, series):
+        """Adds one chunk of the column"""
+        count = int(series.count())
+        if count or self.dtype is None:  # a chunk without values, e.g. all NULL from a database, says nothing
+            self.dtype = merge_dtypes(self.dtype if self.count else None, series.dtype)
+        self.length += len(series)
+        self.count += count
+        if pd.api.types.is_numeric_dtype(series) and series.count():
+            self._add_range(series.min(), series.max())
+        self._add_counts(series.value_counts())
+
+    def merge(self, other):
+        """Adds the statistics of another accumulator of the same column, e.g. from another process or file"""
+        if other.count or self.dtype is None:
+            self.dtype = merge_dtypes(self.dtype if self.count else None, other.dtype)
+        self.length += other.length
+        self.count += other.count
+        if not np.isnan(other.min):
+            self._add_range(other.min, other.max)
+        if not other.truncated:
+            self._add_counts(other.value_counts)
+            return
+        if not self.truncated:
+            self._truncate()
+        self.distinct.merge(other.distinct)
+        self.frequent.merge(other.frequent)
+
+    def distinct_count(self) -> int:
+        """Exact distinct count, or the sketch's estimate once truncated. The column counts as unique when the
+        estimate is within three standard errors of the count and no value was seen twice."""
+        if not self.truncated:
+            return len(self.value_counts)
+        estimate = self.distinct.estimate()
+        if estimate >= self.count * (1 - 3 * self.distinct.relative_error) and not (self.frequent.counts > 1).any():
+            return self.count
+        return int(min(max(round(estimate), self.max_distinct + 1), self.count))
+
+    def to_stats(self) -> profiler.ColumnStats:
+        """The column's statistics in the same form as for a loaded column. Once truncated the value counts are the
+        frequent values only, or an example value when none stands out."""
+        has_missing = int(self.count < self.length)
+        value_counts = self.value_counts
+        if self.truncated:
+            value_counts = self.frequent.counts
+            if not len(value_counts):
+                value_counts = pd.Series([1], index=[self.frequent.example])
+        is_numeric = pd.api.types.is_numeric_dtype(self.dtype)
+        return profiler.ColumnStats.from_value_counts(
+            self.name, self.length, self.dtype, value_counts, count=self.count,
+            distinct_count_with_nan=self.distinct_count() + has_missing,
+            minimum=self.min if is_numeric else None, maximum=self.max if is_numeric else None,
+            approximate=self.truncated)
+
+
+class ProfileAccumulator(object):
+    """Mergeable statistics of the first pass: a ColumnAccumulator per column and the co-moments of the numeric
+    columns for the correlation check.
+
+    The numeric values are shifted by their means in the first chunk before summing. An accumulator made with like()
+    shares the shift, so the two can be merged.
+
+    Args:
+        max_distinct: int, distinct values per column to count exactly, default=10000
+        check_correlation: bool, accumulate the co-moments of the numeric columns, default=True
+    """
+
+    def __init__(self, max_distinct=10000, check_correlation=True):
+        self.max_distinct = max_distinct
+        self.check_correlation = check_correlation
+        self.accumulators = None
+        self.numeric = []
+        self.shift = None
+        self.comoments = None
+
+    def like(self):
+        """An empty accumulator with the same numeric columns and shift"""
+        other = ProfileAccumulator(max_distinct=self.max_distinct, check_correlation=self.check_correlation)
+        other.numeric, other.shift = self.numeric, self.shift
+        return other
+
+    def update(self, chunk):
+        """Adds one chunk"""
+        if self.accumulators is None:
+            self.accumulators = {column: ColumnAccumulator(column, self.max_distinct) for column in chunk.columns}
+        if self.shift is None:
+            self.numeric = [column for column in chunk.columns if pd.api.types.is_numeric_dtype(chunk[column])
+                            and not pd.api.types.is_bool_dtype(chunk[column])]
+            self.shift = np.nan_to_num(np.nanmean(float_values(chunk, self.numeric), axis=0)) if self.numeric else 0.0
+        for column, accumulator in self.accumulators.items():
+            accumulator.update(chunk[column])
+        if self.check_correlation and self.numeric:
+            sums = engines.comoment_sums(float_values(chunk, self.numeric) - self.shift)
+            self.comoments = sums if self.comoments is None else {key: self.comoments[key] + sums[key] for key in sums}
+
+    def merge(self, other):
+        """Adds the statistics of an accumulator of the same columns made with like()"""
+        if other.accumulators is None:
+            return
+        if self.shift is None:
+            self.numeric, self.shift = other.numeric, other.shift
+        if self.accumulators is None:
+            self.accumulators = {column: ColumnAccumulator(column, self.max_distinct) for column in other.accumulators}
+        for column, accumulator in other.accumulators.items():
+            self.accumulators[column].merge(accumulator)
+        if other.comoments is not None:
+            self.comoments = other.comoments if self.comoments is None else \
+                {key: self.comoments[key] + other.comoments[key] for key in other.comoments}
+
+    def result(self, correlation_threshold=0.9) -> (pd.DataFrame, dict):
+        """The profile and the ColumnStats of every column
+
+        Args:
+            correlation_threshold: float, pearson coefficient above which a column is flagged CORR, default=0.9
+
+        Returns:
+            pandas DataFrame, dict
+        """
+        stats = {column: accumulator.to_stats() for column, accumulator in self.accumulators.items()}
+        profile = profiler.to_profile({column: profiler.describe_stats(s) for column, s in stats.items()}, list(stats))
+        if self.comoments is not None:
+            coef, p_val = engines.pearson_from_sums(**self.comoments)
+            corr = pd.DataFrame(coef, index=self.numeric, columns=self.numeric)
+            profile = profiler.flag_correlated(profile, corr, threshold=correlation_threshold)
+        return profile, stats
+
+
+def profile_chunks(chunks, max_distinct=10000, check_correlation=True,
+                   correlation_threshold=0.9) -> (pd.DataFrame, dict):
+    """Chunked version of profiler.describe.
+
+    Args:
+        chunks: iterable of pandas DataFrames, the data a chunk at a time
+        max_distinct: int, distinct values per column to count exactly, default=10000
+        check_correlation: bool, flag highly correlated numeric columns as CORR, default=True
+        correlation_threshold: float, pearson coefficient above which a column is flagged, default=0.9
+
+    Returns:
+        pandas DataFrame, dict: the profile and the ColumnStats of every column
+    """
+    accumulator = ProfileAccumulator(max_distinct=max_distinct, check_correlation=check_correlation)
+    for chunk in chunks:
+        accumulator.update(chunk)
+    return accumulator.result(correlation_threshold=correlation_threshold)
+
+
+class PairAccumulator(object):
+    """Mergeable sufficient statistics for every analysis pair of a run.
+
+    Continuous values are shifted by the middle of their range before summing. The shift comes from the first pass,
+    so accumulators of the same run can be merged by adding their sums.
+
+    Args:
+        tasks: list, (analysis type, pair) tuples
+        stats: dict, ColumnStats of every column from the first pass, after classification
+        binary_encodings: dict, column -> the two sorted levels of text columns recoded to 0/1
+        stream_grouped: bool, accumulate the 'bin X cont' and 'cat X cont' sums from the chunks; set to False when
+                        they come from add_pushdown instead, default=True
+        shifts: dict, column -> shift of continuous columns, to merge accumulators of runs whose ranges differ,
+                default=None (the middle of each column's range)
+    """
+
+    def __init__(self, tasks, stats, binary_encodings, stream_grouped=True, shifts=None):
+        self.binary_encodings = binary_encodings
+        self.stream_grouped = stream_grouped
+        self.corr_columns = []
+        self.cont_by_bin, self.cont_by_cat = {}, {}
+        xtab_columns = []
+        for k, (col_1, col_2) in tasks:
+            if k == 'cont X cont':
+                self.corr_columns.extend([col_1, col_2])
+            elif k == 'bin X cont':
+                self.cont_by_bin.setdefault(col_1, []).append(col_2)
+            elif k == 'cat X cont':
+                self.cont_by_cat.setdefault(col_1, []).append(col_2)
+            elif k in ('bin X cat', 'bin X bin'):
+                xtab_columns.extend([col_1, col_2])
+        self.corr_columns = utils.ordered_unique(self.corr_columns)
+        self.xtab_columns = utils.ordered_unique(xtab_columns)
+        grouped = [c for columns in list(self.cont_by_bin.values()) + list(self.cont_by_cat.values()) for c in columns]
+        self.cont_columns = utils.ordered_unique(self.corr_columns + grouped)
+        self.cont_index = {column: i for i, column in enumerate(self.cont_columns)}
+        shifts = shifts or {}
+        self.shift = np.array([shifts[c] if c in shifts else np.nan_to_num((stats[c].min + stats[c].max) / 2.0)
+                               for c in self.cont_columns])
+        self.levels = {column: sorted(stats[column].values) for column in self.xtab_columns + list(self.cont_by_cat)}
+        if stream_grouped:
+            self.columns = utils.ordered_unique(self.cont_columns + self.xtab_columns + list(self.cont_by_bin) +
+                                                list(self.cont_by_cat))
+        else:
+            self.columns = utils.ordered_unique(self.corr_columns + self.xtab_columns)
+
+        self.comoments = {key: 0.0 for key in ('n', 'sx', 'sxx', 'sxy')}
+        self.bin_sums = {column: {key: 0.0 for key in ('n', 's', 'ss')} for column in self.cont_by_bin}
+        self.bin_mins = {column: np.full((2, len(cont)), np.inf) for column, cont in self.cont_by_bin.items()}
+        self.cat_sums = {column: {key: 0.0 for key in ('n', 's', 'ss')} for column in self.cont_by_cat}
+        self.gram = 0
+
+    def codes(self, values, column) -> np.ndarray:
+        return np.asarray(pd.Categorical(values, categories=self.levels[column]).codes, dtype=np.int64)
+
+    def update(self, chunk):
+        """Adds one chunk holding at least self.columns"""
+        for column, levels in self.binary_encodings.items():
+            if column in chunk:
+                chunk[column] = (chunk[column] == levels[1]).astype(np.uint8)
+        if self.corr_columns:
+            X = float_values(chunk, self.corr_columns) - self.shift[[self.cont_index[c] for c in self.corr_columns]]
+            sums = engines.comoment_sums(X)
+            self.comoments = {key: self.comoments[key] + sums[key] for key in sums}
+
+        if self.xtab_columns:
+            codes = [self.codes(chunk[column], column) for column in self.xtab_columns]
+            self.gram = self.gram + engines.cooccurrence_counts(codes, [len(self.levels[c]) for c in self.xtab_columns])
+
+        if self.stream_grouped:
+            self.update_grouped(chunk)
+
+    def update_grouped(self, chunk):
+        """Adds the grouped sums of one chunk"""
+        X = float_values(chunk, self.cont_columns) - self.shift
+        for bin_var, cont_vars in self.cont_by_bin.items():
+            values = chunk[bin_var]
+            codes = np.where(values == 1, 1, np.where(values == 0, 0, -1))
+            block = X[:, [self.cont_index[c] for c in cont_vars]]
+            sums = engines.grouped_sums(codes, 2, block)
+            self.bin_sums[bin_var] = {key: self.bin_sums[bin_var][key] + sums[key] for key in sums}
+            for group in (0, 1):
+                rows = block[codes == group]
+                if len(rows):
+                    self.bin_mins[bin_var][group] = np.fmin(self.bin_mins[bin_var][group],
+                                                            np.where(np.isnan(rows), np.inf, rows).min(axis=0))
+
+        for cat_var, cont_vars in self.cont_by_cat.items():
+            block = X[:, [self.cont_index[c] for c in cont_vars]]
+            sums = engines.grouped_sums(self.codes(chunk[cat_var], cat_var), len(self.levels[cat_var]), block)
+            self.cat_sums[cat_var] = {key: self.cat_sums[cat_var][key] + sums[key] for key in sums}
+
+    def add_pushdown(self, dbi, table_name):
+        """Adds the grouped sums computed by the database with GROUP BY queries, one query per binary or categorical
+        column, instead of reading the raw rows.
+
+        Args:
+            dbi: database.DBInterface, connected to the source database
+            table_name: str, the source table
+        """
+        for bin_var, cont_vars in self.cont_by_bin.items():
+            sums = dbi.grouped_sums(table_name, bin_var, cont_vars, shifts=self.group_shift(cont_vars))
+            groups = pd.Series(sums['n'].index)
+            if bin_var in self.binary_encodings:  # recoded like get_dummies, missing values go to 0
+                codes = np.where(groups == self.binary_encodings[bin_var][1], 1, 0)
+            else:
+                codes = np.where(groups == 1, 1, np.where(groups == 0, 0, -1))
+            self._add_group_rows(self.bin_sums[bin_var], sums, codes, 2, cont_vars)
+            mins = sums['min'].values - self.group_shift(cont_vars)
+            for group in (0, 1):
+                rows = mins[codes == group]
+                if len(rows):
+                    self.bin_mins[bin_var][group] = np.fmin(self.bin_mins[bin_var][group],
+                                                            np.where(np.isnan(rows), np.inf, rows).min(axis=0))
+
+        for cat_var, cont_vars in self.cont_by_cat.items():
+            sums = dbi.grouped_sums(table_name, cat_var, cont_vars, shifts=self.group_shift(cont_vars))
+            codes = self.codes(sums['n'].index, cat_var)
+            self._add_group_rows(self.cat_sums[cat_var], sums, codes, len(self.levels[cat_var]), cont_vars)
+
+    def group_shift(self, cont_vars) -> np.ndarray:
+        return self.shift[[self.cont_index[c] for c in cont_vars]]
+
+    @staticmethod
+    def _add_group_rows(target, sums, codes, n_groups, cont_vars):
+        keep = codes >= 0
+        for key in ('n', 's', 'ss'):
+            totals = np.zeros((n_groups, len(cont_vars)))
+            np.add.at(totals, codes[keep], sums[key].values[keep])
+            target[key] = target[key] + totals
+
+    def merge(self, other):
+        """Adds the sums of another accumulator built from the same tasks and first pass"""
+        self.comoments = {key: self.comoments[key] + other.comoments[key] for key in self.comoments}
+        for column in self.bin_sums:
+            self.bin_sums[column] = {k: self.bin_sums[column][k] + other.bin_sums[column][k] for k in ('n', 's', 'ss')}
+            self.bin_mins[column] = np.fmin(self.bin_mins[column], other.bin_mins[column])
+        for column in self.cat_sums:
+            self.cat_sums[column] = {k: self.cat_sums[column][k] + other.cat_sums[column][k] for k in ('n', 's', 'ss')}
+        self.gram = self.gram + other.gram
+
+    def batch_results(self) -> dict:
+        """The accumulated statistics in the layout of AutoBroccoli._batch_results"""
+        results = {}
+        if self.corr_columns:
+            coef, p_val = engines.pearson_from_sums(**self.comoments)
+            results['cont X cont'] = (pd.DataFrame(coef, index=self.corr_columns, columns=self.corr_columns),
+                                      pd.DataFrame(p_val, index=self.corr_columns, columns=self.corr_columns))
+
+        results['bin X cont'] = {}
+        for bin_var, cont_vars in self.cont_by_bin.items():
+            sums = self.bin_sums[bin_var]
+            shift = self.shift[[self.cont_index[c] for c in cont_vars]]
+            mean, m2 = engines.moments_from_sums(sums['n'], sums['s'], sums['ss'], shift)
+            mins = np.where(np.isinf(self.bin_mins[bin_var]), np.nan, self.bin_mins[bin_var] + shift)
+            moments = {key: pd.DataFrame(value, index=[0, 1], columns=cont_vars)
+                       for key, value in (('count', sums['n']), ('mean', mean), ('m2', m2), ('min', mins))}
+            pos_desc, neg_desc, p_val = engines.ttest_summary(moments)
+            results['bin X cont'][bin_var] = pos_desc, neg_desc, pd.Series(p_val, index=cont_vars)
+
+        results['cat X cont'] = {}
+        for cat_var, cont_vars in self.cont_by_cat.items():
+            f, p_val = engines.anova_from_sums(**self.cat_sums[cat_var])
+            results['cat X cont'][cat_var] = pd.Series(p_val, index=cont_vars)
+
+        if self.xtab_columns:
+            offsets, start = {}, 0
+            for column in self.xtab_columns:
+                offsets[column] = (start, self.levels[column])
+                start += len(self.levels[column])
+            results['contingency'] = (self.gram, offsets)
+        return results
+
+
+def iter_tasks(ab, tasks, start=0):
+    """Chunked version of AutoBroccoli.iter_tasks for an instance reading a CSV file or a table in chunks.
+
+    All the batch statistics are accumulated in one pass over the chunks, then the findings are yielded.
+
+    Args:
+        ab: AutoBroccoli, profiled and classified
+        tasks: list, (analysis type, pair) tuples
+        start: int, position of the first task to run, default=0
+
+    Yields:
+        (int, dict), position of the task in tasks and its finding's result dict
+    """
+    remaining = tasks[start:]
+    if not remaining:
+        return
+    pushdown = ab.pushdown and ab.source_table is not None
+    accumulator = PairAccumulator(remaining, ab._column_stats, ab.binary_encodings, stream_grouped=not pushdown)
+    if pushdown:
+        with ab.instrument('pushdown'):
+            accumulator.add_pushdown(ab.dbi, ab.source_table)
+    if accumulator.columns:
+        with ab.instrument('stream pass', rows=0) as record:
+            for chunk in ab.read_chunks(columns=accumulator.columns):
+                accumulator.update(chunk)
+                record['rows'] = record.get('rows', 0) + len(chunk)  # record is empty without hooks
+    yield from iter_accumulated(ab, accumulator, tasks, start=start)
+
+
+def iter_accumulated(ab, accumulator, tasks, start=0):
+    """Runs the insight functions of the tasks on the statistics of a PairAccumulator holding them
+
+    Yields:
+        (int, dict), position of the task in tasks and its finding's result dict
+    """
+    ab._batch_results = accumulator.batch_results()
+    xtab_pairs = [pair for k, pair in tasks[start:] if k in ('bin X cat', 'bin X bin')]
+    if xtab_pairs:
+        with ab.instrument('batch', analysis_type='chi2'):
+            ab.chi2_batch(xtab_pairs)  # reads the accumulated counts, only runs the tests
+    yield from ab.iter_insights(tasks, start=start)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+"""Vectorized synthetic data for demos and load tests.
+
+Whole columns are drawn at once from a seeded numpy generator instead of one Faker call per field per row, so
+millions of rows take seconds. Columns are generated in each analytical type classify_column_types knows, with
+optional missing values and planted effects for the analyses to find.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+TYPE_PREFIXES = {'binary': 'bin', 'categorical': 'cat', 'continuous': 'cont', 'id': 'record', 'date': 'date'}
+
+
+def _level_codes(rng, rows, probabilities) -> np.ndarray:
+    """Level codes drawn with the given probabilities, the last level taking the remainder. Compares uint32 draws to
+    integer thresholds, much faster than rng.choice or a searchsorted on floats for large row counts."""
+    draws = rng.randint(0, 2 ** 32, rows, dtype=np.uint32)
+    codes = np.zeros(rows, dtype=np.int16)
+    for threshold in np.cumsum(probabilities)[:len(probabilities) - 1 or 1]:
+        codes += draws >= np.uint32(min(threshold, 1.0) * (2 ** 32 - 1))
+    return codes
+
+
+def _mask(rng, rows, rate) -> np.ndarray:
+    """Rows to blank out, each with probability rate"""
+    return rng.randint(0, 2 ** 32, rows, dtype=np.uint32) < np.uint32(min(rate, 1.0) * (2 ** 32 - 1))
+
+
+def _dates(rng, rows, start, end) -> np.ndarray:
+    """Uniform datetime64[s] values between two dates"""
+    start, end = np.datetime64(start, 's'), np.datetime64(end, 's')
+    span = (end - start).astype(np.int64)
+    return start + rng.randint(0, span, rows).astype('timedelta64[s]')
+
+
+def example_data(rows=1000, random_state=None) -> pd.DataFrame:
+    """The example dataset AutoBroccoli generates when no data is given: the columns of
+    AutoBroccoli.example_record, drawn for all rows at once.
+
+    Args:
+        rows: int, number of rows, default=1000
+        random_state: int, seed, default=None
+
+    Returns:
+        pandas DataFrame
+    """
+    rng = np.random.RandomState(random_state)
+    content_type = np.array('youtube,article,social media,doubleclick,newspaper'.split(','), dtype=object)
+    buyer_type = np.array(['me', 'spouse', 'friend', 'other'], dtype=object)
+    user_ids = pd.Series(rng.permutation(rows)).astype(str)
+    return pd.DataFrame({
+        'user_id': ('user' + user_ids + '@example.com').values,  # unique email
+        'active': rng.random_sample(rows) < 0.5,
+        'nice_person': np.array(['N', 'Y'], dtype=object)[rng.randint(0, 2, rows)],
+        'buyer_type': buyer_type[rng.randint(0, len(buyer_type), rows)],
+        'impressions': rng.randint(1, 6, rows),
+        'content_type': content_type[rng.randint(0, len(content_type), rows)],
+        'visits': rng.randint(0, 1000, rows),
+        'date': _dates(rng, rows, '2018-03-01', '2018-04-01'),
+        'duration_percent': 1 - np.sqrt(1 - rng.random_sample(rows))
+    }, columns=['user_id', 'active', 'nice_person', 'buyer_type', 'impressions', 'content_type', 'visits', 'date',
+                'duration_percent'])
+
+
+def generate(rows=1000, binary=2, categorical=2, continuous=3, ids=1, dates=1, levels=5, null_rate=0.0,
+             effects=None, float_dtype=np.float64, random_state=None, chunk=0, id_offset=0,
+             threads=None) -> pd.DataFrame:
+    """Synthetic dataset with a chosen number of columns of each analytical type.
+
+    Columns are named by type and number: bin_0, cat_0, cont_0, record_id_0 (unique integers), date_0. Binary
+    columns hold 'N'/'Y' and categorical columns level_0, level_1, ... with uneven frequencies, both as pandas
+    categoricals. Continuous columns are standard normal before effects are added.
+
+    Args:
+        rows: int, number of rows, default=1000
+        binary: int, number of binary columns, default=2
+        categorical: int, number of categorical columns, default=2
+        continuous: int, number of continuous columns, default=3
+        ids: int, number of unique id columns, default=1
+        dates: int, number of date columns, default=1
+        levels: int, levels of each categorical column, default=5
+        null_rate: float or dict, share of missing values per column, or a dict of analytical type -> share
+                   (id columns are never missing), default=0.0
+        effects: list, (source column, target column, size) tuples applied in order. A continuous target moves by
+                 size standard deviations between the source's classes (binary or categorical source) or gets a
+                 correlation of size with it (continuous source). A binary target's 'Y' probability moves by size
+                 between the source's classes (binary or categorical source). default=None
+        float_dtype: numpy dtype of the continuous columns, np.float32 halves their memory, default=np.float64
+        random_state: int, seed, default=None
+        chunk: int, number of the chunk when generating in parts. Chunks share the random_state column parameters
+               (class balance, level frequencies) and draw different rows, default=0
+        id_offset: int, added to the id columns, keeps ids unique across chunks, default=0
+        threads: int, columns drawn in parallel, numpy releases the GIL while filling them, default=os.cpu_count()
+
+    Returns:
+        pandas DataFrame
+    """
+    if random_state is None:
+        random_state = np.random.randint(2 ** 31 - 1)
+    params = np.random.RandomState(random_state)  # per column parameters, the same for every chunk
+    counts = {'binary': binary, 'categorical': categorical, 'continuous': continuous, 'id': ids, 'date': dates}
+    if not isinstance(null_rate, dict):
+        null_rate = {kind: null_rate for kind in counts}
+    specs = []
+    for kind, count in counts.items():
+        for i in range(count):
+            name = f'record_id_{i}' if kind == 'id' else f'{TYPE_PREFIXES[kind]}_{i}'
+            if kind == 'binary':
+                probabilities = [1 - params.uniform(0.2, 0.8)]
+            elif kind == 'categorical':
+                probabilities = params.dirichlet(np.full(levels, 2.0))
+            else:
+                probabilities = None
+            rate = 0.0 if kind == 'id' else null_rate.get(kind, 0.0)
+            specs.append((name, kind, [random_state, chunk, len(specs)], probabilities, rate))
+
+    def draw(spec):
+        name, kind, seed, probabilities, rate = spec
+        rng = np.random.RandomState(seed)  # one stream per column, columns are drawn in parallel
+        if kind in ('binary', 'categorical'):
+            values = _level_codes(rng, rows, probabilities)
+        elif kind == 'continuous':
+            values = rng.standard_normal(rows)
+        elif kind == 'id':
+            values = rng.permutation(rows) + id_offset + 1
+        else:
+            values = _dates(rng, rows, '2018-01-01', '2019-01-01')
+        return values, _mask(rng, rows, rate) if rate else None
+
+    with ThreadPoolExecutor(max_workers=threads or os.cpu_count()) as pool:
+        drawn = list(pool.map(draw, specs))
+    kinds = {spec[0]: spec[1] for spec in specs}
+    data = {spec[0]: values for spec, (values, missing) in zip(specs, drawn)}
+    masks = {spec[0]: missing for spec, (values, missing) in zip(specs, drawn)}
+
+    for i, (source, target, size) in enumerate(effects or []):
+        if kinds[source] == 'binary':
+            signal = data[source] - 0.5
+        elif kinds[source] == 'categorical':
+            signal = data[source] / (levels - 1) - 0.5
+        elif kinds[source] == 'continuous':
+            signal = (data[source] - data[source].mean()) / data[source].std()
+        else:
+            raise ValueError(f'{source} can not carry an effect, only binary, categorical or continuous columns')
+
+        if kinds[target] == 'continuous' and kinds[source] == 'continuous':
+            data[target] = size * signal + np.sqrt(max(1 - size ** 2, 0)) * data[target]
+        elif kinds[target] == 'continuous':
+            data[target] = data[target] + size * signal
+        elif kinds[target] == 'binary' and kinds[source] != 'continuous':
+            rng = np.random.RandomState([random_state, chunk, len(specs) + i])
+            probability = np.clip(data[target].mean() + size * signal, 0.01, 0.99)
+            data[target] = (rng.random_sample(rows) < probability).astype(np.int16)
+        else:
+            raise ValueError(f'Unsupported effect of {kinds[source]} {source} on {kinds[target]} {target}')
+
+    columns = {}
+    for name, values in data.items():
+        kind, missing = kinds[name], masks[name]
+        if kind in ('binary', 'categorical'):
+            labels = ['N', 'Y'] if kind == 'binary' else [f'level_{j}' for j in range(levels)]
+            if missing is not None:
+                values[missing] = -1
+            columns[name] = pd.Categorical.from_codes(values, labels)
+        elif kind == 'continuous':
+            values = values.astype(float_dtype, copy=False)
+            if missing is not None:
+                values[missing] = np.nan
+            columns[name] = values
+        elif kind == 'date':
+            if missing is not None:
+                values[missing] = np.datetime64('NaT')
+            columns[name] = values
+        else:
+            columns[name] = values
+    return pd.DataFrame(columns, columns=list(data))
+
+
+def generate_chunks(rows, chunksize, random_state=None, **kwargs):
+    """generate() for more rows than fit in memory, chunksize rows at a time, e.g. to write a large CSV file.
+
+    Args:
+        rows: int, total number of rows
+        chunksize: int, rows per chunk
+        random_state: int, seed, default=None
+        kwargs: the other generate() arguments
+
+    Yields:
+        pandas DataFrame, the chunks. Id columns stay unique across chunks.
+    """
+    if random_state is None:
+        random_state = np.random.randint(2 ** 31 - 1)
+    for i, offset in enumerate(range(0, rows, chunksize)):
+        yield generate(rows=min(chunksize, rows - offset), random_state=random_state, chunk=i, id_offset=offset,
+                       **kwargs)
@@ -1,5 +1,4 @@
 #!/usr/bin/env python
-from scipy import stats
 import numpy as np
 import re
 
@@ -25,6 +24,21 @@ def id_column_check(string):
         return False
 
 
+def least_squares_slope(x, y) -> float:
+    """Slope of the least squares line of y on x, same as scipy.stats.linregress(x, y).slope without importing
+    scipy.stats. NaN when x is constant."""
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    dx = x - x.mean()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (dx * (y - y.mean())).sum() / (dx * dx).sum()
+
+
+def ordered_unique(items) -> list:
+    """Unique items in the order they were first seen"""
+    seen = set()
+    return [x for x in items if not (x in seen or seen.add(x))]
+
+
 def check_list_is_contiguous(list_of_ints) -> bool:
     """Checks that a list of ints is contiguous
     https://stackoverflow.com/questions/28885455/python-check-whether-list-is-sequential-or-not
@@ -90,7 +104,7 @@ def crosstabs_on_binary_v_categorical(xtab, cat_column_name) -> str:
                     f'{bin1} minimum is on {bin2_max_cat} at {bin1_min_val}. '
 
     # slope checker
-    slope, intercept, r_value, p_value, std_err = stats.linregress(v1, v2)
+    slope = least_squares_slope(v1, v2)
     if slope <= -1.5:
         insights += f'{bin2.title()} and {bin1.title()} seem to have diverging frequencies. '
 
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""Startup budget check: importing the package and building an AutoBroccoli must stay fast and must not load the
+dependencies that are deferred to first use.
+
+Run from the repository root, exits non-zero when over budget:
+
+    python -m benchmarks.import_time --budget 0.5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# must not be loaded by the startup snippets, they are imported on first use
+DEFERRED_MODULES = ['sqlalchemy', 'faker', 'scipy.stats', 'scipy.sparse', 'pandas_profiling']
+
+SNIPPETS = {
+    'import auto_broccoli': 'import auto_broccoli',
+    'AutoBroccoli(df)': ('import pandas as pd\n'
+                         'from auto_broccoli import AutoBroccoli\n'
+                         'AutoBroccoli(df=pd.DataFrame({"a": [1, 2]}))'),
+}
+
+TIMER = '''
+import json, sys, time
+start = time.perf_counter()
+exec({snippet!r})
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'loaded': [m for m in {deferred!r} if m in sys.modules]}}))
+'''
+
+
+def measure(snippet, repeat=5) -> dict:
+    """Runs a snippet in fresh interpreters started in the repository root
+
+    Returns:
+        dict, median seconds and the deferred modules the snippet loaded
+    """
+    runs = []
+    for _ in range(repeat):
+        code = TIMER.format(snippet=snippet, deferred=DEFERRED_MODULES)
+        output = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT)
+        runs.append(json.loads(output.decode().strip().splitlines()[-1]))
+    return {'seconds': statistics.median(run['seconds'] for run in runs), 'loaded': runs[-1]['loaded']}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget', type=float, default=0.5, help='seconds allowed for "import auto_broccoli"')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    failed = False
+    for name, snippet in SNIPPETS.items():
+        result = measure(snippet, repeat=args.repeat)
+        problems = []
+        if name == 'import auto_broccoli' and result['seconds'] > args.budget:
+            problems.append(f'over the {args.budget}s budget')
+        if result['loaded']:
+            problems.append(f'loaded {", ".join(result["loaded"])}')
+        failed = failed or bool(problems)
+        print(f'{name:<22} {result["seconds"]:.3f}s  {"FAIL: " + "; ".join(problems) if problems else "ok"}')
+    return int(failed)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+"""Benchmarks every stage of AutoBroccoli.main on synthetic data over a grid of row counts and column mixes.
+
+Run from the repository root:
+
+    python -m benchmarks.run --rows 10000 100000 1000000 --mix small wide --output bench.json
+    python -m benchmarks.run --report bench.json
+    python -m benchmarks.run --compare before.json after.json
+
+Each stage is timed over --repeat fresh runs, without tracing. One more run under tracemalloc records each stage's
+peak allocation, numpy arrays included. The JSON output is written so two commits can be compared.
+"""
+
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import config
+from auto_broccoli import AutoBroccoli, DBInterface, synthetic
+
+# column counts per analytical type
+MIXES = {
+    'small': {'binary': 2, 'categorical': 2, 'continuous': 3, 'ids': 1, 'dates': 1},
+    'wide': {'binary': 5, 'categorical': 5, 'continuous': 20, 'ids': 1, 'dates': 1},
+    'categorical': {'binary': 10, 'categorical': 10, 'continuous': 2, 'ids': 1, 'dates': 1},
+    'continuous': {'binary': 2, 'categorical': 2, 'continuous': 50, 'ids': 1, 'dates': 1},
+}
+
+STAGES = ['profile', 'classify_column_types', 'create_analytical_buckets', 'bin X cat', 'bin X bin', 'bin X cont',
+          'cat X cont', 'cont X cont', 'db_write']
+
+
+def benchmark_config() -> config.Config:
+    settings = config.TestConfig()
+    settings.VERBOSE = False
+    settings.WRITE_TO_DB = False
+    settings.RESULT_CACHE = None
+    return settings
+
+
+def dataset(rows, mix, random_state=0) -> pd.DataFrame:
+    """Synthetic data with an effect planted for each analysis type, so every insight function finds something"""
+    counts = MIXES[mix]
+    effects = [('bin_0', 'cont_0', 0.1), ('cat_0', 'cont_1', 0.1), ('bin_0', 'bin_1', 0.1), ('cat_0', 'bin_1', 0.1)]
+    if counts['continuous'] > 2:
+        effects.append(('cont_1', 'cont_2', 0.1))
+    return synthetic.generate(rows=rows, effects=effects, null_rate={'continuous': 0.01}, random_state=random_state,
+                              **counts)
+
+
+def run_stages(df, dbi, table_name, trace=False) -> dict:
+    """Runs the stages of AutoBroccoli.main one after the other on a fresh instance
+
+    Args:
+        df: pandas DataFrame, the data, modified by the run
+        dbi: DBInterface, where the results are written
+        table_name: str, results table
+        trace: bool, record each stage's tracemalloc peak instead of relying on the timings, default=False
+
+    Returns:
+        dict, stage -> {'seconds', 'peak_bytes' (when traced), 'pairs' (analysis stages)}
+    """
+    stages = {}
+    ab = AutoBroccoli(df=df, specific_config=benchmark_config(), table_name=table_name)
+
+    def measure(stage, func, *args):
+        if trace:
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            else:  # before python 3.9
+                tracemalloc.clear_traces()
+            start_bytes = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        value = func(*args)
+        stages[stage] = {'seconds': time.perf_counter() - start}
+        if trace:
+            stages[stage]['peak_bytes'] = tracemalloc.get_traced_memory()[1] - start_bytes
+        return value
+
+    analytics_df = measure('profile', ab.profile)
+    type_dict = measure('classify_column_types', ab.classify_column_types, analytics_df)
+    analytics_dict = measure('create_analytical_buckets', ab.create_analytical_buckets, type_dict)
+    results = []
+
+    def run_analysis_type(analysis_type, pairs):
+        # like AutoBroccoli.iter_tasks, the chi-square counts stay shared between 'bin X cat' and 'bin X bin'
+        if pairs and ab.batch_func_dict.get(analysis_type):
+            ab.batch_func_dict[analysis_type](pairs)
+        return [result for _, result in ab.iter_insights([(analysis_type, pair) for pair in pairs])]
+
+    for analysis_type in ab.analysis_func_dict:
+        pairs = analytics_dict.get(analysis_type, [])
+        results.extend(measure(analysis_type, run_analysis_type, analysis_type, pairs))
+        stages[analysis_type]['pairs'] = len(pairs)
+    measure('db_write', lambda: dbi.save_to_table(pd.DataFrame(results), table_name=table_name,
+                                                  replace_or_append='replace'))
+    return stages
+
+
+def benchmark(rows_grid, mixes, repeat=3, random_state=0) -> dict:
+    """Runs the grid
+
+    Returns:
+        dict, {'meta': environment, 'results': one record per rows x mix x stage}
+    """
+    folder = tempfile.mkdtemp(prefix='auto_broccoli_bench_')
+    dbi = DBInterface(database_uri='sqlite:///' + os.path.join(folder, 'bench.db'))
+    records = []
+    for mix in mixes:
+        for rows in rows_grid:
+            df = dataset(rows, mix, random_state=random_state)
+            runs = [run_stages(df.copy(), dbi, 'bench') for _ in range(repeat)]
+            tracemalloc.start()
+            try:
+                traced = run_stages(df.copy(), dbi, 'bench', trace=True)
+            finally:
+                tracemalloc.stop()
+            for stage in STAGES:
+                seconds = [run[stage]['seconds'] for run in runs]
+                records.append({
+                    'rows': rows, 'mix': mix, 'columns': df.shape[1], 'stage': stage,
+                    'seconds_min': min(seconds), 'seconds_median': statistics.median(seconds),
+                    'peak_bytes': traced[stage]['peak_bytes'], 'pairs': traced[stage].get('pairs')
+                })
+            total = sum(run[stage]['seconds'] for run in runs for stage in STAGES) / repeat
+            print(f'{mix:>12} {rows:>10} rows: {total:.3f}s', file=sys.stderr)
+    return {'meta': environment(), 'results': records}
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'date': dt.datetime.utcnow().isoformat(), 'python': platform.python_version(),
+            'numpy': np.__version__, 'pandas': pd.__version__, 'platform': platform.platform(),
+            'cpus': os.cpu_count()}
+
+
+def scaling_report(results) -> pd.DataFrame:
+    """Growth of each stage's time with rows and with columns, as log-log slopes: 1 is linear, 2 quadratic.
+
+    Args:
+        results: list, the 'results' records of a benchmark run
+
+    Returns:
+        pandas DataFrame, per stage: the slope against rows for each mix, and against columns at the largest row count
+    """
+    df = pd.DataFrame(results)
+    df = df[df['seconds_min'] > 0]
+    report = {}
+    for (stage, mix), group in df.groupby(['stage', 'mix']):
+        if group['rows'].nunique() > 1:
+            report.setdefault(stage, {})[f'rows ({mix})'] = np.polyfit(np.log(group['rows']),
+                                                                       np.log(group['seconds_min']), 1)[0]
+    largest = df[df['rows'] == df['rows'].max()]
+    for stage, group in largest.groupby('stage'):
+        if group['columns'].nunique() > 1:
+            report.setdefault(stage, {})['columns'] = np.polyfit(np.log(group['columns']),
+                                                                 np.log(group['seconds_min']), 1)[0]
+    return pd.DataFrame.from_dict(report, orient='index').reindex([s for s in STAGES if s in report]).round(2)
+
+
+def compare(before, after, threshold=1.2) -> pd.DataFrame:
+    """Side by side timings and memory of two benchmark runs
+
+    Args:
+        before: dict, benchmark output of the baseline
+        after: dict, benchmark output to check
+        threshold: float, time ratio above which a stage is flagged as a regression, default=1.2
+
+    Returns:
+        pandas DataFrame, one row per rows x mix x stage present in both
+    """
+    keys = ['rows', 'mix', 'stage']
+    merged = pd.DataFrame(before['results']).merge(pd.DataFrame(after['results']), on=keys,
+                                                   suffixes=('_before', '_after'))
+    merged['time_ratio'] = merged['seconds_min_after'] / merged['seconds_min_before']
+    merged['memory_ratio'] = merged['peak_bytes_after'] / merged['peak_bytes_before'].replace(0, np.nan)
+    merged['regression'] = merged['time_ratio'] > threshold
+    return merged[keys + ['seconds_min_before', 'seconds_min_after', 'time_ratio', 'memory_ratio', 'regression']]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--mix', nargs='+', default=['small', 'wide'], choices=sorted(MIXES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON file for the results, default: stdout')
+    parser.add_argument('--report', metavar='RESULTS', help='print the scaling report of a results file')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='compare two results files')
+    parser.add_argument('--threshold', type=float, default=1.2, help='time ratio flagged as a regression')
+    args = parser.parse_args(argv)
+
+    pd.set_option('display.width', 200)
+    if args.compare:
+        with open(args.compare[0]) as before, open(args.compare[1]) as after:
+            comparison = compare(json.load(before), json.load(after), threshold=args.threshold)
+        print(comparison.to_string(index=False))
+        return int(comparison['regression'].any())
+    if args.report:
+        with open(args.report) as f:
+            print(scaling_report(json.load(f)['results']).to_string())
+        return 0
+
+    output = benchmark(args.rows, args.mix, repeat=args.repeat, random_state=args.seed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+    else:
+        json.dump(output, sys.stdout, indent=2)
+    print(scaling_report(output['results']).to_string(), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
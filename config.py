@@ -11,6 +11,14 @@ class Config:
     VERBOSE = True
     WRITE_TO_DB = False
     DB_WRITE_MODE = 'replace'
+    DB_BATCH_SIZE = 1000  # rows per multi-row insert when saving results
+    PROFILER = 'native'  # or 'pandas_profiling' for the full ProfileReport
+    RESULT_CACHE = None  # path of a SQLite file caching pair results across runs, None to disable
+    RESULT_CACHE_MAX_BYTES = 256 * 1024 ** 2
+    SAVE_TIMINGS = False  # main() saves per stage and per pair timings to <table_name>_timings when it writes to the db
+    TIME_BUDGET = None  # seconds for the pairs, run best first, None to run them all in order
+    PAIR_BUDGET = None  # number of pairs to run best first, None to run them all in order
+    EXACT_DISTINCT_LIMIT = 1000  # distinct values counted exactly per column, past it sketches; None for no limit
 
 
 class DevConfig(Config):
@@ -36,6 +44,8 @@ class ProdConfig(Config):
     VERBOSE = False
     DB_WRITE_MODE = 'append'
     WRITE_TO_DB = True
+    RESULT_CACHE = os.path.join(Config.BASE_DIR, "result_cache.db")
+    SAVE_TIMINGS = True
     SQLALCHEMY_DATABASE_URI = "mysql+mysqldb://{0}:{1}@{2}/{3}".format(os.environ.get('BROCCOLI_AWS_USERNAME'),
                                                                        os.environ.get('BROCCOLI_AWS_PASSWORD'),
                                                                        os.environ.get('BROCCOLI_AWS_URL'),
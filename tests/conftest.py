@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the package imports config from the repository root, as when it is run from there
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
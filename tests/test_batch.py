@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import config
+from auto_broccoli import batch, database
+
+
+@pytest.fixture
+def dbi(tmp_path):
+    dbi = database.DBInterface(database_uri='sqlite:///' + str(tmp_path / 'tables.db'))
+    for i, rows in enumerate([700, 1300]):
+        rng = np.random.RandomState(i)
+        df = pd.DataFrame({'g': rng.choice(list('abc'), rows), 'b': rng.choice(['x', 'y'], rows),
+                           'v': rng.randn(rows), 'w': rng.randn(rows)})
+        dbi.save_to_table(df, table_name=f'sales_{i}', replace_or_append='replace')
+    return dbi
+
+
+@pytest.mark.parametrize('chunksize', [None, 500])
+def test_summary_reports_the_rows_of_every_table(dbi, chunksize):
+    running_config = config.TestConfig()
+    running_config.VERBOSE = False
+    summary = batch.run_tables('sales_*', dbi=dbi, workers=2, chunksize=chunksize, specific_config=running_config,
+                               result_cache=None)
+    summary = summary.set_index('table')
+    assert summary['error'].isnull().all()
+    assert summary.loc['sales_0', 'rows'] == 700 and summary.loc['sales_1', 'rows'] == 1300
+    for table in summary.index:
+        assert len(dbi.load_from_table(table + '_insights')) == summary.loc[table, 'findings'] > 0
+
+    assert batch.resolve_tables(dbi, 'sales_*') == ['sales_0', 'sales_1']  # results tables left out
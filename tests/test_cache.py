@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from auto_broccoli import cache
+from auto_broccoli.auto_broccoli import AutoBroccoli
+
+
+def frame(rows=1000, seed=0):
+    rng = np.random.RandomState(seed)
+    df = pd.DataFrame({'g': rng.choice(list('abc'), rows), 'b': rng.choice(['x', 'y'], rows)})
+    for i in range(3):
+        df['v' + str(i)] = rng.randn(rows) + (df['g'] == 'a') * i * .2
+    return df
+
+
+def findings(df, result_cache):
+    ab = AutoBroccoli(df=df, result_cache=result_cache)
+    return ab.auto_analysis(ab.create_analytical_buckets(ab.classify_column_types(ab.profile())))
+
+
+def test_a_new_result_version_stops_serving_older_entries(tmp_path, monkeypatch):
+    df, store = frame(), cache.ResultCache(str(tmp_path / 'results.cache'))
+    first = findings(df, store)
+    stored = len(store)
+    assert stored > 0
+
+    assert findings(df, store).equals(first) and len(store) == stored  # all served
+
+    monkeypatch.setattr(cache, 'RESULT_VERSION', cache.RESULT_VERSION + 1)
+    assert findings(df, store).equals(first) and len(store) == 2 * stored  # all run again
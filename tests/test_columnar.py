@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from auto_broccoli import columnar, ingest
+from auto_broccoli.auto_broccoli import AutoBroccoli
+
+pytest.importorskip('pyarrow')
+
+
+def frame(rows=2000, seed=0):
+    rng = np.random.RandomState(seed)
+    df = pd.DataFrame({'g': rng.choice(['pear', 'fig', 'apple', 'kiwi'], rows), 'b': rng.choice(['y', 'x'], rows),
+                       'v': rng.randn(rows), 'w': rng.randn(rows)})
+    df['v'] += (df['g'] == 'fig') * .3
+    return df
+
+
+def findings(df):
+    ab = AutoBroccoli(df=df, result_cache=None)
+    results = ab.auto_analysis(ab.create_analytical_buckets(ab.classify_column_types(ab.profile())))
+    return results.sort_values(['analysis_type', 'col_1', 'col_2']).reset_index(drop=True)
+
+
+@pytest.mark.parametrize('name', ['data.parquet', 'data.feather'])
+def test_file_categories_are_sorted_like_csv(tmp_path, name):
+    df, path = frame(), str(tmp_path / name)
+    if name.endswith('.parquet'):
+        df.to_parquet(path)
+    else:
+        df.to_feather(path)
+
+    loaded = columnar.read_columns(path)
+    assert list(loaded['g'].cat.categories) == ['apple', 'fig', 'kiwi', 'pear']
+    codes, levels = ingest.factorize(loaded['g'])
+    assert list(levels) == sorted(df['g'].unique())
+    assert (levels[codes] == df['g'].values).all()
+
+    from_file, from_csv = findings(path), findings(df)
+    assert from_file[['analysis_type', 'col_1', 'col_2', 'insight_text']].equals(
+        from_csv[['analysis_type', 'col_1', 'col_2', 'insight_text']])
+    assert np.allclose(from_file['p_val'].astype(float), from_csv['p_val'].astype(float))
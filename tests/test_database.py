@@ -0,0 +1,63 @@
+import datetime as dt
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from auto_broccoli import sinks
+from auto_broccoli.database import DBInterface
+
+
+def test_save_to_table_binds_dates_and_missing_values(tmp_path):
+    dbi = DBInterface(database_uri='sqlite:///' + str(tmp_path / 'test.db'), batch_size=2)
+    df = pd.DataFrame({'day': pd.to_datetime(['2024-01-01 10:30', None, '2024-01-03 00:00']),
+                       'utc': pd.to_datetime(['2024-01-01', '2024-01-02', None]).tz_localize('UTC'),
+                       'wait': pd.to_timedelta(['1s', None, '3s']),
+                       'value': [1.5, np.nan, 3.0],
+                       'label': ['a', None, 'c']})
+    dbi.save_to_table(df, table_name='frames', replace_or_append='replace')
+
+    loaded = dbi.load_from_table('frames')
+    assert len(loaded) == 3
+    assert pd.to_datetime(loaded['day'])[0] == dt.datetime(2024, 1, 1, 10, 30)
+    assert loaded['day'].isnull().tolist() == [False, True, False]
+    assert loaded['utc'].isnull().tolist() == [False, False, True]
+    assert loaded['wait'].tolist()[0] == 10 ** 9 and loaded['wait'].isnull().tolist() == [False, True, False]
+    assert loaded['value'].isnull().tolist() == [False, True, False]
+    assert loaded['label'].isnull().tolist() == [False, True, False] and loaded['label'][2] == 'c'
+
+
+def test_replace_run_without_findings_empties_the_table(tmp_path):
+    dbi = DBInterface(database_uri='sqlite:///' + str(tmp_path / 'test.db'))
+    dbi.save_to_table(pd.DataFrame({'insight_text': ['stale']}), table_name='results', replace_or_append='replace')
+    sink = sinks.DBSink(dbi, 'results', replace_or_append='replace')
+    sink.open()
+    sink.flush()
+    sink.close()
+    assert len(dbi.load_from_table('results')) == 0
+
+
+def test_table_names_are_quoted(tmp_path):
+    dbi = DBInterface(database_uri='sqlite:///' + str(tmp_path / 'test.db'))
+    df = pd.DataFrame({'g': ['a', 'a', 'b'], 'v': [1.0, 3.0, 5.0]})
+    dbi.save_to_table(df, table_name='Order', replace_or_append='replace')  # a reserved word
+    assert len(dbi.load_from_table('Order')) == 3
+    assert dbi.grouped_sums('Order', 'g', ['v'])['s'].loc['a', 'v'] == 4.0
+    dbi.save_to_table(df, table_name='kept', replace_or_append='replace')
+    with pytest.raises(Exception):  # read as one odd name, no such table
+        dbi.load_from_table('Order; DROP TABLE kept')
+    assert 'kept' in dbi.table_names()
+
+
+def test_only_databases_written_to_switch_to_wal(tmp_path):
+    source, results = str(tmp_path / 'source.db'), str(tmp_path / 'results.db')
+    with sqlite3.connect(source) as connection:
+        connection.execute('CREATE TABLE events (v REAL)')
+        connection.execute('INSERT INTO events VALUES (1.5)')
+
+    assert len(DBInterface(database_uri='sqlite:///' + source).load_from_table('events')) == 1
+    DBInterface(database_uri='sqlite:///' + results).save_to_table(pd.DataFrame({'v': [1.0]}), table_name='findings')
+    for path, mode in ((source, 'delete'), (results, 'wal')):
+        with sqlite3.connect(path) as connection:
+            assert connection.execute('PRAGMA journal_mode').fetchone()[0] == mode
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from auto_broccoli import engines
+
+
+@pytest.fixture
+def df():
+    rng = np.random.RandomState(0)
+    rows = 5000
+    df = pd.DataFrame({'x': rng.randn(rows) * 5 + 1e4, 'y': rng.randn(rows), 'z': rng.exponential(size=rows)})
+    df['y'] += df['x'] * .01
+    df['z'] = df['z'].astype(np.float32)
+    df.loc[::7, 'x'] = np.nan
+    df.loc[::11, 'y'] = np.nan
+    df['group'] = rng.randint(0, 4, rows)
+    df['flag'] = np.where(rng.rand(rows) < .05, np.nan, rng.randint(0, 2, rows))
+    df.loc[df['group'] == 2, 'y'] += .1
+    return df
+
+
+def test_pearson_matrix_matches_scipy_on_pairwise_complete_rows(df):
+    columns = ['x', 'y', 'z']
+    coef, p_val = engines.pearson_matrix(df, columns, shift=[1e4, 0.0, 1.0])
+    for a in columns:
+        for b in columns:
+            if a != b:
+                both = df[[a, b]].dropna().astype(float)
+                expected = stats.pearsonr(both[a], both[b])
+                assert np.isclose(coef.loc[a, b], expected[0], rtol=1e-9)
+                assert np.isclose(p_val.loc[a, b], expected[1], rtol=1e-6)
+
+
+def test_anova_matches_scipy(df):
+    columns = ['x', 'y', 'z']
+    f, p_val = engines.anova(df['group'].values, 4, df, columns=columns)
+    for i, column in enumerate(columns):
+        samples = [g[column].dropna().astype(float) for _, g in df.groupby('group')]
+        expected = stats.f_oneway(*samples)
+        assert np.isclose(f[i], expected[0], rtol=1e-8) and np.isclose(p_val[i], expected[1], rtol=1e-6)
+
+
+def test_grouped_moments_ttest_matches_scipy(df):
+    columns = ['x', 'y', 'z']
+    moments = engines.grouped_moments(df[columns], df['flag'], block_columns=2)
+    pos_desc, neg_desc, p_val = engines.ttest_summary(moments)
+    for i, column in enumerate(columns):
+        pos = df.loc[df['flag'] == 1, column].dropna().astype(float)
+        neg = df.loc[df['flag'] == 0, column].dropna().astype(float)
+        assert np.isclose(p_val[i], stats.ttest_ind(pos, neg)[1], rtol=1e-6)
+        assert pos_desc.loc['count', column] == len(pos) and pos_desc.loc['min', column] == pos.min()
+        assert np.isclose(neg_desc.loc['mean', column], neg.mean()) and np.isclose(neg_desc.loc['std', column],
+                                                                                   neg.std())
+
+
+def test_chi2_from_cooccurrence_counts_matches_scipy(df):
+    codes = [df['group'].values, np.where(np.isnan(df['flag']), -1, df['flag']).astype(int)]
+    gram = engines.cooccurrence_counts(codes, [4, 2], block_rows=1000)
+    table = gram[:4, 4:]
+    present = codes[1] >= 0
+    assert (table == pd.crosstab(codes[0][present], codes[1][present]).values).all()
+    chi2, p_val = engines.chi2_from_tables(table[None])
+    expected = stats.chi2_contingency(table)
+    assert np.isclose(chi2[0], expected[0]) and np.isclose(p_val[0], expected[1])
@@ -0,0 +1,15 @@
+import pytest
+
+from benchmarks.import_time import SNIPPETS, measure
+
+# generous next to the benchmark's default, tests may run on a loaded machine
+BUDGET = 1.5
+
+
+@pytest.mark.parametrize('name', sorted(SNIPPETS))
+def test_startup_does_not_load_deferred_modules(name):
+    assert measure(SNIPPETS[name], repeat=1)['loaded'] == []
+
+
+def test_import_stays_within_budget():
+    assert measure(SNIPPETS['import auto_broccoli'], repeat=3)['seconds'] < BUDGET
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+from auto_broccoli import database, incremental, streaming
+from auto_broccoli.auto_broccoli import AutoBroccoli
+
+
+def events(first_day, days, rows_per_day=400, seed=0):
+    rng = np.random.RandomState(seed + first_day)
+    parts = []
+    for d in range(first_day, first_day + days):
+        day = pd.Timestamp('2024-01-01') + pd.Timedelta(days=d)
+        times = day + pd.to_timedelta(np.sort(rng.randint(0, 86400, rows_per_day)), unit='s')
+        frame = pd.DataFrame({'event_date': times.strftime('%Y-%m-%d %H:%M:%S'),
+                              'g': rng.choice(list('abc'), rows_per_day), 'b': rng.choice(['x', 'y'], rows_per_day),
+                              'v': rng.randn(rows_per_day) * 10 + d, 'w': rng.randn(rows_per_day)})
+        frame['w'] += (frame['g'] == 'a') * .3
+        parts.append(frame)
+    return pd.concat(parts, ignore_index=True)
+
+
+def findings(dbi, **kwargs):
+    ab = AutoBroccoli(dbi=dbi, source_table='events', chunksize=500, result_cache=None, **kwargs)
+    results = ab.auto_analysis(ab.create_analytical_buckets(ab.classify_column_types(ab.profile())))
+    return results.sort_values(['analysis_type', 'col_1', 'col_2']).reset_index(drop=True)
+
+
+def assert_same(incremental, full):
+    columns = ['analysis_type', 'col_1', 'col_2']
+    assert incremental[columns].equals(full[columns])
+    assert np.allclose(incremental['p_val'].astype(float), full['p_val'].astype(float))
+
+
+def test_rows_appended_to_the_watermark_day_are_picked_up(tmp_path):
+    dbi = database.DBInterface(database_uri='sqlite:///' + str(tmp_path / 'source.db'))
+    store = str(tmp_path / 'events.partitions')
+    rows = events(0, 5)
+    partial = rows['event_date'] < '2024-01-05 12:00:00'  # the last day is half loaded
+    dbi.save_to_table(rows[partial], table_name='events', replace_or_append='replace')
+    findings(dbi, partition_by='event_date', partition_store=store)
+
+    dbi.save_to_table(pd.concat([rows[~partial], events(5, 2)]), table_name='events', replace_or_append='append')
+    assert_same(findings(dbi, partition_by='event_date', partition_store=store), findings(dbi))
+
+    # nothing new: the watermark day is read again and gives the same totals
+    assert_same(findings(dbi, partition_by='event_date', partition_store=store), findings(dbi))
+
+
+def test_partition_store_round_trip(tmp_path):
+    path = str(tmp_path / 'events.partitions')
+    rows = events(0, 3)
+    days = incremental.partition_key(rows['event_date'])
+    store = incremental.PartitionStore(path)
+    assert store.watermark is None and len(store) == 0
+    reference = None
+    for day, part in rows.groupby(days):
+        accumulator = streaming.ProfileAccumulator() if reference is None else reference.like()  # shared shift
+        accumulator.update(part)
+        if reference is None:
+            reference = accumulator
+        store.put_profile(day, len(part), accumulator)
+    store.put_pairs('2024-01-02', {'sums': [1.5, 2.5]}, layout='v1')
+    store.put('closed_profile_through', '2024-01-02')
+    store.commit()
+    store.close()
+
+    store = incremental.PartitionStore(path)
+    assert store.days() == ['2024-01-01', '2024-01-02', '2024-01-03'] and store.watermark == '2024-01-03'
+    assert store.days(since='2024-01-02', before='2024-01-03') == ['2024-01-02']
+    assert store.stale_days('v1') == ['2024-01-01', '2024-01-03'] and store.stale_days('v2') == store.days()
+    assert store.get_day('2024-01-02', 'pairs') == {'sums': [1.5, 2.5]} and store.get_day('2024-01-01', 'pairs') is None
+    assert store.get('closed_profile_through') == '2024-01-02' and store.get('missing', 0) == 0
+
+    whole = reference.like()
+    whole.update(rows)
+    merged = store.get_day('2024-01-01', 'profile').like()
+    for day in store.days():
+        merged.merge(store.get_day(day, 'profile'))
+    (merged_profile, merged_stats), (profile, stats) = merged.result(), whole.result()
+    assert merged_profile.equals(profile)
+    assert all(np.allclose(merged.comoments[key], whole.comoments[key]) for key in whole.comoments)
+    assert all(merged_stats[column].value_counts.equals(stats[column].value_counts) for column in stats)
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from auto_broccoli import parallel
+from auto_broccoli.auto_broccoli import AutoBroccoli
+
+
+def frame(rows=2000, seed=0):
+    rng = np.random.RandomState(seed)
+    df = pd.DataFrame({'g': rng.choice(list('abc'), rows), 'h': rng.choice(list('pqrs'), rows),
+                       'b': rng.choice(['x', 'y'], rows), 'c': rng.randint(0, 2, rows)})
+    for i in range(5):
+        df['v' + str(i)] = rng.randn(rows) + (df['g'] == 'a') * i * .1
+    df.loc[::11, 'v2'] = np.nan
+    df.loc[::17, 'h'] = None
+    return df
+
+
+def test_shared_columns_load_back_as_they_were(tmp_path):
+    df = frame()
+    loaded = parallel.load_columns(parallel.share_columns(df, ['g', 'h', 'v2', 'c'], str(tmp_path)))
+    assert list(loaded.columns) == ['g', 'h', 'v2', 'c']
+    assert (loaded['g'].astype(object) == df['g']).all()
+    assert loaded['h'].isnull().equals(df['h'].isnull()) and (loaded['h'].astype(object) == df['h']).sum() == \
+        df['h'].notnull().sum()
+    assert np.array_equal(loaded['v2'].values, df['v2'].values, equal_nan=True)
+    assert (loaded['c'].values == df['c'].values).all()
+
+
+def test_worker_pool_gives_the_sequential_findings():
+    def findings(workers):
+        ab = AutoBroccoli(df=frame(), result_cache=None)
+        results = ab.auto_analysis(ab.create_analytical_buckets(ab.classify_column_types(ab.profile())),
+                                   workers=workers)
+        return results
+
+    sequential, pooled = findings(None), findings(2)
+    assert len(sequential) > 10
+    columns = ['analysis_type', 'col_1', 'col_2', 'insight_text']
+    assert pooled[columns].equals(sequential[columns])  # in task order
+    assert np.allclose(pooled['p_val'].astype(float), sequential['p_val'].astype(float))
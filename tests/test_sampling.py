@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from auto_broccoli import sampling, instrumentation
+from auto_broccoli.auto_broccoli import AutoBroccoli
+
+
+def test_pairs_are_sampled_stratified_on_their_own_columns_only():
+    rng = np.random.RandomState(0)
+    n = 20000
+    df = pd.DataFrame({'rare': np.where(np.arange(n) < 100, 'r', 'common'), 'x': rng.randn(n), 'y': rng.randn(n)})
+    df['x'] += (df['rare'] == 'r') * 5  # the top-up rows of 'rare' are outliers in x and y
+    df['y'] += (df['rare'] == 'r') * 5
+    ab = AutoBroccoli(df=df, compact=False, random_state=0)
+    tasks = [('cat X cont', ('rare', 'x')), ('cont X cont', ('x', 'y'))]
+
+    samples = {}
+    for sample, group in sampling.iter_samples(ab, tasks, [0, 1], 1000):
+        for i in group:
+            samples[tasks[i][0]] = sample.df
+    uniform, stratified = samples['cont X cont'], samples['cat X cont']
+    assert len(uniform) == 1000
+    assert (stratified['rare'] == 'r').sum() == ab.min_samples + 1
+    assert uniform.index.isin(stratified.index).all()  # the uniform part is shared
+
+
+def test_sampled_run_finds_the_effects_and_settles_most_pairs():
+    rng = np.random.RandomState(1)
+    n = 100000
+    df = pd.DataFrame({'b0': rng.choice(['x', 'y'], n), 'b1': rng.choice(['x', 'y'], n),
+                       'c0': rng.choice(list('abcde'), n)})
+    for i in range(6):
+        df[f'v{i}'] = rng.randn(n)
+    df['v0'] += (df['b0'] == 'x') * .2
+    df['v1'] += (df['c0'] == 'a') * .2
+    df['v2'] += df['v3'] * .2
+    effects = {('b0', 'v0'), ('c0', 'v1'), ('v2', 'v3')}
+
+    recorder = instrumentation.TimingRecorder()
+    ab = AutoBroccoli(df=df, random_state=0, sample_size=10000, result_cache=None, hooks=[recorder])
+    results = ab.auto_analysis(ab.create_analytical_buckets(ab.classify_column_types(ab.profile())))
+    full = AutoBroccoli(df=df, result_cache=None)
+    full_results = full.auto_analysis(full.create_analytical_buckets(full.classify_column_types(full.profile())))
+
+    pairs = recorder.to_frame()
+    pairs = pairs[pairs['stage'] == 'pair']
+    rerun = set(zip(pairs['col_1'][pairs['rows'] == n], pairs['col_2'][pairs['rows'] == n]))
+    assert len(rerun) < 0.5 * (pairs['rows'] < n).sum()  # every pair runs on a sample first
+
+    both = results.merge(full_results, on=['col_1', 'col_2'], suffixes=('', '_full'))
+    rerun_rows = [pair in rerun for pair in zip(both['col_1'], both['col_2'])]
+    assert (both['p_val'][rerun_rows] == both['p_val_full'][rerun_rows]).all()
+    significant = set(zip(both['col_1'][both['p_val'] <= ab.siglvl], both['col_2'][both['p_val'] <= ab.siglvl]))
+    assert effects <= significant
+    assert len(significant - effects) <= 0.1 * len(both)  # no more false positives than chance allows
@@ -0,0 +1,49 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from auto_broccoli.auto_broccoli import AutoBroccoli
+
+
+def frame(rows=3000, seed=0):
+    rng = np.random.RandomState(seed)
+    df = pd.DataFrame({'g': rng.choice(list('abc'), rows), 'b': rng.choice(['x', 'y'], rows),
+                       'c': rng.choice(['u', 'v'], rows)})
+    for i in range(6):
+        df['v' + str(i)] = rng.randn(rows) + (df['g'] == 'a') * i * .1
+    return df
+
+
+def buckets(ab):
+    return ab.create_analytical_buckets(ab.classify_column_types(ab.profile()))
+
+
+def test_cached_pairs_do_not_spend_the_pair_budget(tmp_path):
+    df, path = frame(), str(tmp_path / 'results.cache')
+    ab = AutoBroccoli(df=df, pair_budget=5, random_state=0, result_cache=path)
+    first = ab.auto_analysis(buckets(ab))
+    assert ab.schedule['ran'].sum() == 5
+
+    ab = AutoBroccoli(df=df, pair_budget=5, random_state=0, result_cache=path)
+    second = ab.auto_analysis(buckets(ab))
+    assert ab.schedule['ran'].sum() == 10
+    columns = ['analysis_type', 'col_1', 'col_2', 'p_val']
+    assert second[columns].head(len(first)).equals(first[columns])
+
+    unscheduled = AutoBroccoli(df=df, result_cache=None)
+    everything = unscheduled.auto_analysis(buckets(unscheduled)).set_index(['analysis_type', 'col_1', 'col_2'])
+    served = second.set_index(['analysis_type', 'col_1', 'col_2'])
+    assert np.allclose(served['p_val'].astype(float), everything.loc[served.index, 'p_val'].astype(float))
+
+
+def test_sampling_a_scheduled_run_warns():
+    ab = AutoBroccoli(df=frame(), pair_budget=3, sample_size=1000, random_state=0, result_cache=None)
+    d_ = buckets(ab)
+    with pytest.warns(UserWarning, match='scheduled'):
+        ab.auto_analysis(d_)
+    ab.sample_size = None
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        ab.auto_analysis(d_)
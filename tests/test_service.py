@@ -0,0 +1,52 @@
+import asyncio
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from auto_broccoli import database, service
+
+
+@pytest.fixture
+def answer(tmp_path):
+    dbi = database.DBInterface(database_uri='sqlite:///' + str(tmp_path / 'source.db'))
+    rng = np.random.RandomState(0)
+    df = pd.DataFrame({'g': rng.choice(list('abc'), 500), 'b': rng.choice(['x', 'y'], 500), 'v': rng.randn(500),
+                       'w': rng.randn(500)})
+    dbi.save_to_table(df, table_name='sales', replace_or_append='replace')
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    df.to_csv(str(data_dir / 'sales.csv'), index=False)
+    df.to_csv(str(tmp_path / 'secret.csv'), index=False)
+    svc = service.AnalysisService(dbi=dbi, data_dir=str(data_dir), result_cache=None)
+    loop = asyncio.new_event_loop()
+
+    def answer(job):
+        return loop.run_until_complete(svc.handle_line(json.dumps(job).encode()))
+
+    answer.service = svc
+    yield answer
+    svc.executor.shutdown()
+    loop.close()
+
+
+def test_tables_are_answered_and_kept_warm(answer):
+    first, second = answer({'id': 1, 'table': 'sales'}), answer({'id': 2, 'table': 'sales'})
+    assert first['status'] == second['status'] == 'ok'
+    assert not first['warm'] and second['warm']
+    assert first['findings'] == second['findings']
+    assert answer.service._locks == {}
+
+
+def test_unknown_tables_are_refused(answer):
+    assert answer({'table': 'nope'})['status'] == 'error'
+    assert answer({'table': 'sales; DROP TABLE sales'})['status'] == 'error'
+    assert answer({'table': 'sales'})['status'] == 'ok'
+
+
+def test_files_are_read_from_the_data_directory_only(answer):
+    assert answer({'path': 'sales.csv'})['status'] == 'ok'
+    refused = answer({'path': '../secret.csv'})
+    assert refused['status'] == 'error' and 'PermissionError' in refused['error']
+    assert answer({'path': '/etc/passwd'})['status'] == 'error'
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from auto_broccoli import sketches
+
+
+@pytest.mark.parametrize('distinct', [500, 20000, 300000])
+def test_hyperloglog_is_within_its_error_bound(distinct):
+    values = np.random.RandomState(distinct).randint(0, 2 ** 40, distinct * 2) % (distinct * 7919) * 1.0
+    truth = len(np.unique(values))
+    hll = sketches.HyperLogLog()
+    hll.update(sketches.hash_values(values))
+    assert abs(hll.estimate() - truth) <= 4 * hll.relative_error * truth
+
+
+def test_merged_hyperloglogs_equal_one_over_all_values():
+    values = np.arange(100000)
+    whole, first, second = sketches.HyperLogLog(), sketches.HyperLogLog(), sketches.HyperLogLog()
+    whole.update(sketches.hash_values(values))
+    first.update(sketches.hash_values(values[:60000]))
+    second.update(sketches.hash_values(values[40000:].astype(float)))  # ints and floats hash alike
+    first.merge(second)
+    assert (first.registers == whole.registers).all()
+
+
+def test_frequent_items_keeps_every_heavy_value_within_its_error():
+    rng = np.random.RandomState(0)
+    values = rng.zipf(1.3, 200000)
+    truth = pd.Series(values).value_counts()
+    parts = []
+    for part in np.array_split(values, 4):
+        summary = sketches.FrequentItems(k=32)
+        for block in np.array_split(part, 10):
+            summary.update(pd.Series(block).value_counts())
+        parts.append(summary)
+    summary = parts[0]
+    for other in parts[1:]:
+        summary.merge(other)
+
+    assert summary.total == len(values) and len(summary.counts) <= summary.k
+    assert summary.error <= summary.total / (summary.k + 1)
+    heavy = truth[truth > summary.total / (summary.k + 1)]
+    assert len(heavy) and set(heavy.index) <= set(summary.counts.index)
+    kept = truth[summary.counts.index]
+    assert (summary.counts <= kept).all() and (summary.counts >= kept - summary.error).all()
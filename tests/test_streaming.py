@@ -0,0 +1,109 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from auto_broccoli import sinks, streaming
+from auto_broccoli.auto_broccoli import AutoBroccoli
+
+
+def frame(rows=600, seed=0):
+    rng = np.random.RandomState(seed)
+    df = pd.DataFrame({'g': rng.choice(list('abc'), rows), 'h': rng.choice(list('pqrs'), rows),
+                       'b': rng.choice(['x', 'y'], rows), 'c': rng.choice(['u', 'v'], rows)})
+    for i in range(4):
+        df['v' + str(i)] = rng.randn(rows) + (df['g'] == 'a') * i * .2
+    return df
+
+
+class FailingSink(sinks.JSONLSink):
+    """Raises on its fail_at-th write of the run"""
+
+    def __init__(self, path, fail_at=None):
+        super().__init__(path)
+        self.fail_at = fail_at
+        self.writes = 0
+
+    def write(self, result):
+        self.writes += 1
+        if self.writes == self.fail_at:
+            raise IOError('disk full')
+        super().write(result)
+
+
+def read_lines(path) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_resume_after_a_failing_sink_writes_each_finding_once(tmp_path):
+    ab = AutoBroccoli(df=frame(), result_cache=None)
+    d_ = ab.create_analytical_buckets(ab.classify_column_types(ab.profile()))
+    expected = ab.stream_analysis(d_, [sinks.JSONLSink(str(tmp_path / 'full.jsonl'))])
+    assert expected > 10
+
+    checkpoint = str(tmp_path / 'run.checkpoint')
+    good, bad = str(tmp_path / 'good.jsonl'), str(tmp_path / 'bad.jsonl')
+    with pytest.raises(IOError):
+        # the good sink writes the 8th finding before the failing one raises on it
+        ab.stream_analysis(d_, [sinks.JSONLSink(good), FailingSink(bad, fail_at=8)], checkpoint=checkpoint,
+                           flush_every=3)
+    assert len(read_lines(good)) == len(read_lines(bad)) == 6
+
+    ab.stream_analysis(d_, [sinks.JSONLSink(good), FailingSink(bad)], checkpoint=checkpoint, flush_every=3)
+    key = lambda row: (row['analysis_type'], row['col_1'], row['col_2'])
+    full = sorted(map(key, read_lines(str(tmp_path / 'full.jsonl'))))
+    for path in (good, bad):
+        assert sorted(map(key, read_lines(path))) == full
+
+
+def batch_results_close(a, b):
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(batch_results_close(a[key], b[key]) for key in a)
+    if isinstance(a, tuple):
+        return len(a) == len(b) and all(batch_results_close(x, y) for x, y in zip(a, b))
+    if isinstance(a, (pd.DataFrame, pd.Series)):
+        return a.index.equals(b.index) and np.allclose(a.values.astype(float), b.values.astype(float), equal_nan=True)
+    if isinstance(a, list):
+        return a == b
+    return np.allclose(a, b, equal_nan=True)
+
+
+def test_merged_pair_accumulators_equal_one_over_all_rows():
+    df = frame(rows=1500)
+    df['b'], df['c'] = (df['b'] == 'y').astype(int), (df['c'] == 'u').astype(int)
+    df.loc[::9, 'v1'] = np.nan
+    ab = AutoBroccoli(df=df, result_cache=None)
+    tasks = ab.analysis_tasks(ab.create_analytical_buckets(ab.classify_column_types(ab.profile())))
+    assert {'cont X cont', 'bin X cont', 'cat X cont', 'bin X cat', 'bin X bin'} <= {k for k, _ in tasks}
+    stats = {column: ab.column_stats(column) for column in ab.df.columns}
+
+    def accumulator(*parts):
+        accumulator = streaming.PairAccumulator(tasks, stats, {})
+        for part in parts:
+            accumulator.update(part.copy())
+        return accumulator
+
+    whole = accumulator(ab.df.iloc[:400], ab.df.iloc[400:])
+    merged = accumulator(ab.df.iloc[:700])
+    merged.merge(accumulator(ab.df.iloc[700:1100], ab.df.iloc[1100:]))
+    assert batch_results_close(merged.batch_results(), whole.batch_results())
+
+
+def test_chunked_csv_run_matches_the_in_memory_run(tmp_path):
+    df = frame(rows=1500)
+    df.loc[::9, 'v1'] = np.nan
+    df.loc[::13, 'h'] = None
+    path = str(tmp_path / 'data.csv')
+    df.to_csv(path, index=False)
+
+    def findings(**kwargs):
+        ab = AutoBroccoli(result_cache=None, **kwargs)
+        results = ab.auto_analysis(ab.create_analytical_buckets(ab.classify_column_types(ab.profile())))
+        return results.sort_values(['analysis_type', 'col_1', 'col_2']).reset_index(drop=True)
+
+    chunked, in_memory = findings(df=path, chunksize=97), findings(df=path)
+    columns = ['analysis_type', 'col_1', 'col_2', 'insight_text']
+    assert len(in_memory) > 10 and chunked[columns].equals(in_memory[columns])
+    assert np.allclose(chunked['p_val'].astype(float), in_memory['p_val'].astype(float))